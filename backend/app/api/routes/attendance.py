@@ -1,10 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from sqlalchemy import and_, extract
+from sqlalchemy.exc import IntegrityError
 from typing import List
 from datetime import datetime
 from ...database import get_db
 from ...models import AttendanceRecord, Student, ApprovalStatus, DocumentSubmission, StudentParent
+from ...services.outbound_dispatcher import get_outbound_dispatcher
 from ...schemas import (
     AttendanceRecord as AttendanceRecordSchema,
     AttendanceRecordCreate,
@@ -17,6 +19,15 @@ from ...schemas import (
 router = APIRouter(prefix="/attendance", tags=["attendance"])
 
 
+def _commit_unique(db: Session):
+    """커밋 (같은 학생/날짜/출결 타입 기록이 이미 있으면 409)"""
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Attendance record for this student, date and type already exists")
+
+
 @router.get("/", response_model=List[AttendanceRecordSchema])
 def get_attendance_records(
     skip: int = 0,
@@ -56,7 +67,7 @@ def create_attendance_record(record: AttendanceRecordCreate, db: Session = Depen
 
     db_record = AttendanceRecord(**record.dict())
     db.add(db_record)
-    db.commit()
+    _commit_unique(db)
     db.refresh(db_record)
     return db_record
 
@@ -81,7 +92,7 @@ def update_attendance_record(
     if record_update.modified_by:
         record.modified_at = datetime.utcnow()
 
-    db.commit()
+    _commit_unique(db)
     db.refresh(record)
     return record
 
@@ -109,9 +120,6 @@ async def reject_attendance_record(
     db: Session = Depends(get_db)
 ):
     """출결 기록 거부 (학부모에게 텔레그램 알림 발송)"""
-    from ...services.telegram_bot import AttendanceTelegramBot
-    import telegram
-    import os
 
     record = db.query(AttendanceRecord).filter(AttendanceRecord.id == record_id).first()
     if not record:
@@ -134,9 +142,6 @@ async def reject_attendance_record(
         ).all()
 
         if parents:
-            bot_token = os.getenv("TELEGRAM_BOT_TOKEN")
-            bot = telegram.Bot(token=bot_token)
-
             rejection_message = f"""❌ {student.name} 학생 학부모님께,
 
 {record.date.strftime('%Y년 %m월 %d일')}자 출결 기록이 거부되었습니다.
@@ -150,14 +155,10 @@ async def reject_attendance_record(
 
             rejection_message += "\n다시 확인하시고 재제출 또는 문의 부탁드립니다."
 
-            for parent in parents:
-                try:
-                    await bot.send_message(
-                        chat_id=parent.telegram_id,
-                        text=rejection_message
-                    )
-                except Exception as e:
-                    print(f"텔레그램 알림 발송 실패 (parent_id={parent.id}): {e}")
+            # 발송 대기열에 넣고 바로 응답 (한도/재시도는 발송기가 처리)
+            await get_outbound_dispatcher().enqueue(
+                [(parent.telegram_id, rejection_message) for parent in parents], purpose="attendance_rejected"
+            )
 
     return {
         "message": "Attendance record rejected",
@@ -1,9 +1,11 @@
+import logging
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from typing import List
 from datetime import datetime
 from ...database import get_db
 from ...models import DocumentSubmission, Student, StudentParent
+from ...services.outbound_dispatcher import get_outbound_dispatcher
 from ...schemas import (
     DocumentSubmission as DocumentSubmissionSchema,
     DocumentSubmissionCreate,
@@ -12,6 +14,8 @@ from ...schemas import (
 
 router = APIRouter(prefix="/documents", tags=["documents"])
 
+logger = logging.getLogger(__name__)
+
 
 @router.get("/", response_model=List[DocumentSubmissionSchema])
 def get_document_submissions(
@@ -98,9 +102,6 @@ def mark_document_submitted(submission_id: int, db: Session = Depends(get_db)):
 @router.post("/send-reminder/{student_id}")
 async def send_individual_reminder(student_id: int, db: Session = Depends(get_db)):
     """특정 학생의 모든 학부모에게 개별 독려 메시지 발송"""
-    import telegram
-    import os
-
     # 학생 정보 조회
     student = db.query(Student).filter(Student.id == student_id).first()
     if not student:
@@ -148,25 +149,16 @@ async def send_individual_reminder(student_id: int, db: Session = Depends(get_db
 
     message += "\n빠른 시일 내에 제출 부탁드립니다."
 
-    # 텔레그램 봇 직접 사용
-    bot_token = os.getenv("TELEGRAM_BOT_TOKEN")
-    bot = telegram.Bot(token=bot_token)
-    sent_count = 0
-    failed_parents = []
-
-    for parent in parents:
-        try:
-            await bot.send_message(
-                chat_id=parent.telegram_id,
-                text=message
-            )
-            sent_count += 1
-        except Exception as e:
-            failed_parents.append(parent.id)
-            print(f"❌ 발송 실패 (parent_id={parent.id}): {e}")
+    # 발송 대기열을 거쳐 발송 (한도/재시도는 발송기가 처리, 시간 안에 못 보낸 건은 계속 시도)
+    statuses = await get_outbound_dispatcher().send_many(
+        [(parent.telegram_id, message) for parent in parents], purpose="document_reminder"
+    )
+    sent_count = statuses.count("sent")
+    failed_count = statuses.count("failed")
+    queued_count = len(statuses) - sent_count - failed_count
 
     # 발송 기록 업데이트
-    if sent_count > 0:
+    if sent_count + queued_count > 0:
         for doc in unsubmitted:
             doc.reminder_sent = True
             doc.reminder_sent_at = datetime.utcnow()
@@ -177,7 +169,8 @@ async def send_individual_reminder(student_id: int, db: Session = Depends(get_db
         "student_name": student.name,
         "parents_count": len(parents),
         "sent_count": sent_count,
-        "failed_count": len(failed_parents),
+        "queued_count": queued_count,
+        "failed_count": failed_count,
         "unsubmitted_count": unsubmitted_count
     }
 
@@ -185,9 +178,6 @@ async def send_individual_reminder(student_id: int, db: Session = Depends(get_db
 @router.post("/send-reminders")
 async def send_reminders_to_unsubmitted(db: Session = Depends(get_db)):
     """서류 미제출 학생 전체에게 독려 메시지 일괄 발송"""
-    import telegram
-    import os
-
     # 서류 미제출 학생 목록 조회 (중복 제거)
     unsubmitted_students = db.query(DocumentSubmission.student_id).filter(
         DocumentSubmission.is_submitted == False
@@ -196,11 +186,9 @@ async def send_reminders_to_unsubmitted(db: Session = Depends(get_db)):
     if not unsubmitted_students:
         return {"message": "서류 미제출 학생이 없습니다", "count": 0}
 
-    bot_token = os.getenv("TELEGRAM_BOT_TOKEN")
-    bot = telegram.Bot(token=bot_token)
-    sent_count = 0
     failed_count = 0
-    total_messages = 0
+    outgoing = []  # (학생, 미제출 서류, 학부모 수)
+    messages = []  # (chat_id, 메시지) - 모든 학생분을 한 번에 대기열에 넣음
 
     for (student_id,) in unsubmitted_students:
         student = db.query(Student).filter(Student.id == student_id).first()
@@ -238,26 +226,29 @@ async def send_reminders_to_unsubmitted(db: Session = Depends(get_db)):
 
         message += "\n빠른 시일 내에 제출 부탁드립니다."
 
-        # 모든 학부모에게 발송
-        student_sent = False
-        for parent in parents:
-            try:
-                await bot.send_message(
-                    chat_id=parent.telegram_id,
-                    text=message
-                )
-                student_sent = True
-                total_messages += 1
-            except Exception as e:
-                print(f"❌ 발송 실패: student={student.name}, parent_id={parent.id}, error={e}")
-
-        if student_sent:
-            # 발송 기록 업데이트
+        outgoing.append((student, unsubmitted, len(parents)))
+        messages.extend((parent.telegram_id, message) for parent in parents)
+
+    # 모든 학부모에게 발송 (발송기가 한도 안에서 동시에 보냄)
+    statuses = await get_outbound_dispatcher().send_many(messages, purpose="document_reminder")
+
+    sent_count = 0
+    total_messages = 0
+    offset = 0
+    for student, unsubmitted, parent_count in outgoing:
+        student_statuses = statuses[offset:offset + parent_count]
+        offset += parent_count
+        accepted = [status for status in student_statuses if status != "failed"]
+        total_messages += student_statuses.count("sent")
+
+        if accepted:
+            # 발송 기록 업데이트 (아직 대기열에 있는 건도 계속 발송 시도)
             for doc in unsubmitted:
                 doc.reminder_sent = True
                 doc.reminder_sent_at = datetime.utcnow()
             sent_count += 1
         else:
+            logger.warning(f"❌ 발송 실패: student={student.name}")
             failed_count += 1
 
     db.commit()
@@ -266,7 +257,8 @@ async def send_reminders_to_unsubmitted(db: Session = Depends(get_db)):
         "message": f"독려 메시지 일괄 발송 완료",
         "sent_count": sent_count,
         "failed_count": failed_count,
-        "total_messages": total_messages
+        "total_messages": total_messages,
+        "queued_messages": sum(status in ("pending", "sending") for status in statuses)
     }
 
 
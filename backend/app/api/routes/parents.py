@@ -3,6 +3,7 @@ from sqlalchemy.orm import Session
 from typing import List
 from ...database import get_db
 from ...models import StudentParent, Student
+from ...services.parent_resolver import get_parent_resolver, record_parent_changes
 from ...schemas import (
     StudentParent as StudentParentSchema,
     StudentParentCreate,
@@ -46,8 +47,10 @@ def create_parent(parent: StudentParentCreate, db: Session = Depends(get_db)):
     # 새 학부모 등록
     db_parent = StudentParent(**parent.dict())
     db.add(db_parent)
+    record_parent_changes(db, db_parent.telegram_id)
     db.commit()
     db.refresh(db_parent)
+    get_parent_resolver().invalidate(db_parent.telegram_id)
 
     return db_parent
 
@@ -63,13 +66,17 @@ def update_parent(
     if not parent:
         raise HTTPException(status_code=404, detail="학부모를 찾을 수 없습니다")
 
-    # 수정 사항 적용
+    # 수정 사항 적용 (telegram_id가 바뀌면 이전 ID의 캐시도 삭제)
+    previous_telegram_id = parent.telegram_id
     update_data = parent_update.dict(exclude_unset=True)
     for field, value in update_data.items():
         setattr(parent, field, value)
 
+    record_parent_changes(db, previous_telegram_id, parent.telegram_id)
     db.commit()
     db.refresh(parent)
+    get_parent_resolver().invalidate(previous_telegram_id)
+    get_parent_resolver().invalidate(parent.telegram_id)
 
     return parent
 
@@ -81,8 +88,11 @@ def delete_parent(parent_id: int, db: Session = Depends(get_db)):
     if not parent:
         raise HTTPException(status_code=404, detail="학부모를 찾을 수 없습니다")
 
+    telegram_id = parent.telegram_id
     db.delete(parent)
+    record_parent_changes(db, telegram_id)
     db.commit()
+    get_parent_resolver().invalidate(telegram_id)
 
     return {"message": "학부모가 삭제되었습니다", "parent_id": parent_id}
 
@@ -95,8 +105,10 @@ def toggle_parent_active(parent_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="학부모를 찾을 수 없습니다")
 
     parent.is_active = not parent.is_active
+    record_parent_changes(db, parent.telegram_id)
     db.commit()
     db.refresh(parent)
+    get_parent_resolver().invalidate(parent.telegram_id)
 
     status = "활성화" if parent.is_active else "비활성화"
     return {
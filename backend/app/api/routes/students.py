@@ -3,6 +3,7 @@ from sqlalchemy.orm import Session
 from typing import List
 from ...database import get_db
 from ...models import Student
+from ...services.parent_resolver import get_parent_resolver, record_parent_changes
 from ...schemas import Student as StudentSchema, StudentCreate
 
 router = APIRouter(prefix="/students", tags=["students"])
@@ -53,6 +54,11 @@ def delete_student(student_id: int, db: Session = Depends(get_db)):
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
 
+    telegram_ids = [parent.telegram_id for parent in student.parents]
     db.delete(student)
+    record_parent_changes(db, *telegram_ids)
     db.commit()
+    # 학생 삭제 시 연결된 학부모도 함께 삭제됨
+    for telegram_id in telegram_ids:
+        get_parent_resolver().invalidate(telegram_id)
     return {"message": "Student deleted successfully"}
@@ -0,0 +1,16 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+from ...database import get_db
+from ...services.llm_telemetry import build_llm_report
+
+router = APIRouter(prefix="/telemetry", tags=["telemetry"])
+
+
+@router.get("/llm-report")
+def get_llm_report(
+    days: int = Query(7, ge=1, le=90, description="집계 기간 (일)"),
+    limit: int = Query(10, ge=1, le=100, description="느린 호출/비싼 호출 목록 개수"),
+    db: Session = Depends(get_db)
+):
+    """Claude 호출 리포트 (지연시간 p50/p95/p99, 일별 비용, 느린/비싼 호출)"""
+    return build_llm_report(db, days=days, limit=limit)
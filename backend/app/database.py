@@ -1,4 +1,6 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
@@ -27,6 +29,40 @@ else:
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+
+def _async_engine_args(database_url: str) -> tuple:
+    """동기 URL → 비동기 드라이버 URL과 connect_args (sqlite → aiosqlite, postgresql → asyncpg)"""
+    url = make_url(database_url)
+    if url.get_backend_name() == "sqlite":
+        return url.set(drivername="sqlite+aiosqlite"), {"check_same_thread": False}
+    if url.get_backend_name() == "postgresql":
+        # asyncpg는 sslmode 쿼리 파라미터 대신 ssl 인자를 사용
+        connect_args = {}
+        sslmode = url.query.get("sslmode")
+        if sslmode:
+            connect_args["ssl"] = sslmode
+            url = url.difference_update_query(["sslmode"])
+        return url.set(drivername="postgresql+asyncpg"), connect_args
+    return url, {}
+
+
+# 텔레그램 봇용 비동기 엔진 (DB 대기 중에도 이벤트 루프가 다른 업데이트를 처리하도록)
+_async_url, _async_connect_args = _async_engine_args(DATABASE_URL)
+if _async_url.get_backend_name() == "sqlite":
+    async_engine = create_async_engine(_async_url, connect_args=_async_connect_args)
+else:
+    async_engine = create_async_engine(
+        _async_url,
+        connect_args=_async_connect_args,
+        pool_pre_ping=True,
+        pool_recycle=300,
+    )
+
+# 커밋 후에도 객체 속성을 읽을 수 있도록 expire_on_commit=False (비동기 세션은 지연 로딩 불가)
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
+
 Base = declarative_base()
 
 
@@ -41,3 +77,71 @@ def get_db():
 def init_db():
     """Initialize database tables"""
     Base.metadata.create_all(bind=engine)
+    _ensure_indexes()
+
+
+def _ensure_indexes():
+    """
+    기존 테이블에 나중에 추가된 인덱스 생성 (create_all은 이미 있는 테이블의 인덱스를 만들지 않음)
+
+    출결 기록 유니크 인덱스를 만들기 전에 같은 학생/날짜/출결 타입 중복 행을 정리합니다.
+    봇의 출결 저장(ON CONFLICT)이 이 인덱스에 의존하므로 유니크 인덱스를 만들지 못하면 시작을 중단합니다.
+    """
+    import logging
+    from sqlalchemy import inspect
+    logger = logging.getLogger(__name__)
+
+    for table in Base.metadata.sorted_tables:
+        existing = {index["name"] for index in inspect(engine).get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in existing:
+                continue
+            if index.name == "uq_attendance_student_date_type":
+                _dedupe_attendance_records(logger)
+            try:
+                index.create(bind=engine)
+            except Exception as e:
+                if index.unique:
+                    raise RuntimeError(f"유니크 인덱스 {index.name} 생성 실패: {e}") from e
+                logger.warning(f"인덱스 {index.name} 생성 실패: {e}")
+
+
+def _dedupe_attendance_records(logger):
+    """같은 학생/날짜/출결 타입 출결 기록 중 가장 최근 행(id 최대)만 남김 (서류 기록은 남긴 행으로 옮김)"""
+    from sqlalchemy import delete, select, update
+    from .models import AttendanceRecord, DocumentSubmission
+
+    with SessionLocal() as db:
+        # 인덱스가 없을 때 한 번만 실행되므로 전체를 읽어 키별로 묶음 (id 순서라 마지막이 가장 최근)
+        keep = {}
+        drops = {}  # 지울 id → 남길 id
+        for record_id, student_id, record_date, attendance_type in db.execute(
+            select(AttendanceRecord.id, AttendanceRecord.student_id, AttendanceRecord.date, AttendanceRecord.attendance_type)
+            .order_by(AttendanceRecord.id.desc())
+        ):
+            key = (student_id, record_date, attendance_type)
+            if key in keep:
+                drops[record_id] = keep[key]
+            else:
+                keep[key] = record_id
+        for drop_id, keep_id in drops.items():
+            db.execute(
+                update(DocumentSubmission)
+                .where(DocumentSubmission.attendance_record_id == drop_id)
+                .values(attendance_record_id=keep_id)
+            )
+        if drops:
+            db.execute(delete(AttendanceRecord).where(AttendanceRecord.id.in_(list(drops))))
+        db.commit()
+    removed = len(drops)
+    if removed:
+        logger.warning(f"중복 출결 기록 {removed}건 삭제 (같은 학생/날짜/출결 타입은 최근 기록만 유지)")
+
+
+def dialect_insert(dialect_name: str):
+    """ON CONFLICT를 쓸 수 있는 INSERT 생성 함수 (PostgreSQL/SQLite)"""
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
@@ -1,17 +1,41 @@
 import os
+import hmac
+import hashlib
+import logging
 from pathlib import Path
-from fastapi import FastAPI
+from typing import Optional
+from fastapi import FastAPI, Header, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import FileResponse, Response
 from dotenv import load_dotenv
 from .database import init_db
-from .api.routes import students, attendance, documents, parents
+from .api.routes import students, attendance, documents, parents, telemetry
+from .services.llm_limiter import get_llm_limiter
+from .services.outbound_dispatcher import get_outbound_dispatcher
+from .services.document_store import VARIANTS, FileSystemStorage, get_document_store, is_content_key
 
 # .env 파일 로드 (앱 시작 전)
 # backend/.env 파일의 절대 경로를 명시적으로 지정
 env_path = Path(__file__).parent.parent / ".env"
 load_dotenv(dotenv_path=env_path)
 
+logger = logging.getLogger(__name__)
+
+# 텔레그램 봇 실행 방식: polling(run_bot.py 별도 프로세스) 또는 webhook(이 API 서버 안에서 실행)
+TELEGRAM_MODE = os.getenv("TELEGRAM_MODE", "polling").lower()
+TELEGRAM_WEBHOOK_PATH = os.getenv("TELEGRAM_WEBHOOK_PATH", "/telegram/webhook")
+
+# 웹훅 모드에서 실행 중인 봇 (polling 모드면 None)
+telegram_bot = None
+
+
+def telegram_webhook_secret() -> str:
+    """웹훅 요청 검증용 secret token (미설정 시 봇 토큰에서 유도해 재시작/여러 인스턴스에서 동일)"""
+    secret = os.getenv("TELEGRAM_WEBHOOK_SECRET")
+    if secret:
+        return secret
+    return hashlib.sha256(os.getenv("TELEGRAM_BOT_TOKEN", "").encode()).hexdigest()
+
 # uploads 디렉토리 생성 (앱 시작 전)
 UPLOADS_DIR = Path("uploads")
 UPLOADS_DIR.mkdir(exist_ok=True)
@@ -37,16 +61,86 @@ app.include_router(students.router, prefix="/api")
 app.include_router(attendance.router, prefix="/api")
 app.include_router(documents.router, prefix="/api")
 app.include_router(parents.router, prefix="/api")
+app.include_router(telemetry.router, prefix="/api")
 
 
 @app.on_event("startup")
-def on_startup():
-    """앱 시작 시 데이터베이스 초기화"""
+async def on_startup():
+    """앱 시작 시 데이터베이스 초기화 (웹훅 모드면 텔레그램 봇도 시작)"""
+    global telegram_bot
     init_db()
 
+    # 재시작 전에 대기열에 남은 알림부터 이어서 발송
+    await get_outbound_dispatcher().start()
+
+    if TELEGRAM_MODE == "webhook":
+        webhook_base_url = os.getenv("TELEGRAM_WEBHOOK_URL")
+        if not webhook_base_url:
+            raise ValueError("TELEGRAM_WEBHOOK_URL environment variable is required in webhook mode")
+        from .services.telegram_bot import AttendanceTelegramBot
+
+        telegram_bot = AttendanceTelegramBot()
+        await telegram_bot.start_webhook(
+            webhook_base_url.rstrip("/") + TELEGRAM_WEBHOOK_PATH,
+            telegram_webhook_secret(),
+        )
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    """웹훅 모드 봇 종료 (처리 중인 업데이트 정리)"""
+    global telegram_bot
+    if telegram_bot:
+        await telegram_bot.stop_webhook()
+        telegram_bot = None
+    await get_outbound_dispatcher().stop()
+
+
+@app.post(TELEGRAM_WEBHOOK_PATH, include_in_schema=False)
+async def telegram_webhook(
+    request: Request,
+    x_telegram_bot_api_secret_token: Optional[str] = Header(default=None),
+):
+    """텔레그램 웹훅 (secret token이 맞으면 업데이트를 봇 처리 대기열에 넣고 바로 응답)"""
+    if telegram_bot is None:
+        raise HTTPException(status_code=404, detail="Telegram webhook mode is not enabled")
+    if not x_telegram_bot_api_secret_token or not hmac.compare_digest(
+        x_telegram_bot_api_secret_token, telegram_webhook_secret()
+    ):
+        raise HTTPException(status_code=403, detail="Invalid secret token")
+
+    await telegram_bot.process_webhook_update(await request.json())
+    return {"ok": True}
 
-# 정적 파일 서빙 (서류 사진) - startup 이후에 마운트되도록 보장
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
+
+@app.get("/uploads/{key:path}")
+def serve_document(key: str, size: Optional[str] = None):
+    """
+    서류 사진 (size=thumb|preview면 축소본, 아직 만들어지지 않았으면 원본)
+
+    내용 해시 경로는 내용이 바뀌지 않으므로 브라우저가 오래 캐시하게 합니다.
+    """
+    if size is not None and size not in VARIANTS:
+        raise HTTPException(status_code=400, detail=f"size must be one of {sorted(VARIANTS)}")
+    store = get_document_store()
+    try:
+        resolved = store.resolve(key, size)
+        path = store.storage.local_path(resolved)
+        if path is None and not store.storage.exists(resolved):
+            # 저장소를 바꾸기 전 uploads/에 저장된 예전 파일
+            path = FileSystemStorage(str(UPLOADS_DIR)).local_path(key)
+            resolved = key
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Document not found")
+
+    headers = {}
+    if is_content_key(resolved) and (size is None or resolved != key):
+        headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    if path:
+        return FileResponse(path, media_type=store.storage.content_type(resolved), headers=headers)
+    if not store.storage.exists(resolved):
+        raise HTTPException(status_code=404, detail="Document not found")
+    return Response(store.storage.read(resolved), media_type=store.storage.content_type(resolved), headers=headers)
 
 
 @app.get("/")
@@ -63,3 +157,31 @@ def root():
 def health_check():
     """헬스 체크"""
     return {"status": "healthy"}
+
+
+@app.get("/metrics/llm")
+def llm_metrics():
+    """Claude 호출 제한기 상태 (동시성 한도, 회로 차단기, 재시도/거부 횟수)"""
+    return get_llm_limiter().snapshot()
+
+
+@app.get("/metrics/outbound")
+async def outbound_metrics():
+    """텔레그램 알림 발송 상태 (이 프로세스의 발송/재시도 횟수, 대기열 상태별 건수)"""
+    dispatcher = get_outbound_dispatcher()
+    return {**dispatcher.get_stats(), "queue": await dispatcher.get_queue_stats()}
+
+
+@app.get("/metrics/bot")
+def bot_metrics():
+    """웹훅 모드 봇의 업데이트 처리 상태 (대기열 깊이, 동시 처리 수, 지연시간)"""
+    if telegram_bot is None:
+        raise HTTPException(status_code=404, detail="Telegram bot is not running in this process")
+    return {
+        "updates": telegram_bot.updates.get_stats(),
+        "coalescer": telegram_bot.coalescer.get_stats(),
+        "conversations": telegram_bot.conversation.get_stats(),
+        "documents": telegram_bot.documents.get_stats(),
+        "parents": telegram_bot.parents.get_stats(),
+        "processed": telegram_bot.processed.get_stats(),
+    }
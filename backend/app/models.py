@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum, Boolean, Text
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, ForeignKey, Enum, Boolean, Text, Float, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import enum
@@ -91,6 +91,11 @@ class AttendanceRecord(Base):
     # Relationships
     student = relationship("Student", back_populates="attendance_records")
 
+    # 같은 학생/날짜/출결 타입은 한 건만 (재전송된 메시지로 중복 생성 방지)
+    __table_args__ = (
+        Index("uq_attendance_student_date_type", "student_id", "date", "attendance_type", unique=True),
+    )
+
 
 class DocumentSubmission(Base):
     """서류 제출 기록"""
@@ -129,3 +134,74 @@ class TelegramMessage(Base):
     error_message = Column(Text)
 
     created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class ConversationState(Base):
+    """대화 맥락 (CONVERSATION_STORE=sql일 때, 봇 프로세스 간 공유)"""
+    __tablename__ = "conversation_sessions"
+
+    telegram_user_id = Column(String, primary_key=True)
+    messages = Column(Text, nullable=False, default="[]")  # JSON [[문장, unix 시각], ...]
+    partial_data = Column(Text, nullable=False, default="{}")  # JSON
+
+    updated_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+
+class OutboundMessage(Base):
+    """텔레그램 발송 대기열 (재시작해도 대기 중인 알림을 이어서 발송)"""
+    __tablename__ = "outbound_messages"
+
+    id = Column(Integer, primary_key=True, index=True)
+    chat_id = Column(String, nullable=False, index=True)
+    text = Column(Text, nullable=False)
+    purpose = Column(String)  # document_reminder, attendance_rejected, ...
+    status = Column(String, nullable=False, default="pending", index=True)  # pending, sending, sent, failed
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow, index=True)
+    claimed_at = Column(DateTime)  # 발송 중 표시 시각 (프로세스가 죽으면 일정 시간 후 다시 대기)
+    last_error = Column(Text)
+    telegram_message_id = Column(Integer)
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+    sent_at = Column(DateTime)
+
+
+class ProcessedUpdate(Base):
+    """처리한 텔레그램 업데이트 (재전송된 업데이트를 파싱 전에 건너뜀, 보존 기간 후 삭제)"""
+    __tablename__ = "processed_updates"
+
+    update_id = Column(BigInteger, primary_key=True, autoincrement=False)
+    chat_id = Column(String)
+    message_id = Column(Integer)
+    processed_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+
+class ParentLinkChange(Base):
+    """학부모 연결이 바뀐 telegram_id (다른 프로세스의 학부모 연결 캐시 무효화용, telegram_id마다 한 행)"""
+    __tablename__ = "parent_link_changes"
+
+    telegram_id = Column(String, primary_key=True)
+    changed_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+
+class LLMCall(Base):
+    """Claude API 호출 기록 (토큰, 지연시간, 재시도 횟수, 결과)"""
+    __tablename__ = "llm_calls"
+
+    id = Column(Integer, primary_key=True, index=True)
+    telegram_message_id = Column(Integer, ForeignKey("telegram_messages.id"), index=True)
+    model = Column(String, nullable=False)
+    tier = Column(String)
+    input_tokens = Column(Integer, default=0)
+    output_tokens = Column(Integer, default=0)
+    cache_read_input_tokens = Column(Integer, default=0)
+    cache_creation_input_tokens = Column(Integer, default=0)
+    latency_ms = Column(Float, nullable=False)
+    attempts = Column(Integer, default=1)
+    outcome = Column(String, nullable=False, index=True)  # success, no_tool_output, timeout, circuit_open, http_529, ...
+    error_message = Column(Text)
+
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+    # 관계
+    telegram_message = relationship("TelegramMessage")
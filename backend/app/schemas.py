@@ -124,6 +124,7 @@ class ExtractedAttendanceData(BaseModel):
     student_name: Optional[str] = Field(default=None, description="학생 이름 (update/cancel 시 없을 수 있음)")
     date: Optional[str] = Field(default=None, description="시작 날짜 (YYYY-MM-DD 형식)")
     end_date: Optional[str] = Field(default=None, description="종료 날짜 (YYYY-MM-DD 형식, 기간인 경우)")
+    date_phrase: Optional[str] = Field(default=None, description="메시지의 원래 날짜 표현 (예: 다음주 금요일, 내일부터 3일간)")
     attendance_type: Optional[str] = Field(default=None, description="출결 타입: 결석, 조퇴, 지각 중 하나")
     attendance_reason: Optional[str] = Field(default=None, description="출결 사유: 질병, 미인정, 출석인정 중 하나")
     confidence: float = Field(description="추출 신뢰도 (0.0 ~ 1.0)", ge=0.0, le=1.0)
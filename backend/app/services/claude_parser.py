@@ -1,86 +1,29 @@
 import os
 import json
 import time
-from datetime import datetime, timedelta
-from anthropic import Anthropic
+import atexit
+import asyncio
+import logging
+import threading
+from anthropic import AsyncAnthropic, APIStatusError
+from pydantic import ValidationError
 from typing import Optional
+from datetime import date
 from ..schemas import ExtractedAttendanceData
+from .rule_parser import RuleBasedParser, extract_slots
+from .local_classifier import LocalClassifier
+from .date_resolver import describe_today, resolve_date_phrase
+from .parse_cache import ParseResultCache
+from .llm_limiter import CircuitOpenError, LLMCallLimiter, get_llm_limiter
+from .llm_telemetry import record_llm_call
 
+logger = logging.getLogger(__name__)
 
-class ClaudeMessageParser:
-    """Claude AI를 사용한 출결 메시지 파싱"""
 
-    def __init__(self):
-        api_key = os.getenv("ANTHROPIC_API_KEY")
-        if not api_key:
-            raise ValueError("ANTHROPIC_API_KEY environment variable is required")
-        self.client = Anthropic(api_key=api_key)
+# 정적 분류 규칙/예시 (모듈 로드 시 한 번만 생성, 프롬프트 캐싱 대상)
+SYSTEM_PROMPT = """당신은 초등학교 출결 관리 시스템입니다. 학부모/학생이 보낸 메시지를 읽고 출결 정보를 파악해주세요.
 
-    def parse_attendance_message(self, message: str, context: dict = None) -> tuple[Optional[ExtractedAttendanceData], Optional[str]]:
-        """
-        텔레그램 메시지에서 출결 정보 추출
-
-        Args:
-            message: 텔레그램 메시지 원문
-            context: 이전 대화 맥락 (선택)
-                {
-                    'messages': [{'text': '...', 'timestamp': ...}],
-                    'partial_data': {'student_name': '...', ...}
-                }
-
-        Returns:
-            (추출된 데이터, 에러 메시지)
-        """
-
-        # 현재 날짜 계산
-        today = datetime.now().date()
-        tomorrow = today + timedelta(days=1)
-        today_str = today.strftime("%Y-%m-%d")
-        tomorrow_str = tomorrow.strftime("%Y-%m-%d")
-
-        # 요일 정보 (한글)
-        weekday_names = ["월요일", "화요일", "수요일", "목요일", "금요일", "토요일", "일요일"]
-        today_weekday = weekday_names[today.weekday()]
-
-        # 다음주 날짜 계산 (월~일)
-        days_until_next_monday = (7 - today.weekday()) % 7 or 7
-        next_week_monday = today + timedelta(days=days_until_next_monday)
-        next_week_dates = {
-            "월요일": (next_week_monday).strftime("%Y-%m-%d"),
-            "화요일": (next_week_monday + timedelta(days=1)).strftime("%Y-%m-%d"),
-            "수요일": (next_week_monday + timedelta(days=2)).strftime("%Y-%m-%d"),
-            "목요일": (next_week_monday + timedelta(days=3)).strftime("%Y-%m-%d"),
-            "금요일": (next_week_monday + timedelta(days=4)).strftime("%Y-%m-%d"),
-            "토요일": (next_week_monday + timedelta(days=5)).strftime("%Y-%m-%d"),
-            "일요일": (next_week_monday + timedelta(days=6)).strftime("%Y-%m-%d"),
-        }
-
-        # 대화 맥락 처리
-        context_info = ""
-        has_context = False
-        partial_data = context.get('partial_data', {}) if context else {}
-
-        if context and context.get('messages'):
-            has_context = True
-            context_info = "\n\n## 🔄 대화 맥락이 있습니다 - 이전 정보와 현재 메시지를 합쳐주세요!\n\n"
-            context_info += "**이전 대화 내용:**\n"
-            for msg in context['messages'][-3:]:  # 최근 3개 메시지만
-                context_info += f"- {msg['text']}\n"
-            context_info += f"\n**현재 메시지**: {message}\n"
-
-        if partial_data:
-            has_context = True
-            context_info += f"\n**이미 알고 있는 정보 (반드시 유지하세요!):**\n"
-            context_info += f"```json\n{json.dumps(partial_data, ensure_ascii=False, indent=2)}\n```\n"
-            context_info += "\n**⚠️ 매우 중요:**\n"
-            context_info += "1. 위의 '이미 알고 있는 정보'에서 null이 아닌 값들은 **반드시 그대로 유지**하세요\n"
-            context_info += "2. 현재 메시지에서 **새로운 정보(사유, 날짜 등)를 추출**하여 null 필드만 채우세요\n"
-            context_info += "3. 현재 메시지가 짧더라도, 이전 정보와 결합하면 완전한 데이터가 됩니다\n"
-            context_info += "4. 이전 정보의 student_name, date, attendance_type 등을 **절대 null로 만들지 마세요**\n\n"
-
-        prompt = f"""당신은 초등학교 출결 관리 시스템입니다. 학부모/학생이 보낸 메시지를 읽고 출결 정보를 파악해주세요.
-
-**메시지**: "{message}"
+사용자 메시지에는 **오늘 날짜**, (있다면) **대화 맥락**, 그리고 분석할 **메시지**가 주어집니다.
 
 ---
 
@@ -99,20 +42,6 @@ class ClaudeMessageParser:
 
 **현재 메시지가 위 특징이 없다면 → intent: null**
 
----{context_info}
-
-**오늘 날짜**: {today_str} ({today_weekday})
-**내일 날짜**: {tomorrow_str}
-
-**다음주 날짜:**
-- 다음주 월요일: {next_week_dates['월요일']}
-- 다음주 화요일: {next_week_dates['화요일']}
-- 다음주 수요일: {next_week_dates['수요일']}
-- 다음주 목요일: {next_week_dates['목요일']}
-- 다음주 금요일: {next_week_dates['금요일']}
-- 다음주 토요일: {next_week_dates['토요일']}
-- 다음주 일요일: {next_week_dates['일요일']}
-
 ---
 
 ## 출결 분류 체계 (⚠️ 매우 중요!)
@@ -174,19 +103,10 @@ class ClaudeMessageParser:
    - "홍길동", "길동이", "주선" 등
    - 이름이 없으면 빈 문자열("") 또는 null
 
-2. **날짜** (⚠️ 정확히 계산하세요!):
-   - "오늘" → {today_str}
-   - "내일" → {tomorrow_str}
-   - **"다음주 월요일"** → {next_week_dates['월요일']}
-   - **"다음주 화요일"** → {next_week_dates['화요일']}
-   - **"다음주 수요일"** → {next_week_dates['수요일']}
-   - **"다음주 목요일"** → {next_week_dates['목요일']}
-   - **"다음주 금요일"** → {next_week_dates['금요일']}
-   - **"다음주 토요일"** → {next_week_dates['토요일']}
-   - **"다음주 일요일"** → {next_week_dates['일요일']}
-   - "11/20", "11월 20일" → 2025-11-20
-   - 날짜 언급 없으면 → {today_str}
-   - 기간("내일부터 3일간") → date와 end_date 모두 설정
+2. **날짜 표현** (⚠️ 날짜를 계산하지 마세요!):
+   - 메시지에 나온 날짜 표현을 **그대로** date_phrase에 넣으세요 (시스템이 계산합니다)
+   - 예: "오늘", "내일", "다음주 금요일", "11월 20일", "11/20", "내일부터 3일간", "월요일부터 수요일까지"
+   - 날짜 언급이 없으면 빈 문자열("")
 
 3. **출결 타입 정확하게 판단 (매우 중요!):**
 
@@ -219,19 +139,28 @@ class ClaudeMessageParser:
 
 ---
 
-## 응답 형식 (JSON)
+## 응답 형식 (record_attendance 도구)
+
+반드시 `record_attendance` 도구를 호출해 결과를 전달하세요. 도구 입력은 `{"records": [...]}` 형태이며
+**학생 한 명당 항목 하나**입니다. 아래 예시의 **출력**은 모두 records 배열의 항목입니다.
+
+- 한 메시지에 여러 학생이 나오면 (예: "철수랑 영희 둘 다 오늘 결석", 교사가 붙여넣은 결석자 명단) 학생마다 항목을 따로 만드세요
+- 공통으로 적힌 날짜/타입/사유는 각 항목에 모두 넣으세요
+- 출결 메시지가 아니거나 학생이 한 명이면 항목은 하나입니다
+- 항목은 **현재 메시지에 해당하는 학생만** 만드세요. 이전 대화에 나온 학생은 현재 메시지가 그 학생 정보를 보충할 때만 포함하고, 이미 접수된 다른 학생을 다시 넣지 마세요
 
-{{
+records 배열의 각 항목:
+
+{
     "intent": "create" | "update" | "cancel",
     "student_name": "학생 이름 또는 빈 문자열",
-    "date": "YYYY-MM-DD",
-    "end_date": "YYYY-MM-DD 또는 null",
+    "date_phrase": "메시지의 날짜 표현 그대로 또는 빈 문자열",
     "attendance_type": "결석" | "지각" | "조퇴" | null,
     "attendance_reason": "질병" | "출석인정" | "미인정" | null,
     "confidence": 0.0~1.0,
     "clarification_needed": true | false,
     "clarification_question": "추가 질문 (필요시)"
-}}
+}
 
 ---
 
@@ -251,205 +180,736 @@ class ClaudeMessageParser:
 
 **이미 알고 있는 정보**:
 ```json
-{{
+{
   "student_name": "주선",
   "date": "2025-11-18",
   "attendance_type": "지각",
   "attendance_reason": null
-}}
+}
 ```
 
 **현재 메시지**: "병원 가야 해서요"
 
 **출력** (이전 정보 유지 + 새 정보 추가):
-{{
+{
     "intent": "create",
     "student_name": "주선",
-    "date": "2025-11-18",
-    "end_date": null,
+    "date_phrase": "",
     "attendance_type": "지각",
     "attendance_reason": "질병",
     "confidence": 0.95,
     "clarification_needed": false,
     "clarification_question": null
-}}
+}
 
 ### 예시 2: 출결 메시지가 아닌 경우 (⚠️ 중요!)
+(날짜 질문에는 '(오늘 날짜)' 대신 사용자 메시지에 주어진 오늘 날짜를 넣어 답하세요)
 
 **입력**: "오늘은 몇일이죠?"
 **출력**:
-{{
+{
     "intent": null,
     "student_name": "",
-    "date": null,
-    "end_date": null,
+    "date_phrase": "",
     "attendance_type": null,
     "attendance_reason": null,
     "confidence": 1.0,
     "clarification_needed": true,
-    "clarification_question": "오늘은 {today_str} ({today_weekday})입니다.\\n\\n출결 정보를 보내려면 다음과 같이 보내주세요:\\n예: '홍길동 아파서 결석', '내일 지각합니다'"
-}}
+    "clarification_question": "오늘은 (오늘 날짜)입니다.\\n\\n출결 정보를 보내려면 다음과 같이 보내주세요:\\n예: '홍길동 아파서 결석', '내일 지각합니다'"
+}
 
-### 예시 3: 다음주 날짜 계산
+### 예시 3: 날짜 표현은 그대로 전달
 
 **입력**: "주선이 다음주 수요일에 지각해요"
 **출력**:
-{{
+{
     "intent": "create",
     "student_name": "주선",
-    "date": "{next_week_dates['수요일']}",
-    "end_date": null,
+    "date_phrase": "다음주 수요일",
     "attendance_type": "지각",
     "attendance_reason": null,
     "confidence": 0.6,
     "clarification_needed": true,
     "clarification_question": "지각 사유를 알려주시겠어요? (예: 아파서, 병원 가야 해서, 개인 사정)"
-}}
+}
 
 ### 예시 4: 조퇴
 
 **입력**: "주선이 내일 3교시 끝나고 조퇴할게요"
 **출력**:
-{{
+{
     "intent": "create",
     "student_name": "주선",
-    "date": "{tomorrow_str}",
-    "end_date": null,
+    "date_phrase": "내일",
     "attendance_type": "조퇴",
     "attendance_reason": null,
     "confidence": 0.6,
     "clarification_needed": true,
     "clarification_question": "조퇴 사유를 알려주시겠어요? (예: 아파서, 병원 가야 해서, 개인 사정)"
-}}
+}
 
-### 예시 3: 지각 (늦게 등교)
+### 예시 5: 지각 (늦게 등교)
 
 **입력**: "주선이 다음주 화요일에 지각해요"
 **출력**:
-{{
+{
     "intent": "create",
     "student_name": "주선",
-    "date": "2025-11-18",
-    "end_date": null,
+    "date_phrase": "다음주 화요일",
     "attendance_type": "지각",
     "attendance_reason": null,
     "confidence": 0.6,
     "clarification_needed": true,
     "clarification_question": "지각 사유를 알려주시겠어요? (예: 아파서, 병원 가야 해서, 개인 사정)"
-}}
+}
 
-### 예시 4: 결석 (주의: 타입 vs 사유 구분!)
+### 예시 6: 결석 (주의: 타입 vs 사유 구분!)
 
 **입력**: "주선이 오늘 아파요"
 **출력**:
-{{
+{
     "intent": "create",
     "student_name": "주선",
-    "date": "{today_str}",
-    "end_date": null,
+    "date_phrase": "오늘",
     "attendance_type": "결석",
     "attendance_reason": "질병",
     "confidence": 0.9,
     "clarification_needed": false,
     "clarification_question": null
-}}
+}
 ⚠️ **주의**: "아파요"는 결석의 **사유(질병)**이지 **타입**이 아닙니다!
 
 **입력**: "홍길동 아파서 결석입니다"
 **출력**:
-{{
+{
     "intent": "create",
     "student_name": "홍길동",
-    "date": "{today_str}",
-    "end_date": null,
+    "date_phrase": "",
     "attendance_type": "결석",
     "attendance_reason": "질병",
     "confidence": 0.95,
     "clarification_needed": false,
     "clarification_question": null
-}}
+}
 
-### 예시 5: 체험학습
+### 예시 7: 체험학습
 
 **입력**: "김철수 체험학습으로 내일부터 3일간 결석"
 **출력**:
-{{
+{
     "intent": "create",
     "student_name": "김철수",
-    "date": "{tomorrow_str}",
-    "end_date": "{(tomorrow + timedelta(days=2)).strftime('%Y-%m-%d')}",
+    "date_phrase": "내일부터 3일간",
     "attendance_type": "결석",
     "attendance_reason": "출석인정",
     "confidence": 0.95,
     "clarification_needed": false,
     "clarification_question": null
-}}
-
-이제 위 메시지를 분석하여 JSON만 반환하세요. 다른 설명은 필요 없습니다.
+}
+
+### 예시 8: 여러 학생 (학생마다 항목 하나)
+
+**입력**: "철수랑 영희 둘 다 오늘 감기로 결석합니다"
+**출력** (records):
+[
+    {
+        "intent": "create",
+        "student_name": "철수",
+        "date_phrase": "오늘",
+        "attendance_type": "결석",
+        "attendance_reason": "질병",
+        "confidence": 0.9,
+        "clarification_needed": false,
+        "clarification_question": null
+    },
+    {
+        "intent": "create",
+        "student_name": "영희",
+        "date_phrase": "오늘",
+        "attendance_type": "결석",
+        "attendance_reason": "질병",
+        "confidence": 0.9,
+        "clarification_needed": false,
+        "clarification_question": null
+    }
+]
+
+주어진 메시지를 분석하여 record_attendance 도구로만 응답하세요. 다른 설명은 필요 없습니다.
 """
 
-        # API 호출 재시도 로직 (과부하 에러 대응)
-        max_retries = 3
-        retry_delay = 1  # 초 단위
+# 날짜는 date_resolver가 계산하므로 모델 출력에서 제외
+LOCALLY_RESOLVED_FIELDS = {"date", "end_date"}
+
+# 도구 스키마에서 허용값을 제한할 필드
+FIELD_ENUMS = {
+    "intent": ["create", "update", "cancel", None],
+    "attendance_type": ["결석", "지각", "조퇴", None],
+    "attendance_reason": ["질병", "출석인정", "미인정", None],
+}
+
+
+def build_record_schema() -> dict:
+    """
+    ExtractedAttendanceData에서 records 항목 스키마 생성
+
+    설명/제목은 system 프롬프트에 이미 있으므로 빼고(토큰 절약),
+    nullable 필드는 type 배열로, 분류 필드는 enum으로 압축합니다.
+    """
+    schema = ExtractedAttendanceData.model_json_schema()
+    properties = {}
+    for name, field_schema in schema["properties"].items():
+        if name in LOCALLY_RESOLVED_FIELDS:
+            continue
+
+        if "anyOf" in field_schema:
+            compact = {"type": [option["type"] for option in field_schema["anyOf"]]}
+        else:
+            compact = {"type": field_schema["type"]}
+        for bound in ("minimum", "maximum"):
+            if bound in field_schema:
+                compact[bound] = field_schema[bound]
+        if name in FIELD_ENUMS:
+            compact = {"enum": FIELD_ENUMS[name]}
+        properties[name] = compact
+
+    return {
+        "type": "object",
+        "properties": properties,
+        "required": [name for name in properties if name not in ("clarification_question",)],
+    }
+
+
+def build_tool_schema() -> dict:
+    """도구 입력 스키마 (학생별 항목 배열, 여러 학생도 한 번의 호출로 추출)"""
+    return {
+        "type": "object",
+        "properties": {
+            "records": {"type": "array", "items": build_record_schema(), "minItems": 1},
+        },
+        "required": ["records"],
+    }
+
+
+# 구조화된 출력용 도구 (응답 텍스트에서 JSON을 찾지 않고 도구 입력을 바로 검증)
+EXTRACTION_TOOL = {
+    "name": "record_attendance",
+    "description": "메시지에서 추출한 출결 정보를 학생별로 기록합니다.",
+    "input_schema": build_tool_schema(),
+}
+TOOL_CHOICE = {"type": "tool", "name": EXTRACTION_TOOL["name"]}
+
+# 도구 입력만 생성하므로 출력 토큰 상한을 낮게 유지 (학생 1명당 약 80토큰, 명단 10여 명까지 수용)
+MAX_OUTPUT_TOKENS = int(os.getenv("CLAUDE_MAX_OUTPUT_TOKENS", "1024"))
+
+# cache_control 마커가 붙은 system 블록 (모든 호출에서 동일한 접두부 → 캐시 재사용)
+SYSTEM_BLOCKS = [{
+    "type": "text",
+    "text": SYSTEM_PROMPT,
+    "cache_control": {"type": "ephemeral"},
+}]
 
-        for attempt in range(max_retries):
-            try:
-                response = self.client.messages.create(
-                    model="claude-haiku-4-5-20251001",
-                    max_tokens=1024,
-                    messages=[{
-                        "role": "user",
-                        "content": prompt
-                    }]
-                )
-                break  # 성공하면 루프 탈출
-
-            except Exception as api_error:
-                # 과부하 에러(529) 또는 재시도 가능한 에러 체크
-                error_message = str(api_error)
-                is_retryable = "overloaded" in error_message.lower() or "529" in error_message
-
-                if is_retryable and attempt < max_retries - 1:
-                    # 재시도 가능하고 마지막 시도가 아니면 대기 후 재시도
-                    wait_time = retry_delay * (2 ** attempt)  # 지수 백오프: 1초, 2초, 4초
-                    print(f"[INFO] API 과부하 감지. {wait_time}초 후 재시도... (시도 {attempt + 1}/{max_retries})")
-                    time.sleep(wait_time)
-                else:
-                    # 재시도 불가능하거나 마지막 시도면 에러 발생
-                    raise
 
+class ClaudeMessageParser:
+    """Claude AI를 사용한 출결 메시지 파싱"""
+
+    def __init__(self, client=None, limiter: LLMCallLimiter = None):
+        """
+        Args:
+            client: AsyncAnthropic 호환 클라이언트 (기본값: ANTHROPIC_API_KEY로 생성,
+                벤치마크에서는 녹화된 응답을 재생하는 가짜 클라이언트를 주입)
+            limiter: 호출 제한기 (기본값: 프로세스 공용 제한기)
+        """
+        self._owns_client = client is None
+        if client is None:
+            client = self._create_client()
+        self.async_client = client
+
+        # 동기 래퍼 전용 이벤트 루프와 그 루프에서만 쓰는 클라이언트/제한기
+        # (AsyncAnthropic 연결과 제한기의 asyncio 객체는 만든 루프에 묶여 있어 루프끼리 공유하지 않음)
+        self._sync_loop = None
+        self._sync_client = None
+        self._sync_limiter = None
+        self._sync_lock = threading.Lock()
+
+        # 봇과 배치 작업이 공유하는 동시성/속도 제한 + 회로 차단기
+        # queue_when_open: 회로가 열렸을 때 True면 대기(배치), False면 즉시 실패(봇)
+        self.limiter = limiter or get_llm_limiter()
+        self.queue_when_open = False
+
+        # 비동기 호출 타임아웃 (초)
+        self.request_timeout = float(os.getenv("CLAUDE_REQUEST_TIMEOUT", "20"))
+        self.total_timeout = float(os.getenv("CLAUDE_TOTAL_TIMEOUT", "45"))
+
+        # 모델 티어: 빠른 모델이 먼저 처리하고, 불확실할 때만 상위 모델로 승급
+        self.model_tiers = [("fast", os.getenv("CLAUDE_FAST_MODEL", "claude-haiku-4-5-20251001"))]
+        strong_model = os.getenv("CLAUDE_STRONG_MODEL", "claude-sonnet-4-5-20250929")
+        if strong_model:
+            self.model_tiers.append(("strong", strong_model))
+        self.escalation_confidence = float(os.getenv("CLAUDE_ESCALATION_CONFIDENCE", "0.8"))
+        self.tier_stats = {
+            tier: {"model": model, "calls": 0, "latency_ms_total": 0.0, "input_tokens": 0, "output_tokens": 0, "escalations": 0}
+            for tier, model in self.model_tiers
+        }
+
+        # 토큰 사용량/프롬프트 캐시 통계
+        self.usage_stats = {
+            "calls": 0,
+            "input_tokens": 0,
+            "output_tokens": 0,
+            "cache_creation_input_tokens": 0,
+            "cache_read_input_tokens": 0,
+            "cache_hits": 0,
+        }
+
+        # 정형화된 메시지용 규칙 기반 분류기 (LLM 호출 전 단계)
+        rules_enabled = os.getenv("RULE_PARSER_ENABLED", "true").lower() == "true"
+        self.rule_parser = RuleBasedParser() if rules_enabled else None
+
+        # 과거 메시지로 학습한 로컬 분류기 (train_local_classifier.py로 학습, 없으면 건너뜀)
+        local_enabled = os.getenv("LOCAL_CLASSIFIER_ENABLED", "true").lower() == "true"
+        self.local_classifier = LocalClassifier.load() if local_enabled else None
+
+        # 동일 메시지 재전송용 결과 캐시 (LRU + TTL, 자정에 만료)
+        cache_enabled = os.getenv("PARSE_CACHE_ENABLED", "true").lower() == "true"
+        self.result_cache = ParseResultCache() if cache_enabled else None
+
+    def _build_prompt(self, message: str, context: dict = None, today: date = None) -> str:
+        """
+        메시지별 동적 사용자 프롬프트 생성 (정적 규칙은 SYSTEM_PROMPT)
+
+        Args:
+            message: 텔레그램 메시지 원문
+            context: 이전 대화 맥락 (선택)
+            today: 기준 날짜 (기본값: 오늘, 과거 메시지 재처리용)
+
+        Returns:
+            사용자 프롬프트 문자열
+        """
+
+        # 오늘 날짜 (날짜 계산은 date_resolver가 담당하므로 날짜 질문 응답용으로만 사용)
+        today_desc = describe_today(today)
+
+        # 대화 맥락 처리
+        context_info = ""
+        has_context = False
+        partial_data = context.get('partial_data', {}) if context else {}
+
+        if context and context.get('messages'):
+            has_context = True
+            context_info = "\n\n## 🔄 대화 맥락이 있습니다 - 이전 정보와 현재 메시지를 합쳐주세요!\n\n"
+            context_info += "**이전 대화 내용:**\n"
+            for msg in context['messages'][-3:]:  # 최근 3개 메시지만
+                context_info += f"- {msg['text']}\n"
+            context_info += f"\n**현재 메시지**: {message}\n"
+            context_info += "(이전 대화는 현재 메시지의 빠진 정보를 채우는 데만 쓰고, 현재 메시지와 관계없는 학생의 항목은 만들지 마세요)\n"
+
+        if partial_data:
+            has_context = True
+            context_info += f"\n**이미 알고 있는 정보 (반드시 유지하세요!):**\n"
+            context_info += f"```json\n{json.dumps(partial_data, ensure_ascii=False, indent=2)}\n```\n"
+            context_info += "\n**⚠️ 매우 중요:**\n"
+            context_info += "1. 위의 '이미 알고 있는 정보'에서 null이 아닌 값들은 **반드시 그대로 유지**하세요\n"
+            context_info += "2. 현재 메시지에서 **새로운 정보(사유, 날짜 등)를 추출**하여 null 필드만 채우세요\n"
+            context_info += "3. 현재 메시지가 짧더라도, 이전 정보와 결합하면 완전한 데이터가 됩니다\n"
+            context_info += "4. 이전 정보의 student_name, date, attendance_type 등을 **절대 null로 만들지 마세요**\n\n"
+
+        user_prompt = f"""**오늘 날짜**: {today_desc}
+{context_info}
+**메시지**: "{message}"
+
+record_attendance 도구로 응답하세요."""
+        return user_prompt
+
+    def _record_usage(self, response, tier: str, latency_ms: float):
+        """응답의 토큰 사용량, 프롬프트 캐시 적중 여부, 티어별 지연시간 기록"""
+        tier_stats = self.tier_stats[tier]
+        tier_stats["calls"] += 1
+        tier_stats["latency_ms_total"] += latency_ms
+
+        usage = getattr(response, "usage", None)
+        if usage is None:
+            return
+
+        cache_read = getattr(usage, "cache_read_input_tokens", None) or 0
+        cache_creation = getattr(usage, "cache_creation_input_tokens", None) or 0
+
+        self.usage_stats["calls"] += 1
+        self.usage_stats["input_tokens"] += usage.input_tokens
+        self.usage_stats["output_tokens"] += usage.output_tokens
+        self.usage_stats["cache_creation_input_tokens"] += cache_creation
+        self.usage_stats["cache_read_input_tokens"] += cache_read
+        if cache_read:
+            self.usage_stats["cache_hits"] += 1
+
+        tier_stats["input_tokens"] += usage.input_tokens
+        tier_stats["output_tokens"] += usage.output_tokens
+
+        logger.info(
+            f"Claude 호출 [{tier}:{tier_stats['model']}] {latency_ms:.0f}ms, "
+            f"input={usage.input_tokens}, output={usage.output_tokens}, "
+            f"cache_read={cache_read}, cache_write={cache_creation} "
+            f"(캐시 적중 {self.usage_stats['cache_hits']}/{self.usage_stats['calls']})"
+        )
+
+    def get_usage_stats(self) -> dict:
+        """누적 토큰 사용량 및 캐시 적중률"""
+        stats = dict(self.usage_stats)
+        stats["cache_hit_rate"] = round(stats["cache_hits"] / stats["calls"], 4) if stats["calls"] else 0.0
+        return stats
+
+    def get_routing_stats(self) -> dict:
+        """티어별 호출 수, 평균 지연시간, 토큰 사용량, 승급률 (로컬 분류기는 적중률)"""
+        routing = {}
+        if self.local_classifier:
+            routing["local"] = self.local_classifier.get_stats()
+        for tier, stats in self.tier_stats.items():
+            calls = stats["calls"]
+            routing[tier] = {
+                "model": stats["model"],
+                "calls": calls,
+                "avg_latency_ms": round(stats["latency_ms_total"] / calls, 1) if calls else 0.0,
+                "input_tokens": stats["input_tokens"],
+                "output_tokens": stats["output_tokens"],
+                "escalations": stats["escalations"],
+                "escalation_rate": round(stats["escalations"] / calls, 4) if calls else 0.0,
+            }
+        return routing
+
+    def _cache_key(self, message: str, context: dict, use_cache: bool) -> Optional[tuple]:
+        """결과 캐시 키 (캐시 미사용/대화 기록이 있는 경우 None)"""
+        if not use_cache or not self.result_cache:
+            return None
+        return self.result_cache.make_key(message, context)
+
+    def _cache_result(self, cache_key: Optional[tuple], result: tuple):
+        """추출에 성공한 결과만 캐시 (파싱 오류 등 일시적 실패는 다시 호출)"""
+        if cache_key and result[0] is not None:
+            self.result_cache.put(cache_key, result)
+
+    def _try_rule_parser(self, message: str, context: dict = None, today: date = None) -> Optional[ExtractedAttendanceData]:
+        """정형화된 메시지는 LLM 없이 규칙으로 처리 (확신이 없으면 None)"""
+        if not self.rule_parser:
+            return None
+        return self.rule_parser.parse(message, context, today)
+
+    def _try_local_classifier(self, message: str, context: dict = None, today: date = None) -> Optional[ExtractedAttendanceData]:
+        """규칙으로 못 잡은 짧은 메시지를 로컬 분류기로 처리 (확률이 낮으면 None)"""
+        if not self.local_classifier:
+            return None
+        slots = extract_slots(message, context, today)
+        if slots is None:
+            return None
+        result = self.local_classifier.classify(slots)
+        if result:
+            logger.info(f"로컬 분류기 처리: {message} (확률 {result.confidence}, 적중률 {self.local_classifier.hit_rate:.1%})")
+        return result
+
+    @staticmethod
+    def _create_client() -> AsyncAnthropic:
+        api_key = os.getenv("ANTHROPIC_API_KEY")
+        if not api_key:
+            raise ValueError("ANTHROPIC_API_KEY environment variable is required")
+        # 재시도는 공용 limiter가 담당하므로 SDK 자체 재시도는 끔
+        return AsyncAnthropic(api_key=api_key, max_retries=0)
+
+    def parse_attendance_message(self, message: str, context: dict = None, use_cache: bool = True) -> tuple[Optional[ExtractedAttendanceData], Optional[str]]:
+        """
+        텔레그램 메시지에서 출결 정보 추출 (동기 버전, 스크립트용)
+
+        파서 전용 이벤트 루프(호출 간 재사용, close_sync_loop로 정리)에서 parse_attendance_message_async를 실행하며,
+        그 루프에서는 별도의 클라이언트와 제한기를 씁니다 (주입된 클라이언트는 그대로 사용).
+        이벤트 루프 안(텔레그램 봇 핸들러 등)에서는 parse_attendance_message_async를 사용하세요.
+
+        Args:
+            message: 텔레그램 메시지 원문
+            context: 이전 대화 맥락 (선택)
+                {
+                    'messages': [{'text': '...', 'timestamp': ...}],
+                    'partial_data': {'student_name': '...', ...}
+                }
+            use_cache: False면 결과 캐시를 사용하지 않음
+                (대화 기록이 있는 메시지는 항상 캐시하지 않음)
+
+        Returns:
+            (추출된 데이터, 에러 메시지)
+        """
         try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            pass
+        else:
+            raise RuntimeError("이벤트 루프 안에서는 parse_attendance_message_async를 사용하세요")
+
+        with self._sync_lock:
+            if self._sync_loop is None or self._sync_loop.is_closed():
+                self._sync_client = self._create_client() if self._owns_client else self.async_client
+                self._sync_limiter = LLMCallLimiter()
+                self._sync_loop = asyncio.new_event_loop()
+                atexit.register(self.close_sync_loop)
+            return self._sync_loop.run_until_complete(self.parse_attendance_message_async(message, context, use_cache))
+
+    def close_sync_loop(self):
+        """동기 래퍼 전용 루프와 그 루프의 클라이언트 정리 (프로세스 종료 시 자동 호출)"""
+        with self._sync_lock:
+            loop, self._sync_loop = self._sync_loop, None
+            if loop is None or loop.is_closed():
+                return
+            try:
+                if self._owns_client and self._sync_client is not None:
+                    loop.run_until_complete(self._sync_client.close())
+                loop.run_until_complete(loop.shutdown_asyncgens())
+            finally:
+                loop.close()
+                self._sync_client = None
+                self._sync_limiter = None
+
+    async def parse_attendance_message_async(self, message: str, context: dict = None, use_cache: bool = True) -> tuple[Optional[ExtractedAttendanceData], Optional[str]]:
+        """
+        텔레그램 메시지에서 출결 정보 추출 (비동기 버전, 첫 번째 학생만)
+
+        여러 학생이 포함될 수 있는 메시지는 parse_attendance_batch_async를 사용하세요.
+
+        Returns:
+            (추출된 데이터, 에러 메시지)
+        """
+        records, error = await self.parse_attendance_batch_async(message, context, use_cache)
+        return (records[0] if records else None), error
+
+    async def parse_attendance_batch_async(self, message: str, context: dict = None, use_cache: bool = True, today: date = None) -> tuple[Optional[list[ExtractedAttendanceData]], Optional[str]]:
+        """
+        텔레그램 메시지에서 학생별 출결 정보 추출 (비동기 버전)
+
+        "철수랑 영희 둘 다 오늘 결석"이나 결석자 명단처럼 여러 학생이 있어도
+        한 번의 Claude 호출로 학생마다 하나씩 추출합니다.
+
+        AsyncAnthropic 클라이언트와 asyncio.sleep 백오프를 사용하므로
+        API 응답을 기다리는 동안 봇의 이벤트 루프를 막지 않습니다.
+        요청마다 request_timeout, 티어별 전체 재시도에 total_timeout이 적용되며
+        작업이 취소되면 CancelledError가 그대로 전파됩니다.
+        모든 호출은 공용 limiter(동시성/속도 제한, 회로 차단기)를 거치고,
+        재시도 후에도 실패한 API 에러는 호출자에게 전파됩니다.
+
+        Args:
+            message: 텔레그램 메시지 원문
+            context: 이전 대화 맥락 (선택, parse_attendance_message와 동일)
+            use_cache: False면 결과 캐시를 사용하지 않음
+            today: 날짜 표현의 기준 날짜 (기본값: 오늘, 과거 메시지 재처리 시 받은 날짜,
+                지정하면 결과 캐시를 사용하지 않음)
+
+        Returns:
+            (학생별 추출 데이터 목록, 에러 메시지)
+        """
+        fast_result = self._try_rule_parser(message, context, today) or self._try_local_classifier(message, context, today)
+        if fast_result:
+            return [fast_result], None
+
+        cache_key = self._cache_key(message, context, use_cache and today is None)
+        if cache_key:
+            cached = self.result_cache.get(cache_key)
+            if cached is not None:
+                return cached
 
-            # 응답에서 JSON 추출
-            response_text = response.content[0].text.strip()
+        prompt = self._build_prompt(message, context, today)
 
-            # 디버깅: 응답 로그 출력
-            print(f"[DEBUG] Claude AI 원본 응답: {response_text}")
+        try:
+            result = await self._parse_with_tiers(prompt, context, today)
+        except asyncio.TimeoutError:
+            logger.warning(f"Claude API 응답 시간 초과 ({self.total_timeout}초): {message}")
+            return None, "AI 응답이 지연되고 있습니다. 잠시 후 다시 보내주세요."
+        except CircuitOpenError as circuit_error:
+            logger.warning(f"Claude API 회로 차단 중 ({circuit_error.retry_in:.0f}초 후 재시도): {message}")
+            return None, "AI 서비스가 일시적으로 혼잡합니다. 잠시 후 다시 보내주세요."
+
+        self._cache_result(cache_key, result)
+        return result
+
+    async def _parse_with_tiers(self, prompt: str, context: dict = None, today: date = None) -> tuple[Optional[list[ExtractedAttendanceData]], Optional[str]]:
+        """빠른 모델부터 호출하고, 결과가 불확실할 때만 상위 모델로 승급"""
+        payload = None
+
+        for index, (tier, model) in enumerate(self.model_tiers):
+            started = time.perf_counter()
+            call_info = {"attempts": 0}
+            try:
+                response = await asyncio.wait_for(
+                    self._create_message_with_retry(prompt, model, call_info),
+                    timeout=self.total_timeout
+                )
+            except BaseException as call_error:
+                self._record_call(tier, model, started, call_info, outcome=self._call_outcome(call_error), error=call_error)
+                raise
+            latency_ms = (time.perf_counter() - started) * 1000
+            self._record_usage(response, tier, latency_ms)
+
+            tier_payload = self._extract_payload(response)
+            self._record_call(
+                tier, model, started, call_info,
+                outcome="success" if tier_payload is not None else "no_tool_output",
+                response=response
+            )
+            if tier_payload is not None:
+                # 상위 모델 응답이 깨졌으면 하위 모델의 유효한 응답 유지
+                payload = tier_payload
+
+            reason = self._escalation_reason(tier_payload)
+            if reason is None or index == len(self.model_tiers) - 1:
+                break
+
+            self.tier_stats[tier]["escalations"] += 1
+            logger.info(f"상위 모델로 승급: {tier} → {self.model_tiers[index + 1][0]} (사유: {reason})")
+
+        if payload is None:
+            return None, "AI 응답을 파싱할 수 없습니다."
+        return self._finalize_payload(payload, context, today)
+
+    def _escalation_reason(self, payload: Optional[list]) -> Optional[str]:
+        """상위 모델로 승급해야 하는 이유 (승급 불필요 시 None, 학생 중 하나라도 불확실하면 승급)"""
+        if payload is None:
+            return "no_tool_output"
+        for record in payload:
+            reason = self._record_escalation_reason(record)
+            if reason:
+                return reason
+        return None
+
+    def _record_escalation_reason(self, payload: dict) -> Optional[str]:
+        """학생 1명 항목의 승급 사유"""
+        if payload.get("intent") in (None, "", "null"):
+            # 인사/질문 등 출결 메시지가 아닌 경우는 빠른 모델 응답으로 충분
+            return None
+        if payload.get("clarification_needed"):
+            return "clarification"
+        if (payload.get("confidence") or 0) < self.escalation_confidence:
+            return "low_confidence"
+        try:
+            ExtractedAttendanceData.model_validate(payload)
+        except ValidationError:
+            return "validation"
+        return None
+
+    @staticmethod
+    def _call_outcome(error: BaseException) -> str:
+        """호출 실패 원인 분류 (llm_calls.outcome)"""
+        if isinstance(error, asyncio.TimeoutError):
+            return "timeout"
+        if isinstance(error, CircuitOpenError):
+            return "circuit_open"
+        if isinstance(error, asyncio.CancelledError):
+            return "cancelled"
+        if isinstance(error, APIStatusError):
+            return f"http_{error.status_code}"
+        return "error"
+
+    @staticmethod
+    def _record_call(tier: str, model: str, started: float, call_info: dict, outcome: str, response=None, error: BaseException = None):
+        """호출 1건을 텔레메트리에 기록 (collect_llm_calls 안에서만 저장됨)"""
+        usage = getattr(response, "usage", None)
+        record_llm_call(
+            model=model,
+            tier=tier,
+            input_tokens=usage.input_tokens if usage else 0,
+            output_tokens=usage.output_tokens if usage else 0,
+            cache_read_input_tokens=(getattr(usage, "cache_read_input_tokens", None) or 0) if usage else 0,
+            cache_creation_input_tokens=(getattr(usage, "cache_creation_input_tokens", None) or 0) if usage else 0,
+            latency_ms=(time.perf_counter() - started) * 1000,
+            attempts=call_info["attempts"],
+            outcome=outcome,
+            error_message=str(error)[:500] if error is not None else None,
+        )
+
+    async def _create_message_with_retry(self, prompt: str, model: str, call_info: dict = None):
+        """
+        공용 limiter를 거친 AsyncAnthropic 호출 (429/529/5xx는 지터 백오프 후 재시도)
 
-            # JSON 블록에서 추출
-            if "```json" in response_text:
-                json_start = response_text.find("```json") + 7
-                json_end = response_text.find("```", json_start)
-                response_text = response_text[json_start:json_end].strip()
-            elif "```" in response_text:
-                json_start = response_text.find("```") + 3
-                json_end = response_text.find("```", json_start)
-                response_text = response_text[json_start:json_end].strip()
-            else:
-                # JSON 블록이 없는 경우, 중괄호로 JSON 찾기
-                if "{" in response_text and "}" in response_text:
-                    json_start = response_text.find("{")
-                    json_end = response_text.rfind("}") + 1
-                    response_text = response_text[json_start:json_end].strip()
+        call_info가 주어지면 실제 API 시도 횟수를 call_info["attempts"]에 기록합니다.
+        """
+        client, limiter = self.async_client, self.limiter
+        if self._sync_loop is not None and asyncio.get_running_loop() is self._sync_loop:
+            client, limiter = self._sync_client, self._sync_limiter
+
+        def send():
+            if call_info is not None:
+                call_info["attempts"] += 1
+            return asyncio.wait_for(
+                client.messages.create(
+                    model=model,
+                    max_tokens=MAX_OUTPUT_TOKENS,
+                    system=SYSTEM_BLOCKS,
+                    tools=[EXTRACTION_TOOL],
+                    tool_choice=TOOL_CHOICE,
+                    messages=[{
+                        "role": "user",
+                        "content": prompt
+                    }]
+                ),
+                timeout=self.request_timeout
+            )
 
-            print(f"[DEBUG] 추출된 JSON: {response_text}")
+        return await limiter.call(send, queue_when_open=self.queue_when_open)
 
-            if not response_text:
-                return None, "AI 응답을 파싱할 수 없습니다."
+    @staticmethod
+    def _resolve_dates(data: dict, context: dict = None, today: date = None) -> Optional[str]:
+        """
+        LLM이 반환한 날짜 표현(date_phrase)을 date/end_date로 변환
 
-            # JSON 파싱
-            data = json.loads(response_text)
+        Returns:
+            날짜를 해석할 수 없으면 사용자에게 보낼 메시지, 아니면 None
+        """
+        partial_data = context.get('partial_data', {}) if context else {}
+        date_phrase = (data.get("date_phrase") or "").strip()
+
+        if date_phrase:
+            start_date, end_date = resolve_date_phrase(date_phrase, today)
+            if not start_date:
+                return f"'{date_phrase}' 날짜를 정확히 이해하지 못했습니다.\n\n예: '내일', '다음주 금요일', '11월 20일'처럼 알려주세요."
+            data["date"], data["end_date"] = start_date, end_date
+        elif partial_data.get("date"):
+            # 이전 대화에서 이미 확정된 날짜 유지
+            data["date"], data["end_date"] = partial_data["date"], partial_data.get("end_date")
+        elif data.get("intent") == "create":
+            # 날짜 언급이 없으면 오늘
+            data["date"], data["end_date"] = resolve_date_phrase("", today)
+        else:
+            data["date"], data["end_date"] = None, None
+
+        return None
+
+    @staticmethod
+    def _extract_payload(response) -> Optional[list]:
+        """record_attendance 도구 입력에서 학생별 항목 목록 추출 (도구 호출이 없거나 형식이 틀리면 None)"""
+        for block in response.content:
+            if block.type == "tool_use" and block.name == EXTRACTION_TOOL["name"]:
+                logger.debug(f"Claude 도구 입력: {block.input}")
+                if not isinstance(block.input, dict):
+                    return None
+                # records 없이 항목 하나만 보낸 경우도 허용
+                records = block.input.get("records", [block.input])
+                if not isinstance(records, list) or not records or not all(isinstance(r, dict) for r in records):
+                    logger.warning(f"record_attendance 입력 형식 오류: {block.input}")
+                    return None
+                return [dict(record) for record in records]
+
+        logger.warning(f"record_attendance 도구 호출 없음 (stop_reason={response.stop_reason})")
+        return None
+
+    def _finalize_payload(self, records: list, context: dict = None, today: date = None) -> tuple[Optional[list[ExtractedAttendanceData]], Optional[str]]:
+        """
+        학생별 항목을 검증하고 사용자 응답 여부 결정
 
+        한 학생이라도 추가 질문이 필요하거나 검증에 실패하면 전체를 보류하고
+        그 메시지를 돌려줍니다 (일부 학생만 등록되는 것을 막기 위함).
+        """
+        results = []
+        for data in records:
+            extracted_data, error = self._finalize_record(data, context, today)
+            if error:
+                return None, error
+            results.append(extracted_data)
+        return results, None
+
+    def _finalize_record(self, data: dict, context: dict = None, today: date = None) -> tuple[Optional[ExtractedAttendanceData], Optional[str]]:
+        """학생 1명 항목을 검증하고 사용자 응답 여부 결정"""
+        try:
             # 추가 질문이 필요한 경우
             if data.get("clarification_needed"):
                 clarification_msg = data.get("clarification_question", "다음 정보를 추가로 알려주세요:")
@@ -460,8 +920,13 @@ class ClaudeMessageParser:
             if confidence < 0.6:
                 return None, "메시지 내용이 명확하지 않습니다.\n\n학생 이름, 날짜, 출결 상황, 사유를 자세히 알려주세요.\n\n예: '홍길동 아파서 내일 결석', '김철수 체험학습으로 3일간 결석'"
 
-            # 데이터 검증
-            extracted_data = ExtractedAttendanceData(**data)
+            # 날짜 표현 → 실제 날짜
+            date_error = self._resolve_dates(data, context, today)
+            if date_error:
+                return None, date_error
+
+            # 데이터 검증 (도구 입력 → Pydantic 모델)
+            extracted_data = ExtractedAttendanceData.model_validate(data)
 
             # create인 경우 필수 필드 검증
             if extracted_data.intent == "create":
@@ -472,8 +937,6 @@ class ClaudeMessageParser:
 
             return extracted_data, None
 
-        except json.JSONDecodeError as e:
-            return None, f"응답 파싱 오류: {str(e)}"
         except Exception as e:
             return None, f"메시지 분석 중 오류 발생: {str(e)}"
 
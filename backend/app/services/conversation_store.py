@@ -0,0 +1,292 @@
+import os
+import json
+import time
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
+from ..database import AsyncSessionLocal
+from ..models import ConversationState
+
+logger = logging.getLogger(__name__)
+
+
+class ConversationRecord:
+    """학부모 한 명의 대화 맥락 (최근 메시지는 (문장, 시각) 튜플로 maxlen deque에 보관)"""
+    __slots__ = ("messages", "partial_data", "last_updated")
+
+    def __init__(self, max_messages: int, messages=(), partial_data: dict = None, last_updated: float = None):
+        self.messages = deque(messages, maxlen=max_messages)
+        self.partial_data = partial_data or {}
+        self.last_updated = last_updated if last_updated is not None else time.time()
+
+    def is_expired(self, ttl_seconds: float, now: float = None) -> bool:
+        return (now if now is not None else time.time()) - self.last_updated > ttl_seconds
+
+    def to_context(self) -> dict:
+        """파서/파싱 캐시가 쓰는 맥락 형식 ({'messages': [{'text', 'timestamp'}], 'partial_data'})"""
+        return {
+            'messages': [
+                {'text': text, 'timestamp': datetime.utcfromtimestamp(timestamp)}
+                for text, timestamp in self.messages
+            ],
+            'partial_data': self.partial_data,
+        }
+
+
+class ConversationStore(ABC):
+    """
+    대화 맥락 저장소 인터페이스
+
+    마지막 갱신 후 ttl_seconds가 지난 맥락은 조회하지 않고, sweep_interval마다 백그라운드에서
+    만료된 맥락을 지웁니다 (첫 사용 시 이벤트 루프에서 시작, close로 중지).
+    """
+
+    def __init__(self, ttl_seconds: float = None, max_sessions: int = None, max_messages: int = 10,
+                 sweep_interval: float = None):
+        if ttl_seconds is None:
+            ttl_seconds = float(os.getenv("CONVERSATION_TTL_SECONDS", "300"))
+        if max_sessions is None:
+            max_sessions = int(os.getenv("CONVERSATION_MAX_SESSIONS", "10000"))
+        if sweep_interval is None:
+            sweep_interval = float(os.getenv("CONVERSATION_SWEEP_SECONDS", "60"))
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self.max_messages = max_messages
+        self.sweep_interval = sweep_interval
+        self._sweeper = None
+
+        self.expired = 0
+        self.evicted = 0
+
+    @abstractmethod
+    async def get_context(self, user_id: str) -> Optional[dict]:
+        """대화 맥락 (없거나 만료됐으면 None)"""
+
+    @abstractmethod
+    async def add_message(self, user_id: str, message: str):
+        """대화 기록 추가 (최근 max_messages개만 유지)"""
+
+    @abstractmethod
+    async def set_partial_data(self, user_id: str, data: dict):
+        """부분 정보 저장"""
+
+    @abstractmethod
+    async def clear(self, user_id: str):
+        """맥락 삭제"""
+
+    @abstractmethod
+    async def sweep(self) -> int:
+        """만료되거나 최대 개수를 넘은 맥락 삭제, 지운 개수 반환"""
+
+    def get_stats(self) -> dict:
+        return {
+            "backend": type(self).__name__,
+            "ttl_seconds": self.ttl_seconds,
+            "max_sessions": self.max_sessions,
+            "expired": self.expired,
+            "evicted": self.evicted,
+        }
+
+    def _ensure_sweeper(self):
+        if self.sweep_interval > 0 and (self._sweeper is None or self._sweeper.done()):
+            self._sweeper = asyncio.get_running_loop().create_task(self._sweep_forever())
+
+    async def _sweep_forever(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                removed = await self.sweep()
+                if removed:
+                    logger.info(f"대화 맥락 정리: {removed}개 삭제")
+            except Exception as e:
+                logger.error(f"대화 맥락 정리 실패: {e}")
+
+    async def close(self):
+        """백그라운드 정리 작업 중지"""
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            try:
+                await self._sweeper
+            except asyncio.CancelledError:
+                pass
+            self._sweeper = None
+
+
+class MemoryConversationStore(ConversationStore):
+    """
+    프로세스 메모리 저장소 (기본값)
+
+    갱신할 때마다 맨 뒤로 옮기는 OrderedDict라 앞쪽이 가장 오래된 맥락입니다.
+    max_sessions를 넘으면 가장 오래된 것부터 버리고, 정리도 앞에서부터 만료되지 않은 맥락을 만날 때까지만 봅니다.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._records = OrderedDict()  # telegram_user_id → ConversationRecord
+
+    def _touch(self, user_id: str) -> ConversationRecord:
+        record = self._records.get(user_id)
+        if record is None or record.is_expired(self.ttl_seconds):
+            record = ConversationRecord(self.max_messages)
+            self._records[user_id] = record
+        else:
+            record.last_updated = time.time()
+        self._records.move_to_end(user_id)
+        while len(self._records) > self.max_sessions:
+            self._records.popitem(last=False)
+            self.evicted += 1
+        return record
+
+    async def get_context(self, user_id: str) -> Optional[dict]:
+        self._ensure_sweeper()
+        record = self._records.get(user_id)
+        if record is None:
+            return None
+        if record.is_expired(self.ttl_seconds):
+            del self._records[user_id]
+            self.expired += 1
+            return None
+        return record.to_context()
+
+    async def add_message(self, user_id: str, message: str):
+        self._ensure_sweeper()
+        record = self._touch(user_id)
+        record.messages.append((message, record.last_updated))
+
+    async def set_partial_data(self, user_id: str, data: dict):
+        self._ensure_sweeper()
+        self._touch(user_id).partial_data = data
+
+    async def clear(self, user_id: str):
+        self._records.pop(user_id, None)
+
+    async def sweep(self) -> int:
+        now = time.time()
+        removed = 0
+        while self._records:
+            user_id, record = next(iter(self._records.items()))
+            if not record.is_expired(self.ttl_seconds, now):
+                break
+            del self._records[user_id]
+            removed += 1
+        self.expired += removed
+        return removed
+
+    def get_stats(self) -> dict:
+        return {**super().get_stats(), "sessions": len(self._records)}
+
+
+class SqlConversationStore(ConversationStore):
+    """
+    DB 저장소 (conversation_sessions 테이블, SQLite/PostgreSQL)
+
+    봇 프로세스가 여러 개이거나 재시작해도 같은 맥락을 이어 씁니다.
+    갱신은 행 잠금(PostgreSQL의 SELECT ... FOR UPDATE) 안에서 읽고 다시 씁니다.
+    """
+
+    def __init__(self, session_factory=AsyncSessionLocal, **kwargs):
+        super().__init__(**kwargs)
+        self.session_factory = session_factory
+
+    def _cutoff(self) -> datetime:
+        return datetime.utcnow() - timedelta(seconds=self.ttl_seconds)
+
+    def _to_record(self, row: ConversationState) -> ConversationRecord:
+        return ConversationRecord(
+            self.max_messages,
+            messages=[tuple(message) for message in json.loads(row.messages or "[]")],
+            partial_data=json.loads(row.partial_data or "{}"),
+            last_updated=(row.updated_at - datetime(1970, 1, 1)).total_seconds(),
+        )
+
+    async def get_context(self, user_id: str) -> Optional[dict]:
+        self._ensure_sweeper()
+        async with self.session_factory() as db:
+            row = await db.get(ConversationState, user_id)
+            if row is None:
+                return None
+            if row.updated_at < self._cutoff():
+                await db.delete(row)
+                await db.commit()
+                self.expired += 1
+                return None
+            return self._to_record(row).to_context()
+
+    async def _update(self, user_id: str, apply):
+        """맥락을 읽어 apply(record)로 바꾼 뒤 저장 (첫 행을 동시에 만들면 한 번 다시 시도)"""
+        self._ensure_sweeper()
+        for attempt in range(2):
+            async with self.session_factory() as db:
+                row = (await db.execute(
+                    select(ConversationState).where(ConversationState.telegram_user_id == user_id).with_for_update()
+                )).scalar_one_or_none()
+                if row is None or row.updated_at < self._cutoff():
+                    record = ConversationRecord(self.max_messages)
+                else:
+                    record = self._to_record(row)
+                    record.last_updated = time.time()
+                apply(record)
+
+                if row is None:
+                    row = ConversationState(telegram_user_id=user_id)
+                    db.add(row)
+                row.messages = json.dumps([list(message) for message in record.messages], ensure_ascii=False)
+                row.partial_data = json.dumps(record.partial_data, ensure_ascii=False, default=str)
+                row.updated_at = datetime.utcfromtimestamp(record.last_updated)
+                try:
+                    await db.commit()
+                    return
+                except IntegrityError:
+                    await db.rollback()
+                    if attempt:
+                        raise
+
+    async def add_message(self, user_id: str, message: str):
+        await self._update(user_id, lambda record: record.messages.append((message, record.last_updated)))
+
+    async def set_partial_data(self, user_id: str, data: dict):
+        def apply(record):
+            record.partial_data = data
+        await self._update(user_id, apply)
+
+    async def clear(self, user_id: str):
+        async with self.session_factory() as db:
+            await db.execute(delete(ConversationState).where(ConversationState.telegram_user_id == user_id))
+            await db.commit()
+
+    async def sweep(self) -> int:
+        async with self.session_factory() as db:
+            result = await db.execute(delete(ConversationState).where(ConversationState.updated_at < self._cutoff()))
+            expired = result.rowcount or 0
+
+            # 최대 개수를 넘으면 오래된 맥락부터 삭제
+            oldest_kept = (await db.execute(
+                select(ConversationState.updated_at)
+                .order_by(ConversationState.updated_at.desc())
+                .offset(self.max_sessions - 1)
+                .limit(1)
+            )).scalar_one_or_none()
+            evicted = 0
+            if oldest_kept is not None:
+                result = await db.execute(delete(ConversationState).where(ConversationState.updated_at < oldest_kept))
+                evicted = result.rowcount or 0
+            await db.commit()
+
+        self.expired += expired
+        self.evicted += evicted
+        return expired + evicted
+
+
+def create_conversation_store() -> ConversationStore:
+    """CONVERSATION_STORE 설정에 따른 저장소 (memory: 프로세스 메모리, sql: DATABASE_URL)"""
+    backend = os.getenv("CONVERSATION_STORE", "memory").lower()
+    if backend == "sql":
+        return SqlConversationStore()
+    if backend != "memory":
+        logger.warning(f"알 수 없는 CONVERSATION_STORE={backend}, 메모리 저장소 사용")
+    return MemoryConversationStore()
@@ -0,0 +1,150 @@
+import re
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from typing import Optional
+
+
+WEEKDAY_NAMES = ["월요일", "화요일", "수요일", "목요일", "금요일", "토요일", "일요일"]
+WEEKDAY_INDEX = {name[0]: i for i, name in enumerate(WEEKDAY_NAMES)}
+
+# 오늘 기준 상대 일수
+RELATIVE_DAYS = {"오늘": 0, "금일": 0, "내일": 1, "명일": 1, "모레": 2, "내일모레": 2, "글피": 3}
+
+# 주 단위 표현 → 이번주 월요일 기준 주 오프셋
+WEEK_OFFSETS = {"이번": 0, "금주": 0, "다음": 1, "담": 1, "차": 1, "다다음": 2}
+
+DATE_TOKEN_PATTERN = re.compile(
+    r"(?P<iso>\d{4}-\d{1,2}-\d{1,2})"
+    r"|(?P<month_day>(?P<m>\d{1,2})\s*월\s*(?P<d>\d{1,2})\s*일)"
+    r"|(?P<slash>(?P<sm>\d{1,2})\s*[/.]\s*(?P<sd>\d{1,2}))"
+    r"|(?P<duration>(?P<n>\d{1,2})\s*일\s*(?:간|동안))"
+    r"|(?P<day_only>(?P<dd>\d{1,2})\s*일)(?!\s*(?:간|동안))"
+    r"|(?P<week_day>(?P<week>다다음|이번|금주|다음|담|차)\s*주\s*(?P<wd>[월화수목금토일])요일)"
+    r"|(?P<weekday>(?P<bare_wd>[월화수목금토일])요일)"
+    r"|(?P<relative>내일모레|오늘|금일|내일|명일|모레|글피)"
+    r"|(?P<until>까지)"
+)
+
+
+def find_date_phrase(text: str) -> Optional[str]:
+    """
+    메시지에서 날짜 표현 부분만 잘라내기
+
+    예: "김철수 체험학습으로 내일부터 3일간 결석" → "내일부터 3일간"
+
+    Returns:
+        날짜 표현 문자열 (없으면 None)
+    """
+    matches = [m for m in DATE_TOKEN_PATTERN.finditer(text) if m.lastgroup != "until"]
+    if not matches:
+        return None
+
+    end = matches[-1].end()
+    # "... 금요일까지"처럼 마지막 토큰 뒤의 '까지'는 포함
+    tail = re.match(r"\s*까지", text[end:])
+    if tail:
+        end += tail.end()
+    return text[matches[0].start():end].strip()
+
+
+def resolve_date_phrase(phrase: Optional[str], today: date = None) -> tuple[Optional[str], Optional[str]]:
+    """
+    한국어 날짜 표현을 (시작일, 종료일) ISO 문자열로 변환
+
+    지원 표현: 오늘/내일/모레/글피, 이번주·다음주 X요일, X요일, M월 D일, M/D,
+    D일, YYYY-MM-DD, "A부터 B까지", "A부터 N일간", "B까지"(오늘부터 B까지)
+
+    Args:
+        phrase: 날짜 표현 (비어 있으면 오늘)
+        today: 기준 날짜 (기본값: 오늘)
+
+    Returns:
+        (시작일, 종료일) - 기간이 아니면 종료일은 None, 해석할 수 없으면 (None, None)
+    """
+    if today is None:
+        today = datetime.now().date()
+    normalized = " ".join((phrase or "").split())
+    return _resolve_cached(normalized, today)
+
+
+@lru_cache(maxsize=4096)
+def _resolve_cached(phrase: str, today: date) -> tuple[Optional[str], Optional[str]]:
+    """날짜별 메모이제이션 (today가 키에 포함되므로 날짜가 바뀌면 자연히 새로 계산)"""
+    if not phrase:
+        return today.isoformat(), None
+
+    dates = []
+    duration = None
+    for match in DATE_TOKEN_PATTERN.finditer(phrase):
+        kind = match.lastgroup
+        if kind == "duration":
+            duration = int(match.group("n"))
+        elif kind != "until":
+            resolved = _resolve_token(match, today, dates[-1] if dates else None)
+            if resolved is None:
+                return None, None
+            dates.append(resolved)
+
+    if not dates and duration is None:
+        return None, None
+
+    start = dates[0] if dates else today
+    end = None
+    if len(dates) == 1 and duration is None and phrase.endswith("까지") and "부터" not in phrase:
+        # "다음주 목요일까지"처럼 시작일 없이 끝만 있으면 오늘부터 그날까지
+        start, end = today, dates[0]
+    elif len(dates) > 1:
+        end = dates[-1]
+    elif duration and duration > 1:
+        end = start + timedelta(days=duration - 1)
+
+    if end is not None and end < start:
+        return None, None
+    if end == start:
+        end = None
+
+    return start.isoformat(), end.isoformat() if end else None
+
+
+def _resolve_token(match: re.Match, today: date, previous: Optional[date] = None) -> Optional[date]:
+    """단일 날짜 토큰 해석 (previous: 같은 표현 안의 앞선 날짜, "11월 20일부터 22일까지"의 월 보완용)"""
+    kind = match.lastgroup
+    try:
+        if kind == "iso":
+            year, month, day = (int(part) for part in match.group("iso").split("-"))
+            return date(year, month, day)
+        if kind == "month_day":
+            return _nearest_month_day(int(match.group("m")), int(match.group("d")), today)
+        if kind == "slash":
+            return _nearest_month_day(int(match.group("sm")), int(match.group("sd")), today)
+        if kind == "day_only":
+            return (previous or today).replace(day=int(match.group("dd")))
+    except ValueError:
+        return None
+
+    if kind == "relative":
+        return today + timedelta(days=RELATIVE_DAYS[match.group("relative")])
+    if kind == "week_day":
+        this_monday = today - timedelta(days=today.weekday())
+        monday = this_monday + timedelta(weeks=WEEK_OFFSETS[match.group("week")])
+        return monday + timedelta(days=WEEKDAY_INDEX[match.group("wd")])
+    if kind == "weekday":
+        # 요일만 말하면 오늘 이후 가장 가까운 그 요일 (오늘 포함)
+        days_ahead = (WEEKDAY_INDEX[match.group("bare_wd")] - today.weekday()) % 7
+        return today + timedelta(days=days_ahead)
+    return None
+
+
+def _nearest_month_day(month: int, day: int, today: date) -> date:
+    """연도 없는 M월 D일 → 올해 기준, 반년 이상 지난 날짜면 내년으로 해석"""
+    candidate = date(today.year, month, day)
+    if candidate < today - timedelta(days=180):
+        candidate = date(today.year + 1, month, day)
+    return candidate
+
+
+def describe_today(today: date = None) -> str:
+    """프롬프트/안내 메시지용 오늘 날짜 문자열 ("2025-11-18 (화요일)")"""
+    if today is None:
+        today = datetime.now().date()
+    return f"{today.isoformat()} ({WEEKDAY_NAMES[today.weekday()]})"
@@ -0,0 +1,397 @@
+import os
+import io
+import re
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import tempfile
+import multiprocessing
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+# 대시보드용 축소본 (이름 → (긴 변 픽셀, JPEG 품질))
+VARIANTS = {
+    "thumb": (320, 70),
+    "preview": (1280, 80),
+}
+
+# 파일 앞부분으로 확장자/Content-Type 판별 (텔레그램 사진은 대부분 JPEG)
+IMAGE_SIGNATURES = (
+    (b"\xff\xd8\xff", ".jpg", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", ".png", "image/png"),
+    (b"RIFF", ".webp", "image/webp"),
+)
+CONTENT_TYPES = {ext: content_type for _, ext, content_type in IMAGE_SIGNATURES}
+
+# 내용이 바뀌지 않는 키 (원본/축소본), 예전 평면 파일명({student_id}_{timestamp}.jpg)은 해당 없음
+CONTENT_KEY_PATTERN = re.compile(r"^(?:(?:thumb|preview)/)?[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.\w+$")
+
+
+def content_key(sha256: str, ext: str) -> str:
+    """내용 해시 기반 저장 경로 (앞 4글자로 2단계 분산: ab/cd/abcd....jpg)"""
+    return f"{sha256[:2]}/{sha256[2:4]}/{sha256}{ext}"
+
+
+def variant_key(key: str, variant: str) -> str:
+    """축소본 경로 (원본과 같은 분산 구조, 항상 JPEG)"""
+    return f"{variant}/{os.path.splitext(key)[0]}.jpg"
+
+
+def is_content_key(key: str) -> bool:
+    return bool(CONTENT_KEY_PATTERN.match(key))
+
+
+def content_type_for(key: str) -> str:
+    return CONTENT_TYPES.get(os.path.splitext(key)[1].lower(), "application/octet-stream")
+
+
+def render_variants(data: bytes) -> dict:
+    """
+    원본 이미지로 축소본 JPEG 생성 (프로세스 풀에서 실행)
+
+    Returns:
+        {변형 이름: JPEG 바이트}
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(io.BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image)  # 휴대폰 사진 회전 정보 반영
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        rendered = {}
+        for variant, (max_side, quality) in VARIANTS.items():
+            resized = image.copy()
+            resized.thumbnail((max_side, max_side), Image.LANCZOS)
+            out = io.BytesIO()
+            resized.save(out, format="JPEG", quality=quality, optimize=True, progressive=True)
+            rendered[variant] = out.getvalue()
+    return rendered
+
+
+class HashingWriter:
+    """다운로드를 임시 파일에 쓰면서 SHA-256 계산 (텔레그램 다운로드의 out 인자로 사용)"""
+
+    def __init__(self, temp_dir: str):
+        os.makedirs(temp_dir, exist_ok=True)
+        fd, self.path = tempfile.mkstemp(dir=temp_dir, suffix=".part")
+        self._file = os.fdopen(fd, "wb")
+        self._hash = hashlib.sha256()
+        self.size = 0
+        self.head = b""  # 형식 판별용 앞부분
+
+    def write(self, data) -> int:
+        if len(self.head) < 16:
+            self.head += bytes(data[:16 - len(self.head)])
+        self._hash.update(data)
+        self.size += len(data)
+        return self._file.write(data)
+
+    def close(self):
+        self._file.close()
+
+    def discard(self):
+        self.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    @property
+    def sha256(self) -> str:
+        return self._hash.hexdigest()
+
+    @property
+    def extension(self) -> str:
+        for signature, ext, _ in IMAGE_SIGNATURES:
+            if self.head.startswith(signature):
+                return ext
+        return ".jpg"
+
+
+class StoredDocument:
+    """저장 결과 (deduplicated면 같은 내용의 파일이 이미 있어 새로 쓰지 않음)"""
+    __slots__ = ("key", "sha256", "size", "deduplicated")
+
+    def __init__(self, key: str, sha256: str, size: int, deduplicated: bool):
+        self.key = key
+        self.sha256 = sha256
+        self.size = size
+        self.deduplicated = deduplicated
+
+
+class DocumentStorage(ABC):
+    """
+    서류 파일 저장소 인터페이스 (동기 파일 I/O, DocumentStore가 스레드에서 호출)
+
+    키는 content_key/variant_key 형식의 상대 경로입니다.
+    """
+
+    # 다운로드 임시 파일 위치 (put_file이 같은 파일시스템 안에서 옮길 수 있도록)
+    temp_dir = tempfile.gettempdir()
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        """key가 저장되어 있는지"""
+
+    @abstractmethod
+    def put_file(self, key: str, source_path: str, content_type: str):
+        """임시 파일을 key로 저장 (원본 파일은 옮겨지거나 삭제됨)"""
+
+    @abstractmethod
+    def put_bytes(self, key: str, data: bytes, content_type: str):
+        """바이트를 key로 저장 (축소본)"""
+
+    @abstractmethod
+    def read(self, key: str) -> bytes:
+        """key의 내용"""
+
+    def local_path(self, key: str) -> Optional[str]:
+        """디스크 경로가 있으면 반환 (API가 파일을 직접 보냄), 없으면 None"""
+        return None
+
+    def content_type(self, key: str) -> str:
+        return content_type_for(key)
+
+
+class FileSystemStorage(DocumentStorage):
+    """로컬 디렉토리 저장소 (기본값 uploads/, 기존 평면 파일명도 그대로 읽힘)"""
+
+    def __init__(self, root: str = None):
+        self.root = os.path.abspath(root or os.getenv("DOCUMENT_STORAGE_DIR", "uploads"))
+        self.temp_dir = os.path.join(self.root, ".tmp")
+
+    def _path(self, key: str) -> str:
+        path = os.path.abspath(os.path.join(self.root, key))
+        # 루트 밖이나 숨김 경로(.tmp의 다운로드 중인 파일 등)는 허용하지 않음
+        if not path.startswith(self.root + os.sep) or any(part.startswith(".") for part in key.split("/")):
+            raise ValueError(f"잘못된 파일 경로: {key}")
+        return path
+
+    def exists(self, key: str) -> bool:
+        return os.path.isfile(self._path(key))
+
+    def put_file(self, key: str, source_path: str, content_type: str):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(source_path, path)
+
+    def put_bytes(self, key: str, data: bytes, content_type: str):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def read(self, key: str) -> bytes:
+        with open(self._path(key), "rb") as f:
+            return f.read()
+
+    def local_path(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        return path if os.path.isfile(path) else None
+
+
+class LocalObjectStorage(DocumentStorage):
+    """
+    S3 호환 객체 저장소 흉내 (로컬 디렉토리의 버킷/키 + 메타데이터)
+
+    객체마다 ETag(MD5)/Content-Type/크기를 .meta.json에 기록하고, 읽기는 API를 거칩니다
+    (local_path 없음). 실제 객체 저장소로 옮길 때 같은 키 구조를 그대로 씁니다.
+    """
+
+    META_SUFFIX = ".meta.json"
+
+    def __init__(self, root: str = None, bucket: str = None):
+        root = os.path.abspath(root or os.getenv("DOCUMENT_OBJECT_STORE_DIR", "./object_store"))
+        self.bucket = bucket or os.getenv("DOCUMENT_OBJECT_STORE_BUCKET", "documents")
+        self.root = os.path.join(root, self.bucket)
+        self.temp_dir = os.path.join(root, ".tmp")
+
+    def _path(self, key: str) -> str:
+        path = os.path.abspath(os.path.join(self.root, key))
+        if not path.startswith(self.root + os.sep) or path.endswith(self.META_SUFFIX):
+            raise ValueError(f"잘못된 객체 키: {key}")
+        return path
+
+    def head_object(self, key: str) -> Optional[dict]:
+        try:
+            with open(self._path(key) + self.META_SUFFIX, encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _write_meta(self, path: str, data_md5: str, size: int, content_type: str):
+        meta = {"ETag": f'"{data_md5}"', "ContentType": content_type, "ContentLength": size, "LastModified": time.time()}
+        tmp_path = f"{path}{self.META_SUFFIX}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, path + self.META_SUFFIX)
+
+    def exists(self, key: str) -> bool:
+        # 메타데이터가 마지막에 쓰이므로 메타데이터가 있어야 완성된 객체
+        return self.head_object(key) is not None
+
+    def put_file(self, key: str, source_path: str, content_type: str):
+        md5 = hashlib.md5()
+        with open(source_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 16), b""):
+                md5.update(chunk)
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        size = os.path.getsize(source_path)
+        os.replace(source_path, path)
+        self._write_meta(path, md5.hexdigest(), size, content_type)
+
+    def put_bytes(self, key: str, data: bytes, content_type: str):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        self._write_meta(path, hashlib.md5(data).hexdigest(), len(data), content_type)
+
+    def read(self, key: str) -> bytes:
+        if not self.exists(key):
+            raise FileNotFoundError(key)
+        with open(self._path(key), "rb") as f:
+            return f.read()
+
+    def content_type(self, key: str) -> str:
+        meta = self.head_object(key)
+        return meta["ContentType"] if meta else content_type_for(key)
+
+
+class DocumentStore:
+    """
+    서류 사진 저장 (내용 주소 + 중복 제거 + 축소본)
+
+    다운로드하면서 SHA-256을 계산해 content_key 경로에 저장하고, 같은 내용이 이미 있으면 새로 쓰지 않습니다.
+    축소본(thumb/preview)은 프로세스 풀에서 만들어 이벤트 루프를 막지 않으며, 만들어지기 전에는 원본을 보여줍니다.
+    """
+
+    def __init__(self, storage: DocumentStorage, thumbnail_workers: int = None):
+        if thumbnail_workers is None:
+            thumbnail_workers = int(os.getenv("DOCUMENT_THUMBNAIL_WORKERS", "2"))
+        self.storage = storage
+        self.thumbnail_workers = thumbnail_workers
+        self._pool = None
+        self._pending = {}  # 키 → 진행 중인 축소본 작업 (같은 사진을 두 번 만들지 않음)
+
+        self.stored = 0
+        self.deduplicated = 0
+        self.variants_rendered = 0
+        self.variant_failures = 0
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # 스레드가 있는 프로세스에서 fork하지 않도록 spawn 사용
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.thumbnail_workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._pool
+
+    async def save_telegram_file(self, telegram_file) -> StoredDocument:
+        """텔레그램 File을 다운로드해 저장 (축소본은 백그라운드에서 생성)"""
+        writer = HashingWriter(self.storage.temp_dir)
+        try:
+            await telegram_file.download_to_memory(out=writer)
+            writer.close()
+        except BaseException:
+            writer.discard()
+            raise
+        return await self.save_temp_file(writer)
+
+    async def save_temp_file(self, writer: HashingWriter) -> StoredDocument:
+        key = content_key(writer.sha256, writer.extension)
+        deduplicated = await asyncio.to_thread(self._commit, writer, key)
+        if deduplicated:
+            self.deduplicated += 1
+        else:
+            self.stored += 1
+        self.schedule_variants(key)
+        return StoredDocument(key, writer.sha256, writer.size, deduplicated)
+
+    def _commit(self, writer: HashingWriter, key: str) -> bool:
+        """임시 파일을 key로 옮김 (이미 있으면 버리고 True)"""
+        if self.storage.exists(key):
+            writer.discard()
+            return True
+        self.storage.put_file(key, writer.path, content_type_for(key))
+        return False
+
+    def schedule_variants(self, key: str):
+        """축소본이 없으면 백그라운드에서 생성 (완료를 기다리지 않음)"""
+        if key in self._pending:
+            return
+        task = asyncio.get_running_loop().create_task(self.ensure_variants(key))
+        self._pending[key] = task
+        task.add_done_callback(lambda _: self._pending.pop(key, None))
+
+    async def ensure_variants(self, key: str) -> bool:
+        missing = [
+            variant for variant in VARIANTS
+            if not await asyncio.to_thread(self.storage.exists, variant_key(key, variant))
+        ]
+        if not missing:
+            return True
+        try:
+            data = await asyncio.to_thread(self.storage.read, key)
+            rendered = await asyncio.get_running_loop().run_in_executor(self._executor(), render_variants, data)
+            for variant in missing:
+                await asyncio.to_thread(self.storage.put_bytes, variant_key(key, variant), rendered[variant], "image/jpeg")
+        except Exception as e:
+            self.variant_failures += 1
+            logger.error(f"서류 축소본 생성 실패 ({key}): {e}")
+            return False
+        self.variants_rendered += 1
+        return True
+
+    def resolve(self, key: str, variant: str = None) -> str:
+        """보여줄 키 (축소본이 아직 없거나 원본이 평면 파일명인 예전 기록이면 원본)"""
+        if variant:
+            candidate = variant_key(key, variant)
+            if self.storage.exists(candidate):
+                return candidate
+        return key
+
+    async def close(self):
+        """진행 중인 축소본 작업을 기다리고 프로세스 풀 종료"""
+        if self._pending:
+            await asyncio.gather(*self._pending.values(), return_exceptions=True)
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+    def get_stats(self) -> dict:
+        return {
+            "backend": type(self.storage).__name__,
+            "stored": self.stored,
+            "deduplicated": self.deduplicated,
+            "variants_rendered": self.variants_rendered,
+            "variant_failures": self.variant_failures,
+            "pending_variants": len(self._pending),
+        }
+
+
+_store = None
+
+
+def get_document_store() -> DocumentStore:
+    """DOCUMENT_STORAGE 설정에 따른 프로세스 공용 저장소 (fs: 로컬 디렉토리, object: S3 호환 흉내)"""
+    global _store
+    if _store is None:
+        backend = os.getenv("DOCUMENT_STORAGE", "fs").lower()
+        if backend == "object":
+            storage = LocalObjectStorage()
+        else:
+            if backend != "fs":
+                logger.warning(f"알 수 없는 DOCUMENT_STORAGE={backend}, 로컬 디렉토리 사용")
+            storage = FileSystemStorage()
+        _store = DocumentStore(storage)
+    return _store
@@ -0,0 +1,339 @@
+import os
+import time
+import random
+import asyncio
+import logging
+from typing import Awaitable, Callable, Optional
+from anthropic import APIConnectionError, APIStatusError
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """회로 차단기가 열려 있어 호출을 거부함"""
+
+    def __init__(self, retry_in: float):
+        super().__init__(f"LLM circuit breaker is open (retry in {retry_in:.1f}s)")
+        self.retry_in = retry_in
+
+
+def classify_error(error: Exception) -> Optional[str]:
+    """
+    API 에러 분류
+
+    Returns:
+        "overload" (429/529, 동시성 감소 대상), "transient" (재시도 가능), None (재시도 불가)
+    """
+    if isinstance(error, (asyncio.TimeoutError, APIConnectionError)):
+        return "transient"
+    if isinstance(error, APIStatusError):
+        if error.status_code in (429, 529):
+            return "overload"
+        if error.status_code >= 500:
+            return "transient"
+    return None
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """응답 헤더의 retry-after(-ms) 값 (없으면 None)"""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+
+    headers = response.headers
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        return None
+    return None
+
+
+class TokenBucket:
+    """초당 요청 수 제한 (버스트 허용)"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        """토큰 하나를 얻을 때까지 대기"""
+        while True:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class CircuitBreaker:
+    """연속 실패 시 일정 시간 호출을 차단 (closed → open → half_open → closed)"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.probe_in_flight = False
+        self.times_opened = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def seconds_until_half_open(self) -> float:
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+    def allow_request(self) -> bool:
+        """호출 허용 여부 (half_open에서는 시험 호출 1건만 허용)"""
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and not self.probe_in_flight:
+            self.probe_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.probe_in_flight = False
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        if self.probe_in_flight or self.consecutive_failures >= self.failure_threshold:
+            if self.opened_at is None or self.probe_in_flight:
+                self.times_opened += 1
+                logger.warning(f"LLM 회로 차단기 열림 (연속 실패 {self.consecutive_failures}회, {self.reset_timeout}초 후 재시도)")
+            self.opened_at = time.monotonic()
+            self.probe_in_flight = False
+
+    def release_probe(self):
+        """시험 호출이 재시도 불가 에러 등으로 끝난 경우 다음 시험 허용"""
+        self.probe_in_flight = False
+
+
+class LLMCallLimiter:
+    """
+    Anthropic 호출 공용 제한기
+
+    - AIMD 동시성 제어: 성공 시 조금씩 늘리고, 429/529 과부하 시 절반으로 줄임
+    - 토큰 버킷: 초당 요청 수 제한
+    - 지터 백오프: retry-after 헤더가 있으면 그 이상 대기
+    - 회로 차단기: 연속 실패 시 즉시 실패(봇) 또는 대기열에서 대기(배치 작업)
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = None,
+        rate_per_second: float = None,
+        failure_threshold: int = None,
+        reset_timeout: float = None,
+    ):
+        if max_concurrency is None:
+            max_concurrency = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+        if rate_per_second is None:
+            rate_per_second = float(os.getenv("LLM_RATE_PER_SECOND", "5"))
+        if failure_threshold is None:
+            failure_threshold = int(os.getenv("LLM_BREAKER_FAILURE_THRESHOLD", "5"))
+        if reset_timeout is None:
+            reset_timeout = float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30"))
+
+        self.min_limit = 1.0
+        self.max_limit = float(max_concurrency)
+        self.limit = min(4.0, self.max_limit)
+        self.in_flight = 0
+        self.queued = 0
+        self.backoff_base = 0.5
+        self.backoff_cap = 20.0
+        self._last_decrease = 0.0
+
+        self.bucket = TokenBucket(rate_per_second, max(1.0, rate_per_second * 2))
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self._condition = None
+        self._condition_loop = None
+
+        self.counters = {
+            "calls": 0,
+            "successes": 0,
+            "failures": 0,
+            "retries": 0,
+            "overloads": 0,
+            "rejected": 0,
+        }
+
+    def _get_condition(self) -> asyncio.Condition:
+        """현재 이벤트 루프용 Condition (동기 래퍼가 새 루프를 만들어도 안전하도록)"""
+        loop = asyncio.get_running_loop()
+        if self._condition is None or self._condition_loop is not loop:
+            self._condition = asyncio.Condition()
+            self._condition_loop = loop
+        return self._condition
+
+    async def _acquire_slot(self):
+        condition = self._get_condition()
+        async with condition:
+            await condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def _release_slot(self):
+        """
+        슬롯 반납 (개수는 바로 줄이고 대기자 깨우기만 잠금을 기다림)
+
+        finally에서 호출되므로 잠금을 기다리다 취소되어도 슬롯이 새지 않도록 합니다.
+        """
+        self.in_flight -= 1
+        await asyncio.shield(self._notify_slot_waiters())
+
+    async def _notify_slot_waiters(self):
+        condition = self._get_condition()
+        async with condition:
+            condition.notify_all()
+
+    async def _wait_for_circuit(self, queue_when_open: bool) -> bool:
+        """
+        회로가 호출을 허용할 때까지 대기
+
+        Returns:
+            이 호출이 half_open 시험 호출 자격을 받았으면 True
+        """
+        while True:
+            # 상태 확인과 allow_request 사이에 await가 없으므로 같은 상태에서 판단
+            half_open = self.breaker.state == CircuitBreaker.HALF_OPEN
+            if self.breaker.allow_request():
+                return half_open
+            if not queue_when_open:
+                self.counters["rejected"] += 1
+                raise CircuitOpenError(self.breaker.seconds_until_half_open())
+            self.queued += 1
+            try:
+                await asyncio.sleep(max(self.breaker.seconds_until_half_open(), 0.1))
+            finally:
+                self.queued -= 1
+
+    def _on_success(self):
+        # 가산 증가: limit당 1회 성공마다 +1 (RTT당 약 +1)
+        self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+
+    def _on_overload(self):
+        # 곱셈 감소: 같은 과부하 버스트로 여러 번 줄이지 않도록 1초 간격
+        now = time.monotonic()
+        if now - self._last_decrease >= 1.0:
+            self.limit = max(self.min_limit, self.limit / 2)
+            self._last_decrease = now
+            logger.info(f"LLM 동시성 한도 감소 → {int(self.limit)}")
+
+    def _backoff(self, attempt: int, retry_after: Optional[float]) -> float:
+        """full jitter 지수 백오프 (retry-after보다 짧게 기다리지 않음)"""
+        delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * (2 ** attempt)))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    async def call(
+        self,
+        func: Callable[[], Awaitable],
+        max_attempts: int = 3,
+        queue_when_open: bool = False,
+    ):
+        """
+        제한기를 거쳐 API 호출 실행
+
+        Args:
+            func: 호출할 코루틴 함수 (인자 없음, 재시도마다 새로 호출됨)
+            max_attempts: 최대 시도 횟수
+            queue_when_open: True면 회로가 열려 있을 때 닫힐 때까지 대기, False면 CircuitOpenError
+
+        Returns:
+            func의 결과
+        """
+        for attempt in range(max_attempts):
+            holds_probe = await self._wait_for_circuit(queue_when_open)
+            try:
+                await self.bucket.acquire()
+                await self._acquire_slot()
+            except BaseException:
+                # 대기 중 취소되면 시험 호출 자격 반납 (_acquire_slot은 슬롯을 잡은 뒤에는 취소되지 않음)
+                if holds_probe:
+                    self.breaker.release_probe()
+                raise
+            self.counters["calls"] += 1
+
+            try:
+                result = await func()
+            except asyncio.CancelledError:
+                if holds_probe:
+                    self.breaker.release_probe()
+                raise
+            except Exception as error:
+                kind = classify_error(error)
+                self.counters["failures"] += 1
+                if kind is None:
+                    if holds_probe:
+                        self.breaker.release_probe()
+                    raise
+
+                self.breaker.record_failure()
+                if kind == "overload":
+                    self.counters["overloads"] += 1
+                    self._on_overload()
+
+                if attempt == max_attempts - 1:
+                    raise
+
+                delay = self._backoff(attempt, retry_after_seconds(error))
+                self.counters["retries"] += 1
+                logger.info(f"LLM 호출 실패({kind}: {error}). {delay:.1f}초 후 재시도... (시도 {attempt + 1}/{max_attempts})")
+            else:
+                self.counters["successes"] += 1
+                self.breaker.record_success()
+                self._on_success()
+                return result
+            finally:
+                await self._release_slot()
+
+            await asyncio.sleep(delay)
+
+    def snapshot(self) -> dict:
+        """현재 상태 및 누적 지표"""
+        self.bucket._refill()
+        return {
+            "circuit_state": self.breaker.state,
+            "circuit_opened_count": self.breaker.times_opened,
+            "consecutive_failures": self.breaker.consecutive_failures,
+            "concurrency_limit": int(self.limit),
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "rate_tokens_available": round(self.bucket.tokens, 2),
+            **self.counters,
+        }
+
+
+_limiter: Optional[LLMCallLimiter] = None
+
+
+def get_llm_limiter() -> LLMCallLimiter:
+    """프로세스 공용 제한기 (봇과 배치 작업이 함께 사용)"""
+    global _limiter
+    if _limiter is None:
+        _limiter = LLMCallLimiter()
+    return _limiter
@@ -0,0 +1,186 @@
+import math
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy.orm import Session
+from ..models import LLMCall, TelegramMessage
+
+logger = logging.getLogger(__name__)
+
+
+# 모델별 가격 (USD / 100만 토큰: 입력, 출력)
+# 캐시 쓰기는 입력 단가의 1.25배, 캐시 읽기는 0.1배
+MODEL_PRICES = {
+    "claude-haiku-4-5": (1.0, 5.0),
+    "claude-sonnet-4-5": (3.0, 15.0),
+    "claude-3-5-haiku": (0.8, 4.0),
+    "claude-3-5-sonnet": (3.0, 15.0),
+    "claude-3-haiku": (0.25, 1.25),
+}
+CACHE_WRITE_MULTIPLIER = 1.25
+CACHE_READ_MULTIPLIER = 0.1
+
+# 현재 처리 중인 메시지의 호출 기록 (collect_llm_calls 안에서만 수집)
+_current_calls: ContextVar[Optional[list]] = ContextVar("llm_calls", default=None)
+
+
+@contextmanager
+def collect_llm_calls():
+    """
+    블록 안에서 발생한 Claude 호출 기록을 리스트로 수집
+
+    사용 예:
+        with collect_llm_calls() as llm_calls:
+            data, error = await parser.parse_attendance_message_async(text)
+        save_llm_calls(db, llm_calls, telegram_message.id)
+    """
+    calls = []
+    token = _current_calls.set(calls)
+    try:
+        yield calls
+    finally:
+        _current_calls.reset(token)
+
+
+def record_llm_call(**fields):
+    """호출 기록 추가 (collect_llm_calls 밖이면 무시)"""
+    calls = _current_calls.get()
+    if calls is not None:
+        fields.setdefault("created_at", datetime.utcnow())
+        calls.append(fields)
+
+
+def save_llm_calls(db: Session, calls: list, telegram_message_id: Optional[int]) -> int:
+    """
+    수집한 호출 기록을 llm_calls 테이블에 추가 (커밋은 호출자가 수행)
+
+    저장한 기록은 리스트에서 제거되므로 에러 처리 경로에서 다시 호출해도 중복 저장되지 않습니다.
+
+    Returns:
+        추가된 행 수
+    """
+    rows = [LLMCall(telegram_message_id=telegram_message_id, **call) for call in calls]
+    db.add_all(rows)
+    calls.clear()
+    return len(rows)
+
+
+def _model_price(model: str) -> Optional[tuple]:
+    """모델 이름(날짜 접미사 포함)에 맞는 단가"""
+    for prefix, price in MODEL_PRICES.items():
+        if model.startswith(prefix):
+            return price
+    return None
+
+
+def estimate_cost(call: LLMCall) -> float:
+    """호출 1건의 예상 비용 (USD, 가격표에 없는 모델은 0)"""
+    price = _model_price(call.model)
+    if price is None:
+        return 0.0
+    input_price, output_price = price
+    input_cost = (
+        (call.input_tokens or 0)
+        + (call.cache_creation_input_tokens or 0) * CACHE_WRITE_MULTIPLIER
+        + (call.cache_read_input_tokens or 0) * CACHE_READ_MULTIPLIER
+    ) * input_price
+    return (input_cost + (call.output_tokens or 0) * output_price) / 1_000_000
+
+
+def percentile(sorted_values: list, pct: float) -> Optional[float]:
+    """nearest-rank 백분위수 (정렬된 리스트 기준)"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return round(sorted_values[rank - 1], 1)
+
+
+def _latency_summary(latencies: list) -> dict:
+    latencies = sorted(latencies)
+    return {
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "max_ms": round(latencies[-1], 1) if latencies else None,
+    }
+
+
+def build_llm_report(db: Session, days: int = 7, limit: int = 10) -> dict:
+    """
+    최근 호출 기록 리포트
+
+    Args:
+        days: 집계 기간 (오늘 포함 최근 N일)
+        limit: 지연시간/비용 상위 호출 개수
+
+    Returns:
+        전체 요약, 모델별 지연시간, 일별 토큰/비용, 느린 호출/비싼 호출 목록
+    """
+    since = datetime.utcnow() - timedelta(days=days)
+    calls = db.query(LLMCall).filter(LLMCall.created_at >= since).all()
+
+    outcomes = defaultdict(int)
+    by_model = defaultdict(list)
+    daily = defaultdict(lambda: {"calls": 0, "input_tokens": 0, "output_tokens": 0, "cache_read_input_tokens": 0, "cost_usd": 0.0})
+    costs = {}
+
+    for call in calls:
+        outcomes[call.outcome] += 1
+        by_model[call.model].append(call.latency_ms)
+        costs[call.id] = estimate_cost(call)
+
+        day = daily[call.created_at.date().isoformat()]
+        day["calls"] += 1
+        day["input_tokens"] += call.input_tokens or 0
+        day["output_tokens"] += call.output_tokens or 0
+        day["cache_read_input_tokens"] += call.cache_read_input_tokens or 0
+        day["cost_usd"] += costs[call.id]
+
+    total_attempts = sum(call.attempts or 1 for call in calls)
+    message_ids = {call.telegram_message_id for call in calls if call.telegram_message_id}
+
+    return {
+        "period_days": days,
+        "summary": {
+            "calls": len(calls),
+            "messages": len(message_ids),
+            "avg_attempts": round(total_attempts / len(calls), 2) if calls else 0.0,
+            "retries": total_attempts - len(calls),
+            "outcomes": dict(outcomes),
+            "cost_usd": round(sum(costs.values()), 4),
+            "cost_per_message_usd": round(sum(costs.values()) / len(message_ids), 6) if message_ids else None,
+            **_latency_summary([call.latency_ms for call in calls]),
+        },
+        "by_model": {
+            model: {"calls": len(latencies), **_latency_summary(latencies)}
+            for model, latencies in by_model.items()
+        },
+        "daily": [
+            {"date": day, **{k: (round(v, 4) if k == "cost_usd" else v) for k, v in stats.items()}}
+            for day, stats in sorted(daily.items())
+        ],
+        "slowest": [_describe_call(db, call, costs[call.id]) for call in sorted(calls, key=lambda c: c.latency_ms, reverse=True)[:limit]],
+        "most_expensive": [_describe_call(db, call, costs[call.id]) for call in sorted(calls, key=lambda c: costs[c.id], reverse=True)[:limit]],
+    }
+
+
+def _describe_call(db: Session, call: LLMCall, cost: float) -> dict:
+    """리포트용 호출 요약 (원본 메시지 포함)"""
+    message = db.get(TelegramMessage, call.telegram_message_id) if call.telegram_message_id else None
+    return {
+        "id": call.id,
+        "telegram_message_id": call.telegram_message_id,
+        "message_text": message.message_text if message else None,
+        "model": call.model,
+        "tier": call.tier,
+        "latency_ms": round(call.latency_ms, 1),
+        "attempts": call.attempts,
+        "outcome": call.outcome,
+        "input_tokens": call.input_tokens,
+        "output_tokens": call.output_tokens,
+        "cost_usd": round(cost, 6),
+        "created_at": call.created_at,
+    }
@@ -0,0 +1,225 @@
+import os
+import json
+import zlib
+import time
+import logging
+from datetime import datetime
+from typing import Optional
+import numpy as np
+from ..schemas import ExtractedAttendanceData
+from .rule_parser import MessageSlots
+
+logger = logging.getLogger(__name__)
+
+
+# 분류 대상 필드와 허용 레이블 (intent가 없는 메시지는 "none")
+HEAD_LABELS = {
+    "intent": ["create", "update", "cancel", "none"],
+    "attendance_type": ["결석", "지각", "조퇴"],
+    "attendance_reason": ["질병", "미인정", "출석인정"],
+}
+
+# 모델 디렉토리의 현재 버전 포인터 파일
+CURRENT_FILE = "CURRENT"
+
+NGRAM_SIZES = (1, 2, 3)
+DEFAULT_BUCKETS = 2 ** 16
+
+
+def mask_slots(text: str, student_name: str = None, date_phrase: str = None) -> str:
+    """학생 이름은 #, 날짜 표현은 @로 바꿔 분류에 필요 없는 글자를 제거"""
+    text = " ".join(text.split())
+    if date_phrase:
+        text = text.replace(date_phrase, "@")
+    if student_name:
+        text = text.replace(student_name, "#", 1)
+    return text
+
+
+def featurize(text: str, n_buckets: int, student_name: str = None, date_phrase: str = None) -> np.ndarray:
+    """문자 1~3-gram을 해시 버킷 번호 배열로 (중복 제거, 프로세스 간 동일한 crc32 사용)"""
+    padded = f" {mask_slots(text, student_name, date_phrase)} "
+    buckets = {
+        zlib.crc32(padded[i:i + n].encode("utf-8")) % n_buckets
+        for n in NGRAM_SIZES
+        for i in range(len(padded) - n + 1)
+    }
+    return np.fromiter(buckets, dtype=np.int64, count=len(buckets))
+
+
+def softmax(logits: np.ndarray) -> np.ndarray:
+    exp = np.exp(logits - logits.max(axis=-1, keepdims=True))
+    return exp / exp.sum(axis=-1, keepdims=True)
+
+
+def train_head(features: list, labels: np.ndarray, n_classes: int, n_buckets: int,
+               epochs: int = 8, learning_rate: float = 0.5, l2: float = 1e-5,
+               batch_size: int = 256, seed: int = 42) -> np.ndarray:
+    """
+    해시 n-gram 특징의 다항 로지스틱 회귀 (NumPy 미니배치 Adagrad)
+
+    Args:
+        features: 예시별 버킷 번호 배열 목록
+        labels: 예시별 레이블 번호
+        n_classes: 레이블 수
+        n_buckets: 해시 버킷 수
+
+    Returns:
+        가중치 [n_buckets + 1, n_classes] (마지막 행은 bias)
+    """
+    rng = np.random.default_rng(seed)
+    weights = np.zeros((n_buckets + 1, n_classes), dtype=np.float32)
+    squared = np.full((n_buckets + 1, n_classes), 1e-8, dtype=np.float32)
+    bias_row = n_buckets
+
+    for _ in range(epochs):
+        order = rng.permutation(len(features))
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start + batch_size]
+            lengths = np.fromiter((len(features[i]) for i in batch), dtype=np.int64, count=len(batch))
+            rows = np.repeat(np.arange(len(batch)), lengths)
+            cols = np.concatenate([features[i] for i in batch] + [np.full(len(batch), bias_row)])
+            rows = np.concatenate([rows, np.arange(len(batch))])
+
+            # 예시별 logit = 등장한 버킷 가중치 합 + bias
+            logits = np.zeros((len(batch), n_classes), dtype=np.float32)
+            np.add.at(logits, rows, weights[cols])
+            grad_out = softmax(logits)
+            grad_out[np.arange(len(batch)), labels[batch]] -= 1.0
+            grad_out /= len(batch)
+
+            # 이번 배치에 등장한 버킷만 갱신 (L2도 등장한 행에만 적용)
+            touched, inverse = np.unique(cols, return_inverse=True)
+            grad = np.zeros((len(touched), n_classes), dtype=np.float32)
+            np.add.at(grad, inverse, grad_out[rows])
+            grad += l2 * weights[touched]
+            squared[touched] += grad ** 2
+            weights[touched] -= learning_rate * grad / np.sqrt(squared[touched])
+
+    return weights
+
+
+def new_version() -> str:
+    return datetime.utcnow().strftime("v%Y%m%d-%H%M%S")
+
+
+def save_model(root: str, heads: dict, meta: dict) -> str:
+    """
+    새 버전 디렉토리에 헤드별 가중치(.npy)와 meta.json 저장 (활성화는 activate_version)
+
+    Returns:
+        저장한 버전 이름
+    """
+    version = meta.setdefault("version", new_version())
+    version_dir = os.path.join(root, version)
+    os.makedirs(version_dir, exist_ok=True)
+    for head, weights in heads.items():
+        np.save(os.path.join(version_dir, f"{head}.npy"), weights.astype(np.float32))
+    with open(os.path.join(version_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    return version
+
+
+def activate_version(root: str, version: str):
+    """CURRENT 포인터를 바꿔 다음 시작부터 해당 버전 사용 (임시 파일 후 교체)"""
+    tmp_path = os.path.join(root, f"{CURRENT_FILE}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(version + "\n")
+    os.replace(tmp_path, os.path.join(root, CURRENT_FILE))
+
+
+class LocalClassifier:
+    """
+    과거 메시지로 학습한 문자 n-gram 분류기 (규칙 분류기와 Claude 호출 사이 단계)
+
+    학생 이름과 날짜는 규칙(extract_slots)으로 뽑고, intent/출결 타입/사유만 분류합니다.
+    모든 필드의 확률이 min_probability 이상일 때만 결과를 내고, 아니면 Claude로 넘깁니다.
+    가중치는 memory-map으로 열어 여러 프로세스가 같은 페이지를 공유합니다.
+    """
+
+    def __init__(self, model_dir: str, min_probability: float = None):
+        if min_probability is None:
+            min_probability = float(os.getenv("LOCAL_CLASSIFIER_MIN_PROBABILITY", "0.97"))
+        self.min_probability = min_probability
+        self.model_dir = model_dir
+
+        with open(os.path.join(model_dir, "meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.version = self.meta["version"]
+        self.n_buckets = self.meta["n_buckets"]
+        self.labels = self.meta["labels"]
+        self.weights = {
+            head: np.load(os.path.join(model_dir, f"{head}.npy"), mmap_mode="r")
+            for head in self.labels
+        }
+
+        self.attempts = 0
+        self.hits = 0
+        self.latency_ms_total = 0.0
+
+    @classmethod
+    def load(cls, root: str = None) -> Optional["LocalClassifier"]:
+        """CURRENT가 가리키는 버전 로드 (학습된 모델이 없으면 None)"""
+        if root is None:
+            root = os.getenv("LOCAL_CLASSIFIER_DIR", "./models/local_classifier")
+        current_path = os.path.join(root, CURRENT_FILE)
+        if not os.path.exists(current_path):
+            return None
+        with open(current_path, encoding="utf-8") as f:
+            version = f.read().strip()
+        try:
+            classifier = cls(os.path.join(root, version))
+        except (OSError, KeyError, ValueError) as e:
+            logger.error(f"로컬 분류기 로드 실패 ({version}): {e}")
+            return None
+        logger.info(f"로컬 분류기 로드: {version} (기준 확률 {classifier.min_probability})")
+        return classifier
+
+    @property
+    def hit_rate(self) -> float:
+        """시도한 메시지 중 Claude 호출 없이 처리한 비율"""
+        return self.hits / self.attempts if self.attempts else 0.0
+
+    def get_stats(self) -> dict:
+        return {
+            "version": self.version,
+            "attempts": self.attempts,
+            "hits": self.hits,
+            "hit_rate": round(self.hit_rate, 4),
+            "avg_latency_ms": round(self.latency_ms_total / self.attempts, 4) if self.attempts else 0.0,
+        }
+
+    def predict(self, text: str, student_name: str = None, date_phrase: str = None) -> dict:
+        """필드별 (레이블, 확률)"""
+        features = featurize(text, self.n_buckets, student_name, date_phrase)
+        predictions = {}
+        for head, weights in self.weights.items():
+            probabilities = softmax(weights[features].sum(axis=0) + weights[self.n_buckets])
+            best = int(probabilities.argmax())
+            predictions[head] = (self.labels[head][best], float(probabilities[best]))
+        return predictions
+
+    def classify(self, slots: MessageSlots) -> Optional[ExtractedAttendanceData]:
+        """확신할 수 있는 출결 등록 메시지면 추출 데이터, 아니면 None"""
+        started = time.perf_counter()
+        self.attempts += 1
+        predictions = self.predict(slots.text, slots.student_name, slots.date_phrase)
+        self.latency_ms_total += (time.perf_counter() - started) * 1000
+
+        confidence = min(probability for _, probability in predictions.values())
+        if predictions["intent"][0] != "create" or confidence < self.min_probability:
+            return None
+
+        self.hits += 1
+        return ExtractedAttendanceData(
+            intent="create",
+            student_name=slots.student_name,
+            date=slots.start_date,
+            end_date=slots.end_date,
+            date_phrase=slots.date_phrase,
+            attendance_type=predictions["attendance_type"][0],
+            attendance_reason=predictions["attendance_reason"][0],
+            confidence=round(confidence, 4),
+            clarification_needed=False,
+            clarification_question=None,
+        )
@@ -0,0 +1,151 @@
+import os
+import time
+import asyncio
+import logging
+from typing import Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+
+class CoalescedBatch:
+    """한 학부모가 짧은 간격으로 보낸 메시지 묶음"""
+    __slots__ = ("user_id", "updates", "texts", "first_at", "committed", "task")
+
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.updates = []
+        self.texts = []
+        self.first_at = time.monotonic()
+        self.committed = False
+        self.task = None
+
+    @property
+    def text(self) -> str:
+        """파싱할 합친 메시지"""
+        return " ".join(self.texts)
+
+    @property
+    def last_update(self):
+        """답장을 보낼 마지막 메시지의 Update"""
+        return self.updates[-1]
+
+    def begin_commit(self):
+        """
+        DB 저장 시작 표시
+
+        이후에 도착한 메시지는 이 묶음을 취소하지 않고 새 묶음으로 처리됩니다.
+        (파싱은 취소해도 되지만 DB 쓰기는 중간에 끊지 않기 위함)
+        """
+        self.committed = True
+
+
+class MessageCoalescer:
+    """
+    학부모별 메시지 디바운스
+
+    "민수요" / "오늘 열나서" / "결석할게요"처럼 나눠 보낸 메시지를 window_seconds 동안
+    모아 한 번만 파싱합니다. 새 조각이 도착하면 대기 중이거나 파싱 중인 작업을 취소하고
+    조각을 합쳐 다시 예약합니다. 계속 메시지가 와도 첫 조각 이후 max_wait_seconds 안에는 처리됩니다.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[CoalescedBatch], Awaitable],
+        window_seconds: float = None,
+        max_wait_seconds: float = None,
+    ):
+        if window_seconds is None:
+            window_seconds = float(os.getenv("MESSAGE_DEBOUNCE_SECONDS", "1.5"))
+        if max_wait_seconds is None:
+            max_wait_seconds = float(os.getenv("MESSAGE_DEBOUNCE_MAX_WAIT_SECONDS", "6"))
+        self.handler = handler
+        self.window_seconds = window_seconds
+        self.max_wait_seconds = max_wait_seconds
+        self._pending = {}  # user_id -> CoalescedBatch
+
+        self.fragments = 0
+        self.batches = 0
+        self.cancelled_runs = 0
+
+    def get_stats(self) -> dict:
+        """조각/처리 묶음 수 (fragments - batches = 절약한 파싱 횟수)"""
+        return {
+            "fragments": self.fragments,
+            "batches": self.batches,
+            "cancelled_runs": self.cancelled_runs,
+            "pending_users": len(self._pending),
+        }
+
+    async def submit(self, user_id: str, update, text: str):
+        """메시지 조각 추가 (처리는 백그라운드 작업에서 수행)"""
+        self.fragments += 1
+
+        if self.window_seconds <= 0:
+            batch = CoalescedBatch(user_id)
+            batch.updates.append(update)
+            batch.texts.append(text)
+            self.batches += 1
+            await self.handler(batch)
+            return
+
+        batch = self._pending.get(user_id)
+        if batch is not None and not batch.committed and time.monotonic() - batch.first_at < self.max_wait_seconds:
+            # 대기 중이거나 파싱 중인 작업을 취소하고 조각을 합쳐 다시 예약
+            if batch.task and not batch.task.done():
+                batch.task.cancel()
+                self.cancelled_runs += 1
+        else:
+            batch = CoalescedBatch(user_id)
+            self._pending[user_id] = batch
+
+        batch.updates.append(update)
+        batch.texts.append(text)
+        batch.task = asyncio.create_task(self._run(batch))
+
+    async def flush(self, user_id: str):
+        """
+        학부모의 대기 중인 묶음을 지금 처리 (사진처럼 앞선 메시지 결과에 의존하는 업데이트 전에 호출)
+
+        디바운스 대기/파싱 중인 작업은 취소하고 호출한 작업에서 바로 처리합니다.
+        업데이트 처리기의 학부모 잠금을 가진 작업에서 호출하면 handler의 run_in_chat이 그 잠금을 그대로 씁니다.
+        이미 저장을 시작한 묶음은 끊지 않고 끝날 때까지 기다립니다.
+        """
+        batch = self._pending.pop(user_id, None)
+        if batch is None or batch.task is None or batch.task.done():
+            return
+        if not batch.committed:
+            batch.task.cancel()
+        try:
+            await batch.task
+        except asyncio.CancelledError:
+            if not batch.task.cancelled():
+                raise  # 호출한 작업 자체가 취소됨
+        except Exception:
+            pass  # _run이 기록함
+        if batch.committed:
+            return
+
+        self.batches += 1
+        logger.info(f"다음 업데이트 전에 대기 중인 메시지 {len(batch.texts)}개 처리: user={user_id}")
+        try:
+            await self.handler(batch)
+        except Exception as e:
+            logger.error(f"Error processing coalesced messages: {e}", exc_info=True)
+
+    async def _run(self, batch: CoalescedBatch):
+        elapsed = time.monotonic() - batch.first_at
+        await asyncio.sleep(max(0.0, min(self.window_seconds, self.max_wait_seconds - elapsed)))
+
+        self.batches += 1
+        if len(batch.texts) > 1:
+            logger.info(f"메시지 {len(batch.texts)}개 합쳐서 처리: user={batch.user_id}, text={batch.text}")
+        try:
+            await self.handler(batch)
+        except asyncio.CancelledError:
+            self.batches -= 1
+            raise
+        except Exception as e:
+            logger.error(f"Error processing coalesced messages: {e}", exc_info=True)
+        finally:
+            if self._pending.get(batch.user_id) is batch and asyncio.current_task() is batch.task:
+                del self._pending[batch.user_id]
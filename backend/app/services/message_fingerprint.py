@@ -0,0 +1,220 @@
+import os
+import json
+import zlib
+import random
+import logging
+from collections import defaultdict, deque
+from typing import Optional
+from sqlalchemy.orm import Session
+from ..models import TelegramMessage
+from ..schemas import ExtractedAttendanceData
+from .date_resolver import find_date_phrase, resolve_date_phrase
+from .rule_parser import (
+    LLM_REQUIRED_PATTERN, MULTI_STUDENT_PATTERN, UNRESOLVED_DATE_PATTERN, TYPE_KEYWORDS, REASON_KEYWORDS, match_keywords,
+)
+
+logger = logging.getLogger(__name__)
+
+
+NUM_PERMUTATIONS = 64
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+# MinHash용 해시 함수 계수 (프로세스마다 동일한 시그니처가 나오도록 고정 시드)
+_rng = random.Random(20251118)
+_HASH_PARAMS = [
+    (_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+    for _ in range(NUM_PERMUTATIONS)
+]
+
+
+def shingles(text: str) -> set:
+    """
+    문자 1-gram + 2-gram 집합
+
+    날짜 표현과 공백은 제외하므로 "오늘도 열이 나서"와 "내일 열나서"의 차이가 줄어듭니다.
+    """
+    date_phrase = find_date_phrase(text)
+    if date_phrase:
+        text = text.replace(date_phrase, " ")
+    compact = "".join(text.split())
+    grams = set(compact)
+    grams.update(compact[i:i + 2] for i in range(len(compact) - 1))
+    return grams
+
+
+def minhash_signature(text: str) -> Optional[tuple]:
+    """메시지의 MinHash 시그니처 (n-gram이 없으면 None)"""
+    grams = shingles(text)
+    if not grams:
+        return None
+
+    hashed = [zlib.crc32(g.encode("utf-8")) for g in grams]
+    return tuple(
+        min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashed)
+        for a, b in _HASH_PARAMS
+    )
+
+
+def estimate_similarity(sig_a: tuple, sig_b: tuple) -> float:
+    """두 시그니처의 추정 Jaccard 유사도"""
+    return sum(1 for a, b in zip(sig_a, sig_b) if a == b) / NUM_PERMUTATIONS
+
+
+def keyword_labels(text: str) -> tuple:
+    """메시지에 등장하는 출결 타입/사유 키워드 (재사용 시 모순 검사용)"""
+    return (
+        tuple(sorted(match_keywords(text, TYPE_KEYWORDS))),
+        tuple(sorted(match_keywords(text, REASON_KEYWORDS))),
+    )
+
+
+class _Entry:
+    """학부모별 인덱스 항목"""
+    __slots__ = ("signature", "labels", "data", "message_id")
+
+    def __init__(self, signature: tuple, labels: tuple, data: dict, message_id: Optional[int]):
+        self.signature = signature
+        self.labels = labels
+        self.data = data
+        self.message_id = message_id
+
+
+class MessageFingerprintIndex:
+    """
+    학부모(telegram_user_id)별 과거 메시지 MinHash 인덱스
+
+    새 메시지가 같은 학부모의 이전 확신도 높은 파싱 결과와 충분히 비슷하면
+    LLM을 호출하지 않고 그 결과를 재사용합니다 (날짜만 새 메시지 기준으로 다시 계산).
+    """
+
+    def __init__(self, threshold: float = None, min_confidence: float = None, max_per_user: int = None):
+        if threshold is None:
+            threshold = float(os.getenv("FINGERPRINT_SIMILARITY_THRESHOLD", "0.5"))
+        if min_confidence is None:
+            min_confidence = float(os.getenv("FINGERPRINT_MIN_CONFIDENCE", "0.8"))
+        if max_per_user is None:
+            max_per_user = int(os.getenv("FINGERPRINT_MAX_PER_USER", "50"))
+        self.threshold = threshold
+        self.min_confidence = min_confidence
+        self._by_user = defaultdict(lambda: deque(maxlen=max_per_user))
+        self.last_loaded_id = 0
+
+        self.lookups = 0
+        self.reuses = 0
+
+    @property
+    def reuse_rate(self) -> float:
+        """조회 대비 재사용 비율"""
+        return self.reuses / self.lookups if self.lookups else 0.0
+
+    def get_stats(self) -> dict:
+        """인덱스 크기 및 재사용률"""
+        return {
+            "users": len(self._by_user),
+            "entries": sum(len(entries) for entries in self._by_user.values()),
+            "last_loaded_id": self.last_loaded_id,
+            "lookups": self.lookups,
+            "reuses": self.reuses,
+            "reuse_rate": round(self.reuse_rate, 4),
+        }
+
+    def load(self, db: Session, chunk_size: int = 1000) -> int:
+        """
+        telegram_messages의 성공한 파싱 결과를 인덱스에 추가 (증분 로드)
+
+        마지막으로 읽은 id 이후의 행만 chunk_size씩 읽으므로 여러 번 호출해도 안전합니다.
+
+        Returns:
+            추가된 항목 수
+        """
+        added = 0
+        while True:
+            rows = db.query(TelegramMessage).filter(
+                TelegramMessage.id > self.last_loaded_id,
+                TelegramMessage.extraction_success == True
+            ).order_by(TelegramMessage.id).limit(chunk_size).all()
+
+            if not rows:
+                break
+
+            for row in rows:
+                self.last_loaded_id = row.id
+                try:
+                    data = json.loads(row.extracted_data) if row.extracted_data else None
+                except ValueError:
+                    continue
+                # 여러 학생이 함께 추출된 메시지(목록)는 재사용 대상이 아님
+                if isinstance(data, dict) and self.add(row.telegram_user_id, row.message_text, data, row.id):
+                    added += 1
+
+        logger.info(f"메시지 지문 인덱스 로드: {added}건 추가 (last_id={self.last_loaded_id})")
+        return added
+
+    def add(self, user_id: str, message: str, data: dict, message_id: Optional[int] = None) -> bool:
+        """확신도 높은 create 결과만 인덱스에 추가"""
+        if data.get("intent") != "create" or not data.get("student_name"):
+            return False
+        if not data.get("attendance_type") or not data.get("attendance_reason"):
+            return False
+        if (data.get("confidence") or 0) < self.min_confidence:
+            return False
+
+        signature = minhash_signature(message)
+        if signature is None:
+            return False
+
+        self._by_user[user_id].append(_Entry(signature, keyword_labels(message), data, message_id))
+        if message_id:
+            self.last_loaded_id = max(self.last_loaded_id, message_id)
+        return True
+
+    def match(self, user_id: str, message: str) -> Optional[ExtractedAttendanceData]:
+        """
+        비슷한 과거 메시지의 파싱 결과 재사용
+
+        Returns:
+            재사용 가능한 추출 데이터 (날짜는 새 메시지 기준), 없으면 None
+        """
+        self.lookups += 1
+
+        entries = self._by_user.get(user_id)
+        if not entries or LLM_REQUIRED_PATTERN.search(message) or MULTI_STUDENT_PATTERN.search(message):
+            return None
+
+        # 날짜는 새 메시지 기준으로 다시 계산하므로, 해석하지 못하는 날짜 표현("어제", "다음주에", "일주일 동안")이
+        # 남아 있으면 재사용하지 않음 (extract_slots와 같은 기준)
+        date_phrase = find_date_phrase(message)
+        remainder = message.replace(date_phrase, " ") if date_phrase else message
+        if UNRESOLVED_DATE_PATTERN.search(remainder):
+            return None
+
+        signature = minhash_signature(message)
+        if signature is None:
+            return None
+        labels = keyword_labels(message)
+
+        best, best_similarity = None, 0.0
+        for entry in entries:
+            # 키워드로 드러난 타입/사유가 다르면 (결석 ↔ 조퇴 등) 비슷해도 재사용하지 않음
+            if entry.labels != labels or entry.data["student_name"] not in message:
+                continue
+            similarity = estimate_similarity(signature, entry.signature)
+            if similarity >= best_similarity:
+                best, best_similarity = entry, similarity
+
+        if best is None or best_similarity < self.threshold:
+            return None
+
+        start_date, end_date = resolve_date_phrase(date_phrase)
+        if not start_date:
+            return None
+
+        data = dict(best.data)
+        data.update(date=start_date, end_date=end_date, date_phrase=date_phrase or "")
+        self.reuses += 1
+        logger.info(
+            f"유사 메시지 재사용: message_id={best.message_id}, 유사도={best_similarity:.2f} "
+            f"(재사용률 {self.reuse_rate:.1%})"
+        )
+        return ExtractedAttendanceData(**data)
@@ -0,0 +1,370 @@
+import os
+import time
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from sqlalchemy import delete, func, select, update
+from telegram import Bot
+from telegram.error import BadRequest, ChatMigrated, Forbidden, InvalidToken, RetryAfter
+from telegram.request import HTTPXRequest
+from ..database import AsyncSessionLocal
+from ..models import OutboundMessage
+
+logger = logging.getLogger(__name__)
+
+# 다시 보내도 소용없는 오류 (봇 차단, 없는 채팅, 잘못된 토큰 등)
+PERMANENT_ERRORS = (Forbidden, BadRequest, ChatMigrated, InvalidToken)
+
+
+class TokenBucket:
+    """초당 rate개, 최대 capacity개까지 몰아서 허용 (예약 방식: 토큰이 모자라면 기다릴 시간 반환)"""
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def reserve(self) -> float:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def is_idle(self) -> bool:
+        return self.tokens + (time.monotonic() - self.updated) * self.rate >= self.capacity
+
+
+class OutboundDispatcher:
+    """
+    텔레그램 알림 발송기 (API 서버와 봇이 공유하는 프로세스별 싱글톤)
+
+    알림은 outbound_messages 테이블에 먼저 저장하고 백그라운드 작업이 발송합니다.
+    - 연결 풀을 쓰는 Bot 하나를 재사용
+    - 전체/채팅별 토큰 버킷으로 텔레그램 발송 한도(초당 약 30건, 채팅당 초당 1건)를 지킴
+    - 동시 발송 수 제한
+    - 429 RetryAfter면 그 시간 동안 전체 발송을 멈추고 다시 대기열로, 네트워크 오류는 지수 백오프로 재시도
+    여러 프로세스가 같은 대기열을 처리해도 한 건은 한 프로세스만 가져갑니다 (상태 조건부 UPDATE).
+    """
+
+    def __init__(
+        self,
+        global_rate: float = None,
+        per_chat_rate: float = None,
+        per_chat_burst: float = None,
+        max_concurrency: int = None,
+        max_attempts: int = None,
+        poll_seconds: float = None,
+        claim_lease_seconds: float = 300,
+        retention_days: float = 7,
+    ):
+        if global_rate is None:
+            global_rate = float(os.getenv("TELEGRAM_GLOBAL_RATE_PER_SECOND", "25"))
+        if per_chat_rate is None:
+            per_chat_rate = float(os.getenv("TELEGRAM_PER_CHAT_RATE_PER_SECOND", "1"))
+        if per_chat_burst is None:
+            per_chat_burst = float(os.getenv("TELEGRAM_PER_CHAT_BURST", "3"))
+        if max_concurrency is None:
+            max_concurrency = int(os.getenv("TELEGRAM_SEND_CONCURRENCY", "8"))
+        if max_attempts is None:
+            max_attempts = int(os.getenv("TELEGRAM_SEND_MAX_ATTEMPTS", "5"))
+        if poll_seconds is None:
+            poll_seconds = float(os.getenv("OUTBOUND_POLL_SECONDS", "5"))
+        self.per_chat_rate = per_chat_rate
+        self.per_chat_burst = per_chat_burst
+        self.max_concurrency = max_concurrency
+        self.max_attempts = max_attempts
+        self.poll_seconds = poll_seconds
+        self.claim_lease_seconds = claim_lease_seconds
+        self.retention_days = retention_days
+
+        self._global_bucket = TokenBucket(global_rate, global_rate)
+        self._chat_buckets = {}  # chat_id → TokenBucket
+        self._bot = None
+        self._semaphore = None
+        self._wakeup = None
+        self._worker = None
+        self._paused_until = 0.0  # RetryAfter를 받으면 이 시각까지 전체 발송 중지
+        self._waiters = {}  # 메시지 id → 완료 Future (이 프로세스에서 기다리는 경우)
+
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.flood_waits = 0
+        self.in_flight = 0
+
+    def _create_bot(self) -> Bot:
+        request = HTTPXRequest(connection_pool_size=self.max_concurrency + 2)
+        kwargs = {}
+        # 봇과 같은 Bot API 서버 사용 (테스트용 가짜 텔레그램 서버 등)
+        api_base_url = os.getenv("TELEGRAM_API_BASE_URL")
+        if api_base_url:
+            api_base_url = api_base_url.rstrip("/")
+            kwargs = {"base_url": f"{api_base_url}/bot", "base_file_url": f"{api_base_url}/file/bot"}
+        return Bot(token=os.getenv("TELEGRAM_BOT_TOKEN", ""), request=request, **kwargs)
+
+    async def start(self):
+        """발송 작업 시작 (이미 실행 중이면 무시)"""
+        if self._worker is not None and not self._worker.done():
+            return
+        if self._bot is None:
+            # get_me 호출 없이 HTTP 클라이언트만 준비 (텔레그램에 연결할 수 없어도 대기열 저장은 가능)
+            self._bot = self._create_bot()
+            await self._bot.request.initialize()
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._wakeup = asyncio.Event()
+        self._worker = asyncio.get_running_loop().create_task(self._run())
+        logger.info("텔레그램 발송 대기열 처리 시작")
+
+    async def stop(self):
+        """발송 작업 중지 (발송 중이던 건은 다음 시작 때 다시 처리)"""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        if self._bot is not None:
+            await self._bot.request.shutdown()
+            self._bot = None
+
+    async def enqueue(self, messages: list, purpose: str = None) -> list:
+        """
+        (chat_id, text) 목록을 발송 대기열에 저장
+
+        Returns:
+            저장된 메시지 id 목록
+        """
+        await self.start()
+        now = datetime.utcnow()
+        async with AsyncSessionLocal() as db:
+            rows = [
+                OutboundMessage(chat_id=str(chat_id), text=text, purpose=purpose, status="pending", next_attempt_at=now)
+                for chat_id, text in messages
+            ]
+            db.add_all(rows)
+            await db.commit()
+            ids = [row.id for row in rows]
+        self._wakeup.set()
+        return ids
+
+    async def send_many(self, messages: list, purpose: str = None, timeout: float = None) -> list:
+        """
+        대기열에 넣고 timeout초까지 결과를 기다림
+
+        Returns:
+            messages 순서대로 상태 (sent, failed, 아직 못 보냈으면 pending/sending, 이후에도 계속 시도)
+        """
+        if timeout is None:
+            timeout = float(os.getenv("OUTBOUND_WAIT_SECONDS", "20"))
+        if not messages:
+            return []
+        loop = asyncio.get_running_loop()
+        ids = await self.enqueue(messages, purpose)
+        futures = [self._waiters.setdefault(message_id, loop.create_future()) for message_id in ids]
+        try:
+            await asyncio.wait(futures, timeout=timeout)
+        finally:
+            for message_id in ids:
+                self._waiters.pop(message_id, None)
+
+        # 다른 프로세스가 보냈을 수도 있으므로 DB 상태가 기준
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(
+                select(OutboundMessage.id, OutboundMessage.status).where(OutboundMessage.id.in_(ids))
+            )).all()
+        statuses = {row.id: row.status for row in rows}
+        return [statuses.get(message_id, "failed") for message_id in ids]
+
+    async def send(self, chat_id: str, text: str, purpose: str = None, timeout: float = None) -> str:
+        """메시지 한 건 발송 후 상태 반환"""
+        return (await self.send_many([(chat_id, text)], purpose, timeout))[0]
+
+    async def _run(self):
+        try:
+            await self._prune()
+        except Exception as e:
+            logger.error(f"발송 기록 정리 실패: {e}")
+        while True:
+            try:
+                claimed = await self._claim(self.max_concurrency * 4)
+                if claimed:
+                    await asyncio.gather(*(self._deliver(*row) for row in claimed))
+                    continue
+                delay = await self._next_due_in()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"발송 대기열 처리 오류: {e}", exc_info=True)
+                delay = self.poll_seconds
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _prune(self):
+        """retention_days가 지난 발송 완료/실패 기록 삭제"""
+        async with AsyncSessionLocal() as db:
+            cutoff = datetime.utcnow() - timedelta(days=self.retention_days)
+            await db.execute(delete(OutboundMessage).where(
+                OutboundMessage.status.in_(("sent", "failed")), OutboundMessage.created_at < cutoff
+            ))
+            await db.commit()
+
+    async def _claim(self, limit: int) -> list:
+        """
+        발송할 메시지를 가져와 sending으로 표시 (다른 프로세스가 먼저 가져간 건은 제외)
+
+        SQLite에서 쓰기 잠금을 짧게 잡도록 먼저 읽기만 하고, 가져갈 메시지가 있을 때만
+        UPDATE 한 번으로 표시한 뒤 바로 커밋합니다.
+        """
+        now = datetime.utcnow()
+        async with AsyncSessionLocal() as db:
+            # 발송 중에 죽은 프로세스가 가져간 메시지는 다시 대기 상태로
+            stale_before = now - timedelta(seconds=self.claim_lease_seconds)
+            has_stale = (await db.execute(select(OutboundMessage.id).where(
+                OutboundMessage.status == "sending", OutboundMessage.claimed_at < stale_before
+            ).limit(1))).first()
+            if has_stale:
+                await db.execute(update(OutboundMessage).where(
+                    OutboundMessage.status == "sending", OutboundMessage.claimed_at < stale_before
+                ).values(status="pending"))
+                await db.commit()
+
+            candidate_ids = (await db.execute(
+                select(OutboundMessage.id)
+                .where(OutboundMessage.status == "pending", OutboundMessage.next_attempt_at <= now)
+                .order_by(OutboundMessage.next_attempt_at, OutboundMessage.id)
+                .limit(limit)
+            )).scalars().all()
+            if not candidate_ids:
+                return []
+
+            await db.execute(update(OutboundMessage).where(
+                OutboundMessage.id.in_(candidate_ids), OutboundMessage.status == "pending"
+            ).values(status="sending", claimed_at=now))
+            await db.commit()
+
+            rows = (await db.execute(
+                select(OutboundMessage.id, OutboundMessage.chat_id, OutboundMessage.text, OutboundMessage.attempts)
+                .where(
+                    OutboundMessage.id.in_(candidate_ids),
+                    OutboundMessage.status == "sending",
+                    OutboundMessage.claimed_at == now,
+                )
+                .order_by(OutboundMessage.next_attempt_at, OutboundMessage.id)
+            )).all()
+        return [(row.id, row.chat_id, row.text, row.attempts or 0) for row in rows]
+
+    async def _next_due_in(self) -> float:
+        """다음 재시도까지 남은 시간 (없으면 poll_seconds)"""
+        async with AsyncSessionLocal() as db:
+            next_at = (await db.execute(
+                select(func.min(OutboundMessage.next_attempt_at)).where(OutboundMessage.status == "pending")
+            )).scalar()
+        if next_at is None:
+            return self.poll_seconds
+        return min(self.poll_seconds, max(0.05, (next_at - datetime.utcnow()).total_seconds()))
+
+    def _chat_bucket(self, chat_id: str) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) > 10000:
+                self._chat_buckets = {key: b for key, b in self._chat_buckets.items() if not b.is_idle()}
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self.per_chat_rate, self.per_chat_burst)
+        return bucket
+
+    async def _wait_for_slot(self, chat_id: str):
+        """채팅별 → 전체 한도 순서로 기다림 (RetryAfter로 멈춘 동안도 대기)"""
+        await asyncio.sleep(self._chat_bucket(chat_id).reserve())
+        await asyncio.sleep(self._global_bucket.reserve())
+        pause = self._paused_until - time.monotonic()
+        if pause > 0:
+            await asyncio.sleep(pause)
+
+    async def _deliver(self, message_id: int, chat_id: str, text: str, attempts: int):
+        async with self._semaphore:
+            await self._wait_for_slot(chat_id)
+            self.in_flight += 1
+            attempts += 1
+            values = {"attempts": attempts, "claimed_at": None}
+            try:
+                sent = await self._bot.send_message(chat_id=chat_id, text=text)
+                values.update(status="sent", sent_at=datetime.utcnow(), telegram_message_id=sent.message_id, last_error=None)
+                self.sent += 1
+            except RetryAfter as e:
+                retry_after = e.retry_after.total_seconds() if isinstance(e.retry_after, timedelta) else float(e.retry_after)
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+                self.flood_waits += 1
+                logger.warning(f"텔레그램 발송 한도 초과, {retry_after}초 대기 (chat_id={chat_id})")
+                values.update(self._retry_values(attempts, retry_after, f"RetryAfter: {retry_after}s"))
+            except PERMANENT_ERRORS as e:
+                logger.error(f"텔레그램 발송 실패 (재시도 안 함, chat_id={chat_id}): {e}")
+                values.update(status="failed", last_error=f"{type(e).__name__}: {e}")
+                self.failed += 1
+            except Exception as e:
+                # 네트워크 오류/시간 초과 등은 지수 백오프로 재시도
+                values.update(self._retry_values(attempts, min(2 ** attempts, 300), f"{type(e).__name__}: {e}"))
+            finally:
+                self.in_flight -= 1
+
+            try:
+                async with AsyncSessionLocal() as db:
+                    await db.execute(update(OutboundMessage).where(OutboundMessage.id == message_id).values(**values))
+                    await db.commit()
+            except Exception as e:
+                # 기록에 실패해도 다른 메시지 발송은 계속 (sending 상태는 임대 만료 후 다시 대기열로)
+                logger.error(f"발송 결과 저장 실패 (id={message_id}, status={values['status']}): {e}", exc_info=True)
+
+            if values["status"] in ("sent", "failed"):
+                waiter = self._waiters.get(message_id)
+                if waiter is not None and not waiter.done():
+                    waiter.set_result(values["status"])
+
+    def _retry_values(self, attempts: int, delay: float, error: str) -> dict:
+        if attempts >= self.max_attempts:
+            logger.error(f"텔레그램 발송 {attempts}회 실패, 포기: {error}")
+            self.failed += 1
+            return {"status": "failed", "last_error": error}
+        self.retried += 1
+        return {
+            "status": "pending",
+            "next_attempt_at": datetime.utcnow() + timedelta(seconds=delay),
+            "last_error": error,
+        }
+
+    def get_stats(self) -> dict:
+        return {
+            "running": self._worker is not None and not self._worker.done(),
+            "in_flight": self.in_flight,
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+            "flood_waits": self.flood_waits,
+            "paused_seconds": round(max(0.0, self._paused_until - time.monotonic()), 1),
+            "chat_buckets": len(self._chat_buckets),
+        }
+
+    async def get_queue_stats(self) -> dict:
+        """대기열 상태별 건수"""
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(
+                select(OutboundMessage.status, func.count()).group_by(OutboundMessage.status)
+            )).all()
+        return {status: count for status, count in rows}
+
+
+_dispatcher = None
+
+
+def get_outbound_dispatcher() -> OutboundDispatcher:
+    """프로세스 공용 발송기"""
+    global _dispatcher
+    if _dispatcher is None:
+        _dispatcher = OutboundDispatcher()
+    return _dispatcher
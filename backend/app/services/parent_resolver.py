@@ -0,0 +1,197 @@
+import os
+import time
+import logging
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from ..database import dialect_insert
+from ..models import ParentLinkChange, StudentParent
+
+logger = logging.getLogger(__name__)
+
+
+class ParentLink:
+    """학부모 한 명(telegram_id)과 학생의 연결 (비활성 포함)"""
+    __slots__ = ("parent_id", "student_id", "is_active", "created_at")
+
+    def __init__(self, parent_id: int, student_id: int, is_active: bool, created_at):
+        self.parent_id = parent_id
+        self.student_id = student_id
+        self.is_active = is_active
+        self.created_at = created_at
+
+    def __repr__(self) -> str:
+        return f"ParentLink(student_id={self.student_id}, active={self.is_active})"
+
+
+class ParentLinks:
+    """telegram_id 하나의 학생 연결 목록 (최근 등록순, 등록되지 않은 사용자면 빈 목록)"""
+    __slots__ = ("links", "cached_at")
+
+    def __init__(self, links: list):
+        self.links = tuple(links)
+        self.cached_at = time.monotonic()
+
+    @property
+    def active(self) -> list:
+        return [link for link in self.links if link.is_active]
+
+    @property
+    def latest_active(self) -> Optional[ParentLink]:
+        """가장 최근에 등록된 활성 연결 (학생 이름이 없을 때 대상 학생)"""
+        return next((link for link in self.links if link.is_active), None)
+
+    def for_student(self, student_id: int) -> Optional[ParentLink]:
+        """해당 학생과의 연결 (비활성 포함)"""
+        return next((link for link in self.links if link.student_id == student_id), None)
+
+
+class ParentResolver:
+    """
+    telegram_id → 학생 연결 캐시 (LRU)
+
+    봇이 업데이트마다 여러 번 하던 StudentParent 조회를 한 번(캐시가 있으면 0번)으로 줄입니다.
+    등록되지 않은 사용자도 negative_ttl_seconds 동안 캐시합니다.
+    parents/students 라우트와 봇의 자동 등록은 바꾼 telegram_id를 parent_link_changes 테이블에 같은
+    트랜잭션으로 기록하고(record_parent_changes), 각 프로세스는 sync_seconds마다 그 뒤에 바뀐 id를
+    한 번에 조회해 지웁니다 (polling 모드처럼 API와 봇이 다른 프로세스여도 몇 초 안에 반영).
+    같은 프로세스에서 바꾼 경우는 invalidate로 바로 지우고, ttl_seconds는 그 밖의 경우를 위한 상한입니다.
+    """
+
+    # 커밋이 늦은 변경이나 프로세스 간 시계 차이를 놓치지 않도록 조회 구간을 겹침
+    SYNC_OVERLAP = timedelta(seconds=10)
+
+    def __init__(self, max_entries: int = None, ttl_seconds: float = None, negative_ttl_seconds: float = None,
+                 sync_seconds: float = None):
+        if max_entries is None:
+            max_entries = int(os.getenv("PARENT_CACHE_MAX_ENTRIES", "10000"))
+        if ttl_seconds is None:
+            ttl_seconds = float(os.getenv("PARENT_CACHE_TTL_SECONDS", "300"))
+        if negative_ttl_seconds is None:
+            negative_ttl_seconds = float(os.getenv("PARENT_CACHE_NEGATIVE_TTL_SECONDS", "30"))
+        if sync_seconds is None:
+            sync_seconds = float(os.getenv("PARENT_CACHE_SYNC_SECONDS", "2"))
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self.sync_seconds = sync_seconds
+        self._cache = OrderedDict()  # telegram_id → ParentLinks
+        self._last_sync = time.monotonic()
+        self._synced_until = datetime.utcnow()  # 이 시각 이후의 변경을 다음에 조회
+
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.remote_invalidations = 0
+
+    async def _sync_changes(self, db: AsyncSession):
+        """다른 프로세스가 기록한 학부모 연결 변경을 sync_seconds마다 한 번 조회해 캐시에서 삭제"""
+        if self.sync_seconds <= 0 or not self._cache:
+            return
+        now = time.monotonic()
+        if now - self._last_sync < self.sync_seconds:
+            return
+        self._last_sync = now
+        started = datetime.utcnow()
+        try:
+            changed = (await db.scalars(
+                select(ParentLinkChange.telegram_id).where(ParentLinkChange.changed_at > self._synced_until)
+            )).all()
+        except Exception as e:
+            logger.error(f"학부모 연결 변경 조회 실패: {e}")
+            return
+        self._synced_until = started - self.SYNC_OVERLAP
+        for telegram_id in changed:
+            if self._cache.pop(telegram_id, None) is not None:
+                self.remote_invalidations += 1
+
+    def _get_cached(self, telegram_id: str) -> Optional[ParentLinks]:
+        entry = self._cache.get(telegram_id)
+        if entry is None:
+            return None
+        ttl = self.ttl_seconds if entry.links else self.negative_ttl_seconds
+        if time.monotonic() - entry.cached_at > ttl:
+            del self._cache[telegram_id]
+            return None
+        self._cache.move_to_end(telegram_id)
+        return entry
+
+    def _put(self, telegram_id: str, entry: ParentLinks):
+        self._cache[telegram_id] = entry
+        self._cache.move_to_end(telegram_id)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+            self.evictions += 1
+
+    async def resolve(self, db: AsyncSession, telegram_id: str) -> ParentLinks:
+        """telegram_id의 학생 연결 (캐시에 없으면 한 번 조회)"""
+        telegram_id = str(telegram_id)
+        await self._sync_changes(db)
+        entry = self._get_cached(telegram_id)
+        if entry is not None:
+            if entry.links:
+                self.hits += 1
+            else:
+                self.negative_hits += 1
+            return entry
+
+        self.misses += 1
+        rows = (await db.execute(
+            select(StudentParent.id, StudentParent.student_id, StudentParent.is_active, StudentParent.created_at)
+            .where(StudentParent.telegram_id == telegram_id)
+            .order_by(StudentParent.created_at.desc(), StudentParent.id.desc())
+        )).all()
+        entry = ParentLinks([ParentLink(row.id, row.student_id, bool(row.is_active), row.created_at) for row in rows])
+        self._put(telegram_id, entry)
+        return entry
+
+    def invalidate(self, telegram_id: str = None):
+        """telegram_id의 캐시 삭제 (None이면 전체)"""
+        if telegram_id is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(str(telegram_id), None)
+
+    def get_stats(self) -> dict:
+        lookups = self.hits + self.negative_hits + self.misses
+        return {
+            "entries": len(self._cache),
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "remote_invalidations": self.remote_invalidations,
+            "hit_rate": round((self.hits + self.negative_hits) / lookups, 4) if lookups else 0.0,
+        }
+
+
+def parent_change_statement(dialect_name: str, telegram_ids):
+    """telegram_id들의 연결 변경 시각 기록 (UPSERT, 변경과 같은 트랜잭션에서 실행)"""
+    now = datetime.utcnow()
+    insert = dialect_insert(dialect_name)
+    statement = insert(ParentLinkChange).values(
+        [{"telegram_id": str(telegram_id), "changed_at": now} for telegram_id in set(telegram_ids)]
+    )
+    return statement.on_conflict_do_update(index_elements=["telegram_id"], set_={"changed_at": now})
+
+
+def record_parent_changes(db: Session, *telegram_ids):
+    """학부모 연결 변경 기록 (API 라우트용, 커밋 전에 호출)"""
+    telegram_ids = [telegram_id for telegram_id in telegram_ids if telegram_id]
+    if telegram_ids:
+        db.execute(parent_change_statement(db.bind.dialect.name, telegram_ids))
+
+
+_resolver = None
+
+
+def get_parent_resolver() -> ParentResolver:
+    """프로세스 공용 학부모 연결 캐시"""
+    global _resolver
+    if _resolver is None:
+        _resolver = ParentResolver()
+    return _resolver
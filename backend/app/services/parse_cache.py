@@ -0,0 +1,114 @@
+import os
+import json
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional
+
+
+class ParseResultCache:
+    """
+    파싱 결과 캐시 (LRU + 항목별 TTL)
+
+    같은 메시지를 다시 보내거나 봇 오류 후 재전송하는 경우 Claude 호출을 생략합니다.
+    상대 날짜("내일" 등)의 의미가 바뀌므로 모든 항목은 늦어도 자정에 만료되고,
+    키에도 오늘 날짜가 포함됩니다.
+    """
+
+    def __init__(self, max_entries: int = None, ttl_seconds: int = None):
+        if max_entries is None:
+            max_entries = int(os.getenv("PARSE_CACHE_MAX_ENTRIES", "1000"))
+        if ttl_seconds is None:
+            ttl_seconds = int(os.getenv("PARSE_CACHE_TTL_SECONDS", "3600"))
+        self.max_entries = max_entries
+        self.ttl = timedelta(seconds=ttl_seconds)
+        self._entries = OrderedDict()  # key -> (expires_at, result)
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def normalize(message: str) -> str:
+        """공백/끝 문장부호 차이를 무시한 메시지 정규화"""
+        return " ".join(message.split()).rstrip(".!~ ")
+
+    @staticmethod
+    def _copy(data):
+        """추출 결과(모델 또는 학생별 모델 목록) 깊은 복사"""
+        if data is None:
+            return None
+        if isinstance(data, list):
+            return [item.model_copy(deep=True) for item in data]
+        return data.model_copy(deep=True)
+
+    def make_key(self, message: str, context: dict = None) -> Optional[tuple]:
+        """
+        캐시 키 생성
+
+        대화 기록(messages)이 있는 메시지는 이전 대화에 따라 해석이 달라지므로
+        캐시하지 않습니다 (None 반환).
+        """
+        if context and context.get('messages'):
+            return None
+
+        partial_data = context.get('partial_data', {}) if context else {}
+        return (
+            self.normalize(message),
+            datetime.now().date().isoformat(),
+            json.dumps(partial_data, ensure_ascii=False, sort_keys=True, default=str),
+        )
+
+    def get(self, key: tuple):
+        """캐시된 결과 조회 (없거나 만료되면 None)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, result = entry
+            if datetime.now() >= expires_at:
+                del self._entries[key]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+
+        data, error = result
+        # 호출자가 결과를 수정해도 캐시가 오염되지 않도록 복사본 반환
+        return self._copy(data), error
+
+    def put(self, key: tuple, result: tuple):
+        """결과 저장 (TTL과 다음 자정 중 빠른 시각에 만료)"""
+        now = datetime.now()
+        next_midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+        expires_at = min(now + self.ttl, next_midnight)
+
+        data, error = result
+        stored = (self._copy(data), error)
+
+        with self._lock:
+            self._entries[key] = (expires_at, stored)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """전체 캐시 비우기"""
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> dict:
+        """적중/미스 통계"""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
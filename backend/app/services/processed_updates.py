@@ -0,0 +1,106 @@
+import os
+import time
+import logging
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from sqlalchemy import delete
+from ..database import AsyncSessionLocal, dialect_insert
+from ..models import ProcessedUpdate
+
+logger = logging.getLogger(__name__)
+
+
+class ProcessedUpdateLog:
+    """
+    처리한 텔레그램 update_id 기록 (재시작/재배포 후 다시 전달된 업데이트를 파싱 전에 건너뜀)
+
+    최근 id는 메모리에서 바로 확인하고, 없으면 processed_updates 테이블을 조회합니다.
+    처리 중인 id도 기억해 웹훅 재전송처럼 처리 도중 같은 업데이트가 또 와도 한 번만 처리합니다.
+    기록은 retention_hours가 지나면 삭제합니다 (텔레그램은 24시간 지난 업데이트를 다시 보내지 않음).
+    """
+
+    def __init__(self, retention_hours: float = None, memory_size: int = 10000, prune_interval: float = 3600):
+        if retention_hours is None:
+            retention_hours = float(os.getenv("PROCESSED_UPDATE_RETENTION_HOURS", "48"))
+        self.retention_hours = retention_hours
+        self.memory_size = memory_size
+        self.prune_interval = prune_interval
+        self._recent = OrderedDict()  # 최근 처리한 update_id (LRU)
+        self._in_flight = set()
+        self._last_prune = 0.0
+
+        self.duplicates = 0
+        self.recorded = 0
+
+    def _remember(self, update_id: int):
+        self._recent[update_id] = None
+        self._recent.move_to_end(update_id)
+        while len(self._recent) > self.memory_size:
+            self._recent.popitem(last=False)
+
+    async def claim(self, update) -> bool:
+        """처리해도 되면 True (이미 처리했거나 처리 중이면 False)"""
+        update_id = getattr(update, "update_id", None)
+        if update_id is None:
+            return True
+        if update_id in self._recent or update_id in self._in_flight:
+            self.duplicates += 1
+            return False
+
+        self._in_flight.add(update_id)
+        try:
+            async with AsyncSessionLocal() as db:
+                exists = await db.get(ProcessedUpdate, update_id)
+        except Exception as e:
+            # 기록을 확인할 수 없으면 처리 (출결 기록은 유니크 인덱스가 중복을 막음)
+            logger.error(f"처리한 업데이트 조회 실패: {e}")
+            return True
+        if exists is not None:
+            self._in_flight.discard(update_id)
+            self._remember(update_id)
+            self.duplicates += 1
+            return False
+        return True
+
+    async def mark(self, updates: list):
+        """처리 완료 기록 (이미 있으면 무시)"""
+        rows = []
+        for update in updates:
+            update_id = getattr(update, "update_id", None)
+            if update_id is None:
+                continue
+            message = getattr(update, "effective_message", None)
+            chat = getattr(update, "effective_chat", None)
+            rows.append({
+                "update_id": update_id,
+                "chat_id": str(chat.id) if chat else None,
+                "message_id": message.message_id if message else None,
+                "processed_at": datetime.utcnow(),
+            })
+        if not rows:
+            return
+
+        try:
+            async with AsyncSessionLocal() as db:
+                insert = dialect_insert(db.bind.dialect.name)
+                await db.execute(insert(ProcessedUpdate).values(rows).on_conflict_do_nothing(index_elements=["update_id"]))
+                if time.monotonic() - self._last_prune > self.prune_interval:
+                    self._last_prune = time.monotonic()
+                    cutoff = datetime.utcnow() - timedelta(hours=self.retention_hours)
+                    await db.execute(delete(ProcessedUpdate).where(ProcessedUpdate.processed_at < cutoff))
+                await db.commit()
+            self.recorded += len(rows)
+        except Exception as e:
+            logger.error(f"처리한 업데이트 기록 실패: {e}")
+        finally:
+            for row in rows:
+                self._in_flight.discard(row["update_id"])
+                self._remember(row["update_id"])
+
+    def get_stats(self) -> dict:
+        return {
+            "recent": len(self._recent),
+            "in_flight": len(self._in_flight),
+            "duplicates_skipped": self.duplicates,
+            "recorded": self.recorded,
+        }
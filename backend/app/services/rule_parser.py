@@ -0,0 +1,209 @@
+import os
+import re
+import logging
+from typing import Optional
+from datetime import date
+from ..schemas import ExtractedAttendanceData
+from .date_resolver import find_date_phrase, resolve_date_phrase
+
+logger = logging.getLogger(__name__)
+
+
+# 출결 타입 키워드 (claude_parser 프롬프트의 분류표와 동일)
+TYPE_KEYWORDS = {
+    "조퇴": ["조퇴", "일찍 가", "일찍가", "먼저 가", "먼저가", "빼주세요", "교시 끝나고", "점심 먹고"],
+    "지각": ["지각", "늦"],
+    "결석": ["결석", "못 가", "못가", "못 갑", "못갑", "안 가", "안가요", "쉬어요", "쉴게요", "학교 안"],
+}
+
+# 출결 사유 키워드
+REASON_KEYWORDS = {
+    "질병": ["아파", "아픕", "아프", "병원", "감기", "몸살", "열이", "열나", "열 나", "고열", "배탈", "장염", "독감", "두통", "복통", "구토"],
+    "출석인정": ["체험학습", "현장체험", "가족여행", "법정감염병", "제사"],
+    "미인정": ["늦잠", "개인 사정", "개인사정"],
+}
+
+# 사유만 있을 때 추정하는 타입 ("홍길동 아파요" → 결석)
+DEFAULT_TYPE_BY_REASON = {
+    "질병": "결석",
+    "출석인정": "결석",
+}
+
+# LLM이 필요한 메시지 (수정/취소/질문/부정 표현, 등교·하교 시각이나 출석 여부가 걸린 표현, 지난 일 보고)
+# 사유만 있는 메시지를 결석으로 추정하면 안 되는 경우: "병원 들렀다 갈게요"(지각), "오후에 데리러 갈게요"(조퇴),
+# "열이 나요 학교 보낼게요"(출석), "체험학습 다녀왔어요"(보고)
+LLM_REQUIRED_PATTERN = re.compile(
+    r"\?|취소|수정|바꿔|변경|잘못|아니라|괜찮아|안 아파|안아파|나았"
+    r"|갈게|등교|보낼게|데리러|오후에|들렀다|갔다가|다녀왔"
+)
+
+# 여러 학생이 함께 나오는 메시지 ("철수랑 영희 둘 다", 결석자 명단) - 학생별 추출은 LLM이 담당
+MULTI_STUDENT_PATTERN = re.compile(r"둘\s*다|셋\s*다|모두|[,\n]|[가-힣](?:랑|하고|와|과)\s")
+
+# date_resolver가 해석하지 못하는 날짜 표현은 LLM에 맡김 (날짜 표현 밖의 숫자 포함, 예: "3교시")
+UNRESOLVED_DATE_PATTERN = re.compile(r"\d|어제|지난|다음\s*주|이번\s*주|부터|까지|동안")
+
+# 메시지 앞부분의 학생 이름 (한글 2~4자 + 선택적 조사)
+NAME_PATTERN = re.compile(r"^([가-힣]{2,5})(?=\s|$)")
+NAME_SUFFIXES = ("이는", "이가", "이도", "이", "는", "가", "도")
+
+# 이름으로 오인하면 안 되는 단어
+NON_NAME_WORDS = {"오늘", "오늘도", "내일", "내일도", "저희", "우리", "아이", "아이가", "아이는", "선생님", "안녕하세요"}
+
+
+def match_keywords(text: str, table: dict) -> list:
+    """키워드 표에서 메시지에 등장하는 항목 목록"""
+    return [label for label, keywords in table.items() if any(k in text for k in keywords)]
+
+
+class MessageSlots:
+    """짧은 단일 학생 메시지에서 뽑은 학생 이름/날짜 (출결 타입/사유 분류 전 단계)"""
+    __slots__ = ("text", "student_name", "date_phrase", "start_date", "end_date")
+
+    def __init__(self, text: str, student_name: str, date_phrase: str, start_date: str, end_date: Optional[str]):
+        self.text = text
+        self.student_name = student_name
+        self.date_phrase = date_phrase
+        self.start_date = start_date
+        self.end_date = end_date
+
+
+def extract_slots(message: str, context: dict = None, today: date = None) -> Optional[MessageSlots]:
+    """
+    규칙으로 처리 가능한 메시지에서 학생 이름과 날짜 추출
+
+    대화 맥락이 있거나, 여러 학생/수정·취소·질문/해석할 수 없는 날짜 표현이 있으면
+    LLM이 처리해야 하므로 None을 반환합니다. (규칙 분류기와 로컬 분류기가 함께 사용)
+    """
+    if context and (context.get('messages') or context.get('partial_data')):
+        return None
+
+    if MULTI_STUDENT_PATTERN.search(message):
+        return None
+    text = " ".join(message.split())
+    if not text or len(text) > 40:
+        return None
+    if LLM_REQUIRED_PATTERN.search(text):
+        return None
+
+    date_phrase = find_date_phrase(text)
+    remainder = text.replace(date_phrase, " ") if date_phrase else text
+    if UNRESOLVED_DATE_PATTERN.search(remainder):
+        return None
+    start_date, end_date = resolve_date_phrase(date_phrase, today)
+    if not start_date:
+        return None
+
+    student_name = extract_name(text)
+    if not student_name:
+        return None
+
+    return MessageSlots(text, student_name, date_phrase or "", start_date, end_date)
+
+
+def extract_name(text: str) -> Optional[str]:
+    """메시지 맨 앞의 학생 이름 추출 ("주선이 아파요" → "주선")"""
+    match = NAME_PATTERN.match(text)
+    if not match:
+        return None
+
+    token = match.group(1)
+    if token in NON_NAME_WORDS:
+        return None
+    if match_keywords(token, TYPE_KEYWORDS) or match_keywords(token, REASON_KEYWORDS):
+        return None
+
+    for suffix in NAME_SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 2 and len(token) >= 3:
+            return token[:-len(suffix)]
+    return token
+
+
+class RuleBasedParser:
+    """
+    정형화된 짧은 출결 메시지를 위한 키워드/정규식 분류기
+
+    "홍길동 아파요", "김철수 늦잠 자서 지각" 같은 메시지는 LLM 없이 바로 처리하고,
+    확신이 없으면 None을 반환해 Claude 호출로 넘깁니다.
+    """
+
+    def __init__(self, min_confidence: float = None):
+        if min_confidence is None:
+            min_confidence = float(os.getenv("RULE_PARSER_MIN_CONFIDENCE", "0.9"))
+        self.min_confidence = min_confidence
+        self.attempts = 0
+        self.hits = 0
+
+    @property
+    def hit_rate(self) -> float:
+        """LLM 호출 없이 처리한 비율"""
+        return self.hits / self.attempts if self.attempts else 0.0
+
+    def get_stats(self) -> dict:
+        """적중률 통계"""
+        return {
+            "attempts": self.attempts,
+            "hits": self.hits,
+            "hit_rate": round(self.hit_rate, 4),
+        }
+
+    def parse(self, message: str, context: dict = None, today: date = None) -> Optional[ExtractedAttendanceData]:
+        """
+        메시지를 규칙으로 분류
+
+        Args:
+            message: 텔레그램 메시지 원문
+            context: 이전 대화 맥락 (있으면 LLM이 병합해야 하므로 처리하지 않음)
+            today: 날짜 표현의 기준 날짜 (기본값: 오늘)
+
+        Returns:
+            신뢰도가 min_confidence 이상이면 추출 데이터, 아니면 None
+        """
+        self.attempts += 1
+
+        data = self.classify(message, context, today)
+        if data is None or data.confidence < self.min_confidence:
+            return None
+
+        self.hits += 1
+        logger.info(f"규칙 기반 처리: {message} (적중률 {self.hit_rate:.1%}, {self.hits}/{self.attempts})")
+        return data
+
+    def classify(self, message: str, context: dict = None, today: date = None) -> Optional[ExtractedAttendanceData]:
+        """신뢰도와 함께 추출 데이터 반환 (분류 불가 시 None)"""
+        slots = extract_slots(message, context, today)
+        if slots is None:
+            return None
+        text = slots.text
+
+        types = match_keywords(text, TYPE_KEYWORDS)
+        reasons = match_keywords(text, REASON_KEYWORDS)
+        if len(types) > 1 or len(reasons) != 1:
+            return None
+
+        attendance_reason = reasons[0]
+        if types:
+            attendance_type = types[0]
+            confidence = 0.95
+        elif attendance_reason in DEFAULT_TYPE_BY_REASON:
+            attendance_type = DEFAULT_TYPE_BY_REASON[attendance_reason]
+            confidence = 0.9
+        else:
+            return None
+
+        # 긴 메시지일수록 키워드 밖의 뉘앙스가 있을 가능성이 큼
+        if len(text) > 25:
+            confidence -= 0.1
+
+        return ExtractedAttendanceData(
+            intent="create",
+            student_name=slots.student_name,
+            date=slots.start_date,
+            end_date=slots.end_date,
+            date_phrase=slots.date_phrase,
+            attendance_type=attendance_type,
+            attendance_reason=attendance_reason,
+            confidence=round(confidence, 2),
+            clarification_needed=False,
+            clarification_question=None,
+        )
@@ -0,0 +1,296 @@
+import os
+import time
+import logging
+import unicodedata
+from typing import Optional
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from ..models import Student, StudentParent
+
+logger = logging.getLogger(__name__)
+
+
+# 한글 음절 → 자모 (초성/중성/종성) 분해용 표
+CHOSEONG = "ㄱㄲㄴㄷㄸㄹㅁㅂㅃㅅㅆㅇㅈㅉㅊㅋㅌㅍㅎ"
+JUNGSEONG = "ㅏㅐㅑㅒㅓㅔㅕㅖㅗㅘㅙㅚㅛㅜㅝㅞㅟㅠㅡㅢㅣ"
+JONGSEONG = ["", "ㄱ", "ㄲ", "ㄳ", "ㄴ", "ㄵ", "ㄶ", "ㄷ", "ㄹ", "ㄺ", "ㄻ", "ㄼ", "ㄽ", "ㄾ", "ㄿ", "ㅀ",
+             "ㅁ", "ㅂ", "ㅄ", "ㅅ", "ㅆ", "ㅇ", "ㅈ", "ㅊ", "ㅋ", "ㅌ", "ㅍ", "ㅎ"]
+HANGUL_BASE = 0xAC00
+HANGUL_LAST = 0xD7A3
+
+# 두 글자 성씨 (이름만 떼어낼 때 사용)
+COMPOUND_SURNAMES = {"남궁", "황보", "제갈", "선우", "독고", "사공", "서문", "동방", "망절"}
+
+# 매칭 종류별 점수 (높을수록 우선)
+MATCH_SCORES = {
+    "full": 1.0,       # 홍길동
+    "given": 0.9,      # 길동
+    "nickname": 0.85,  # 길동이, 길동아, 민수야
+    "typo": 0.6,       # 홍길똥 (자모 한 개 차이)
+}
+
+
+def decompose(text: str) -> str:
+    """한글 음절을 자모로 분해 ("영희" → "ㅇㅕㅇㅎㅢ"), 한글이 아닌 글자는 그대로"""
+    jamo = []
+    for char in text:
+        code = ord(char)
+        if HANGUL_BASE <= code <= HANGUL_LAST:
+            offset = code - HANGUL_BASE
+            jamo.append(CHOSEONG[offset // 588])
+            jamo.append(JUNGSEONG[(offset % 588) // 28])
+            jamo.append(JONGSEONG[offset % 28])
+        else:
+            jamo.append(char)
+    return "".join(jamo)
+
+
+def has_final_consonant(syllable: str) -> bool:
+    """받침 여부 ("동" → True, "수" → False)"""
+    code = ord(syllable)
+    return HANGUL_BASE <= code <= HANGUL_LAST and (code - HANGUL_BASE) % 28 != 0
+
+
+def normalize_name(name: str) -> str:
+    """NFC 정규화 + 공백 제거 (자모가 분리되어 입력된 이름도 같은 키로)"""
+    return "".join(unicodedata.normalize("NFC", name or "").split())
+
+
+def given_name(name: str) -> Optional[str]:
+    """성을 뗀 이름 ("홍길동" → "길동", "남궁민수" → "민수", 두 글자 이름은 None)"""
+    if len(name) >= 4 and name[:2] in COMPOUND_SURNAMES:
+        return name[2:]
+    if len(name) >= 3:
+        return name[1:]
+    return None
+
+
+def nicknames(name: str) -> list:
+    """부를 때 붙는 접미사 ("길동" → 길동이/길동아, "민수" → 민수야)"""
+    if not name:
+        return []
+    if has_final_consonant(name[-1]):
+        return [name + "이", name + "아"]
+    return [name + "야"]
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """레벤슈타인 거리 (limit을 넘으면 limit + 1)"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+class BKTree:
+    """편집 거리 기반 BK-tree (자모 키, 오타 한두 개 이내 이름 검색)"""
+
+    def __init__(self):
+        self.root = None  # [key, {거리: 자식 노드}]
+
+    def add(self, key: str):
+        if self.root is None:
+            self.root = [key, {}]
+            return
+        node = self.root
+        while True:
+            distance = edit_distance(key, node[0], len(key) + len(node[0]))
+            if distance == 0:
+                return
+            child = node[1].get(distance)
+            if child is None:
+                node[1][distance] = [key, {}]
+                return
+            node = child
+
+    def search(self, key: str, max_distance: int) -> list:
+        """(거리, 키) 목록"""
+        if self.root is None:
+            return []
+        found = []
+        stack = [self.root]
+        while stack:
+            node_key, children = stack.pop()
+            distance = edit_distance(key, node_key, len(key) + len(node_key))
+            if distance <= max_distance:
+                found.append((distance, node_key))
+            for child_distance, child in children.items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    stack.append(child)
+        return found
+
+
+class StudentMatch:
+    """이름 검색 후보"""
+    __slots__ = ("student_id", "name", "student_number", "score", "kind", "is_parent_linked")
+
+    def __init__(self, student_id: int, name: str, student_number: int, score: float, kind: str, is_parent_linked: bool = False):
+        self.student_id = student_id
+        self.name = name
+        self.student_number = student_number
+        self.score = score
+        self.kind = kind
+        self.is_parent_linked = is_parent_linked
+
+    def __repr__(self) -> str:
+        return f"StudentMatch({self.name}, {self.kind}, {self.score})"
+
+
+class _IndexSnapshot:
+    """한 번 만들면 바꾸지 않는 색인 (재생성 시 통째로 교체)"""
+    __slots__ = ("students", "keys", "jamo_keys", "tree", "parents", "built_at")
+
+    def __init__(self, students: list, parent_links: list):
+        self.students = {}   # student_id → (이름, 출석번호)
+        self.keys = {}       # 이름 키 → [(student_id, 종류)]
+        self.jamo_keys = {}  # 자모 키 → 이름 키 (오타 검색 결과를 되돌리기 위함)
+        self.tree = BKTree()
+        self.parents = {}    # 학부모 telegram_id → {student_id}
+        self.built_at = time.monotonic()
+
+        for student_id, name, student_number in students:
+            name = normalize_name(name)
+            self.students[student_id] = (name, student_number)
+            given = given_name(name)
+            self._add(name, student_id, "full")
+            if given:
+                self._add(given, student_id, "given")
+            for nickname in nicknames(given or name):
+                self._add(nickname, student_id, "nickname")
+
+        for student_id, telegram_id in parent_links:
+            self.parents.setdefault(telegram_id, set()).add(student_id)
+
+    def _add(self, key: str, student_id: int, kind: str):
+        entries = self.keys.setdefault(key, [])
+        if any(existing_id == student_id for existing_id, _ in entries):
+            return
+        entries.append((student_id, kind))
+        if kind != "nickname":
+            jamo = decompose(key)
+            self.jamo_keys[jamo] = key
+            self.tree.add(jamo)
+
+
+class StudentNameIndex:
+    """
+    학생 이름 메모리 색인
+
+    전체 이름/성을 뗀 이름/부르는 이름(길동이, 민수야)은 딕셔너리로 바로 찾고,
+    못 찾으면 자모 단위 BK-tree로 오타 한 개(이름이 길면 두 개)까지 찾습니다.
+    학생/학부모가 바뀐 세션이 커밋되면 무효화되고, 다른 프로세스(API 서버와 봇은 따로 실행됨)에서
+    바뀐 경우를 위해 ttl_seconds가 지나면 다음 검색 때 다시 만듭니다.
+    """
+
+    def __init__(self, ttl_seconds: float = None):
+        if ttl_seconds is None:
+            ttl_seconds = float(os.getenv("STUDENT_INDEX_TTL_SECONDS", "60"))
+        self.ttl_seconds = ttl_seconds
+        self._snapshot = None
+        self.rebuilds = 0
+
+    def invalidate(self):
+        """다음 검색 때 다시 만들도록 표시"""
+        self._snapshot = None
+
+    def _ensure(self, db: Session) -> _IndexSnapshot:
+        snapshot = self._snapshot
+        if snapshot is None or time.monotonic() - snapshot.built_at > self.ttl_seconds:
+            students = db.query(Student.id, Student.name, Student.student_number).all()
+            parent_links = db.query(StudentParent.student_id, StudentParent.telegram_id).filter(
+                StudentParent.is_active == True
+            ).all()
+            snapshot = _IndexSnapshot(students, parent_links)
+            self._snapshot = snapshot
+            self.rebuilds += 1
+            logger.info(f"학생 이름 색인 생성: 학생 {len(snapshot.students)}명, 키 {len(snapshot.keys)}개")
+        return snapshot
+
+    def lookup(self, db: Session, name: str, telegram_user_id: str = None) -> list:
+        """
+        이름으로 학생 후보 찾기
+
+        Args:
+            db: 색인이 없거나 만료됐을 때 다시 만들 세션
+            name: 추출된 학생 이름
+            telegram_user_id: 학부모 ID (같은 점수면 이 학부모의 자녀를 앞에 둠)
+
+        Returns:
+            점수 높은 순 StudentMatch 목록 (없으면 빈 목록)
+        """
+        snapshot = self._ensure(db)
+        key = normalize_name(name)
+        if not key:
+            return []
+        linked = snapshot.parents.get(telegram_user_id, set()) if telegram_user_id else set()
+
+        matches = {}
+        for student_id, kind in snapshot.keys.get(key, []):
+            matches[student_id] = MATCH_SCORES[kind], kind
+
+        if not matches:
+            jamo = decompose(key)
+            max_distance = 1 if len(key) <= 3 else 2
+            for distance, jamo_key in snapshot.tree.search(jamo, max_distance):
+                for student_id, _ in snapshot.keys[snapshot.jamo_keys[jamo_key]]:
+                    score = MATCH_SCORES["typo"] - 0.1 * (distance - 1)
+                    if score > matches.get(student_id, (0.0, None))[0]:
+                        matches[student_id] = score, "typo"
+
+        candidates = [
+            StudentMatch(student_id, *snapshot.students[student_id], score, kind, student_id in linked)
+            for student_id, (score, kind) in matches.items()
+        ]
+        candidates.sort(key=lambda m: (-m.score, not m.is_parent_linked, m.student_number))
+        return candidates
+
+    def parent_student_ids(self, db: Session, telegram_user_id: str) -> set:
+        """학부모로 등록된 자녀 id"""
+        return set(self._ensure(db).parents.get(telegram_user_id, set()))
+
+    def get_stats(self) -> dict:
+        snapshot = self._snapshot
+        return {
+            "students": len(snapshot.students) if snapshot else 0,
+            "keys": len(snapshot.keys) if snapshot else 0,
+            "rebuilds": self.rebuilds,
+            "age_seconds": round(time.monotonic() - snapshot.built_at, 1) if snapshot else None,
+        }
+
+
+_index = None
+
+
+def get_student_index() -> StudentNameIndex:
+    """프로세스 공용 학생 이름 색인"""
+    global _index
+    if _index is None:
+        _index = StudentNameIndex()
+    return _index
+
+
+@event.listens_for(Session, "before_flush")
+def _track_student_changes(session, flush_context, instances):
+    """학생/학부모가 바뀌는 세션 표시 (커밋되면 색인 무효화)"""
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, (Student, StudentParent)):
+            session.info["student_index_dirty"] = True
+            return
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_on_commit(session):
+    if session.info.pop("student_index_dirty", False) and _index is not None:
+        _index.invalidate()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_on_rollback(session):
+    session.info.pop("student_index_dirty", None)
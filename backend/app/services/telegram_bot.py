@@ -3,9 +3,21 @@ import logging
 from datetime import datetime, timedelta
 from telegram import Update
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
-from sqlalchemy.orm import Session
+from sqlalchemy import and_, or_, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from .claude_parser import ClaudeMessageParser
-from ..database import SessionLocal
+from .message_fingerprint import MessageFingerprintIndex
+from .llm_telemetry import collect_llm_calls, save_llm_calls
+from .conversation_store import create_conversation_store
+from .document_store import get_document_store
+from .parent_resolver import get_parent_resolver, parent_change_statement
+from .outbound_dispatcher import get_outbound_dispatcher
+from .processed_updates import ProcessedUpdateLog
+from .message_coalescer import CoalescedBatch, MessageCoalescer
+from .student_index import get_student_index
+from .update_processor import PerChatUpdateProcessor
+from ..database import SessionLocal, AsyncSessionLocal, dialect_insert
 from ..models import Student, AttendanceRecord, TelegramMessage, StudentParent, DocumentSubmission, AttendanceType, AttendanceReason, ApprovalStatus
 import json
 
@@ -16,59 +28,6 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-class ConversationSession:
-    """대화 세션 관리"""
-    def __init__(self):
-        self.sessions = {}  # telegram_user_id -> session_data
-
-    def get_or_create(self, user_id: str):
-        """세션 가져오기 또는 생성"""
-        if user_id not in self.sessions:
-            self.sessions[user_id] = {
-                'messages': [],
-                'partial_data': {},
-                'last_updated': datetime.utcnow()
-            }
-        return self.sessions[user_id]
-
-    def add_message(self, user_id: str, message: str):
-        """대화 기록 추가"""
-        session = self.get_or_create(user_id)
-        session['messages'].append({
-            'text': message,
-            'timestamp': datetime.utcnow()
-        })
-        session['last_updated'] = datetime.utcnow()
-
-        # 최근 10개 메시지만 유지
-        session['messages'] = session['messages'][-10:]
-
-    def set_partial_data(self, user_id: str, data: dict):
-        """부분 정보 저장"""
-        session = self.get_or_create(user_id)
-        session['partial_data'] = data
-        session['last_updated'] = datetime.utcnow()
-
-    def get_context(self, user_id: str):
-        """대화 맥락 가져오기"""
-        session = self.get_or_create(user_id)
-
-        # 5분 이상 지난 세션은 초기화
-        if (datetime.utcnow() - session['last_updated']).seconds > 300:
-            self.clear(user_id)
-            return None
-
-        return {
-            'messages': session['messages'],
-            'partial_data': session['partial_data']
-        }
-
-    def clear(self, user_id: str):
-        """세션 초기화"""
-        if user_id in self.sessions:
-            del self.sessions[user_id]
-
-
 class AttendanceTelegramBot:
     """출결 관리 텔레그램 봇"""
 
@@ -78,8 +37,29 @@ class AttendanceTelegramBot:
             raise ValueError("TELEGRAM_BOT_TOKEN environment variable is required")
 
         self.parser = ClaudeMessageParser()
-        self.conversation = ConversationSession()  # 대화 세션 관리
-        self.application = Application.builder().token(self.bot_token).build()
+        self.conversation = create_conversation_store()  # 대화 맥락 (만료/개수 제한, 메모리 또는 DB)
+        self.fingerprints = MessageFingerprintIndex()  # 학부모별 유사 메시지 인덱스
+        self.student_index = get_student_index()  # 학생 이름 색인 (학생/학부모 변경 시 무효화)
+        self.documents = get_document_store()  # 서류 사진 저장소 (내용 주소, 축소본)
+        self.parents = get_parent_resolver()  # telegram_id → 학생 연결 캐시 (parents 라우트의 변경 기록으로 무효화)
+        self.processed = ProcessedUpdateLog()  # 처리한 update_id (재전송된 업데이트 건너뛰기)
+        self.coalescer = MessageCoalescer(self._process_batch)  # 나눠 보낸 메시지 합치기
+        self._load_fingerprints()
+
+        # 학부모별 순서는 지키고 서로 다른 학부모의 메시지는 동시에 처리
+        self.updates = PerChatUpdateProcessor()
+        builder = (
+            Application.builder()
+            .token(self.bot_token)
+            .concurrent_updates(self.updates)
+            .post_shutdown(self._post_shutdown)  # polling 종료 시 (웹훅 모드는 stop_webhook에서)
+        )
+        # 테스트용 가짜 텔레그램 서버 등 다른 Bot API 서버 사용 (예: http://localhost:8081)
+        api_base_url = os.getenv("TELEGRAM_API_BASE_URL")
+        if api_base_url:
+            api_base_url = api_base_url.rstrip("/")
+            builder = builder.base_url(f"{api_base_url}/bot").base_file_url(f"{api_base_url}/file/bot")
+        self.application = builder.build()
 
         # 핸들러 등록
         self.application.add_handler(CommandHandler("start", self.start_command))
@@ -87,6 +67,21 @@ class AttendanceTelegramBot:
         self.application.add_handler(MessageHandler(filters.PHOTO, self.handle_photo))
         self.application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_message))
 
+    async def _post_shutdown(self, application: Application):
+        await self.conversation.close()
+        await self.documents.close()
+        await get_outbound_dispatcher().stop()
+
+    def _load_fingerprints(self):
+        """과거 메시지 로그로 유사 메시지 인덱스 구성 (증분 로드)"""
+        db = SessionLocal()
+        try:
+            self.fingerprints.load(db)
+        except Exception as e:
+            logger.error(f"메시지 지문 인덱스 로드 실패: {e}")
+        finally:
+            db.close()
+
     async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """봇 시작 명령"""
         await update.message.reply_text(
@@ -138,20 +133,19 @@ class AttendanceTelegramBot:
         """사진 메시지 처리 (서류 제출)"""
         user = update.effective_user
         telegram_user_id = str(user.id)
+        if not await self.processed.claim(update):
+            logger.info(f"이미 처리한 업데이트 건너뜀: update_id={update.update_id}")
+            return
 
         logger.info(f"Received photo from {telegram_user_id}")
 
-        # uploads 디렉토리가 없으면 생성
-        import os
-        os.makedirs("uploads", exist_ok=True)
+        # 먼저 보낸 결석 메시지가 디바운스 대기 중이면 그것부터 처리 (서류 기록이 생긴 뒤 사진 연결)
+        await self.coalescer.flush(telegram_user_id)
 
-        db = SessionLocal()
+        db = AsyncSessionLocal()
         try:
             # 이 telegram_id로 등록된 학생의 학부모인지 확인
-            parent = db.query(StudentParent).filter(
-                StudentParent.telegram_id == telegram_user_id,
-                StudentParent.is_active == True
-            ).first()
+            parent = (await self.parents.resolve(db, telegram_user_id)).latest_active
 
             if not parent:
                 await update.message.reply_text(
@@ -160,13 +154,13 @@ class AttendanceTelegramBot:
                 )
                 return
 
-            student = db.query(Student).filter(Student.id == parent.student_id).first()
+            student = await db.get(Student, parent.student_id)
 
             # 가장 최근 미제출 서류 찾기
-            unsubmitted_doc = db.query(DocumentSubmission).filter(
+            unsubmitted_doc = (await db.execute(select(DocumentSubmission).where(
                 DocumentSubmission.student_id == student.id,
                 DocumentSubmission.is_submitted == False
-            ).order_by(DocumentSubmission.date.desc()).first()
+            ).order_by(DocumentSubmission.date.desc()).limit(1))).scalars().first()
 
             if not unsubmitted_doc:
                 await update.message.reply_text(
@@ -178,19 +172,19 @@ class AttendanceTelegramBot:
             photo = update.message.photo[-1]  # 가장 큰 크기의 사진
             file_telegram_id = photo.file_id
 
-            # 실제 파일 다운로드 및 저장
+            # 실제 파일 다운로드 및 저장 (내용 해시 경로, 같은 사진은 한 번만 저장)
             file = await context.bot.get_file(file_telegram_id)
-            file_name = f"{student.id}_{int(datetime.utcnow().timestamp())}.jpg"
-            file_path = f"uploads/{file_name}"
-            await file.download_to_drive(file_path)
+            stored = await self.documents.save_telegram_file(file)
+            if stored.deduplicated:
+                logger.info(f"이미 저장된 사진 재사용: {stored.key}")
 
             # 서류 제출 완료 처리
             unsubmitted_doc.is_submitted = True
             unsubmitted_doc.submitted_at = datetime.utcnow()
             unsubmitted_doc.file_telegram_id = file_telegram_id
-            unsubmitted_doc.file_path = file_name  # 파일명만 저장 (uploads/ 제외)
+            unsubmitted_doc.file_path = stored.key  # 저장소 키 (ab/cd/<sha256>.jpg)
 
-            db.commit()
+            await db.commit()
 
             await update.message.reply_text(
                 f"✅ {student.name} 학생의 서류가 접수되었습니다!\n\n"
@@ -208,43 +202,86 @@ class AttendanceTelegramBot:
                 "잠시 후 다시 시도해주세요."
             )
         finally:
-            db.close()
+            await db.close()
+            await self.processed.mark([update])
 
     async def handle_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """일반 메시지 처리"""
+        """일반 메시지 수신 (짧은 간격으로 이어지는 메시지는 합쳐서 한 번에 처리)"""
         user = update.effective_user
-        message_text = update.message.text
+        if not await self.processed.claim(update):
+            logger.info(f"이미 처리한 업데이트 건너뜀: update_id={update.update_id}")
+            return
+        logger.info(f"Received message from {user.id}: {update.message.text}")
+        await self.coalescer.submit(str(user.id), update, update.message.text)
+
+    async def _process_batch(self, batch: CoalescedBatch):
+        """
+        합쳐진 메시지 처리 (파싱 중 새 조각이 오면 이 작업은 취소됨)
+
+        디바운스 작업은 업데이트 처리 밖에서 실행되므로 같은 학부모의 잠금을 다시 잡아
+        이전 묶음/사진 처리와 겹치지 않게 합니다 (대화 맥락 경쟁 방지).
+        """
+        await self.updates.run_in_chat(batch.user_id, self._handle_batch(batch))
+        # 새 조각으로 취소된 묶음은 여기까지 오지 않음 (합쳐진 묶음이 처리된 뒤 기록)
+        await self.processed.mark(batch.updates)
+
+    async def _handle_batch(self, batch: CoalescedBatch):
+        update = batch.last_update
+        user = update.effective_user
+        message_text = batch.text
         telegram_user_id = str(user.id)
 
-        logger.info(f"Received message from {user.id}: {message_text}")
-
-        db = SessionLocal()
+        db = AsyncSessionLocal()
+        llm_calls = []
         try:
             # 대화 맥락 가져오기
-            conversation_context = self.conversation.get_context(telegram_user_id)
-
-            # Claude AI로 메시지 파싱 (맥락 포함)
-            extracted_data, error = self.parser.parse_attendance_message(message_text, conversation_context)
-
-            # 텔레그램 메시지 로그 저장
+            conversation_context = await self.conversation.get_context(telegram_user_id)
+
+            # 같은 학부모가 전에 보낸 비슷한 메시지가 있으면 그 결과 재사용 (날짜만 다시 계산)
+            extracted_records, error = None, None
+            if not (conversation_context and conversation_context.get('partial_data')):
+                reused_data = self.fingerprints.match(telegram_user_id, message_text)
+                if reused_data:
+                    extracted_records = [reused_data]
+            reused = extracted_records is not None
+
+            # Claude AI로 메시지 파싱 (맥락 포함, 여러 학생이면 학생별로 한 번에 추출)
+            if not reused:
+                with collect_llm_calls() as llm_calls:
+                    extracted_records, error = await self.parser.parse_attendance_batch_async(message_text, conversation_context)
+
+            # 여기부터는 DB에 기록하므로 새 조각이 와도 취소하지 않음
+            batch.begin_commit()
+
+            # 텔레그램 메시지 로그 저장 (학생 1명이면 객체, 여러 명이면 목록)
+            extracted_json = None
+            if extracted_records:
+                dumped = [record.model_dump() for record in extracted_records]
+                extracted_json = json.dumps(dumped[0] if len(dumped) == 1 else dumped)
             telegram_message = TelegramMessage(
                 telegram_user_id=str(user.id),
                 message_text=message_text,
-                extracted_data=json.dumps(extracted_data.model_dump()) if extracted_data else None,
-                extraction_success=extracted_data is not None,
+                extracted_data=extracted_json,
+                extraction_success=bool(extracted_records),
                 error_message=error
             )
             db.add(telegram_message)
-            db.commit()
+            await db.flush()
+            save_llm_calls(db, llm_calls, telegram_message.id)
+            await db.commit()
+
+            extracted_data = extracted_records[0] if extracted_records else None
+            if extracted_data and len(extracted_records) == 1 and not reused:
+                self.fingerprints.add(telegram_user_id, message_text, extracted_data.model_dump(), telegram_message.id)
 
             # 대화 기록 저장
-            self.conversation.add_message(telegram_user_id, message_text)
+            await self.conversation.add_message(telegram_user_id, message_text)
 
             if error or not extracted_data:
                 # 추출 실패 - 부분 정보 저장 및 재요청 메시지 전송
                 if extracted_data:
                     # 부분 정보라도 저장
-                    self.conversation.set_partial_data(telegram_user_id, extracted_data.model_dump())
+                    await self.conversation.set_partial_data(telegram_user_id, extracted_data.model_dump())
 
                 clarification = self.parser.generate_clarification_message(message_text, error or "알 수 없는 오류")
                 await update.message.reply_text(clarification)
@@ -256,211 +293,319 @@ class AttendanceTelegramBot:
                 await update.message.reply_text(response_message)
                 return
 
-            # 학생 찾기 로직
-            student = None
-            telegram_user_id = str(user.id)
-
-            # 1. 메시지에서 학생 이름이 추출된 경우
-            if extracted_data.student_name:
-                student_name = extracted_data.student_name.replace("이", "").strip()  # "길동이" -> "길동"
-
-                # 1-1. 전체 이름으로 찾기
-                student = db.query(Student).filter(Student.name == student_name).first()
-
-                # 1-2. 이름에 포함되는지 확인 (부분 매칭)
-                if not student:
-                    student = db.query(Student).filter(Student.name.contains(student_name)).first()
-
-                # 1-3. 이름이 포함되어 있는지 역으로 확인 ("홍길동"에서 "길동" 찾기)
-                if not student:
-                    students = db.query(Student).all()
-                    for s in students:
-                        if student_name in s.name or s.name.endswith(student_name):
-                            student = s
-                            break
-
-            # 2. 메시지에서 학생 이름을 찾을 수 없는 경우, telegram_user_id로 학부모 찾기
-            if not student:
-                # 가장 최근에 등록된 활성화된 학부모를 찾음 (created_at 최신순)
-                parent = db.query(StudentParent).filter(
-                    StudentParent.telegram_id == telegram_user_id,
-                    StudentParent.is_active == True
-                ).order_by(StudentParent.created_at.desc()).first()
-
-                if parent:
-                    student = db.query(Student).filter(Student.id == parent.student_id).first()
-                    logger.info(f"📌 telegram_user_id로 학생 찾음: telegram_id={telegram_user_id}, student={student.name if student else None}")
-
-            # 3. 여전히 학생을 찾을 수 없는 경우
-            if not student:
-                error_name = extracted_data.student_name if extracted_data.student_name else "학생"
+            # 학생 이름이 없을 때 학부모 정보로 찾는 것은 학생이 한 명일 때만
+            single_student = len(extracted_records) == 1
+            targets = []
+            missing_names = []
+            for record in extracted_records:
+                student = await self._find_student(db, record.student_name, telegram_user_id, use_parent_fallback=single_student)
+                if student:
+                    targets.append((student, record))
+                else:
+                    missing_names.append(record.student_name or "학생")
+
+            # 학생을 찾을 수 없는 경우 (일부만 등록되지 않도록 아무것도 저장하지 않음)
+            if missing_names:
                 await update.message.reply_text(
-                    f"'{error_name}' 학생을 찾을 수 없습니다.\n"
+                    f"'{', '.join(missing_names)}' 학생을 찾을 수 없습니다.\n"
                     f"등록된 학생 이름을 정확히 입력해주세요."
                 )
                 return
 
             # 📌 학부모 자동 등록
-            self._register_parent_if_new(db, student.id, str(user.id))
+            for student, _ in targets:
+                await self._register_parent_if_new(db, student.id, str(user.id))
 
             # Intent에 따라 분기 처리
             intent = extracted_data.intent
 
-            if intent == "cancel":
-                # 취소 처리: 가장 최근 출결 기록 삭제
-                await self._handle_cancel(db, student, message_text, update)
-                return
-            elif intent == "update":
-                # 수정 처리: 가장 최근 출결 기록 수정
-                await self._handle_update(db, student, extracted_data, message_text, update)
+            if intent in ("cancel", "update"):
+                for student, record in targets:
+                    if record.intent == "cancel":
+                        # 취소 처리: 가장 최근 출결 기록 삭제
+                        await self._handle_cancel(db, student, message_text, update)
+                    elif record.intent == "update":
+                        # 수정 처리: 가장 최근 출결 기록 수정
+                        await self._handle_update(db, student, record, message_text, update)
                 return
-            # intent == "create"인 경우 아래 기존 로직 실행
-
-            # AI가 잘못 반환한 경우 자동 수정
-            # "출석인정"을 attendance_type으로 반환한 경우 → 결석 + 출석인정으로 변환
-            if extracted_data.attendance_type == "출석인정":
-                logger.warning(f"AI가 attendance_type으로 '출석인정'을 반환했습니다. '결석'으로 자동 수정합니다.")
-                extracted_data.attendance_type = "결석"
-                if not extracted_data.attendance_reason:
-                    extracted_data.attendance_reason = "출석인정"
-
-            # 질병, 미인정도 마찬가지로 처리
-            if extracted_data.attendance_type in ["질병", "미인정"]:
-                logger.warning(f"AI가 attendance_type으로 '{extracted_data.attendance_type}'을 반환했습니다. '결석'으로 자동 수정합니다.")
-                # attendance_reason으로 이동
-                if not extracted_data.attendance_reason:
-                    extracted_data.attendance_reason = extracted_data.attendance_type
-                extracted_data.attendance_type = "결석"
-
-            # 출결 타입 매핑
-            attendance_type_map = {
-                "결석": AttendanceType.ABSENT,
-                "조퇴": AttendanceType.EARLY_LEAVE,
-                "지각": AttendanceType.LATE
-            }
+            # intent == "create"인 경우: 모든 학생의 출결/서류 기록을 한 트랜잭션으로 생성
+
+            planned = [
+                (student, record, self._build_attendance_rows(student, record, message_text))
+                for student, record in targets
+                if record.intent == "create"
+            ]
+            saved, existing = await self._insert_attendance_records(db, [row for _, _, rows in planned for row in rows])
+            by_student = {}
+            for attendance_record in sorted(saved, key=lambda r: (r.date, r.id)):
+                by_student.setdefault(attendance_record.student_id, []).append(attendance_record)
+            created = []
+            for student, record, rows in planned:
+                student_records = by_student.get(student.id, [])
+                if student_records[:len(rows)]:
+                    created.append((student, record, student_records[:len(rows)]))
+                del student_records[:len(rows)]
+            await db.commit()
+            # 접수가 끝난 대화는 맥락을 비움 (다음 메시지에서 이전 학생이 다시 추출되지 않도록)
+            await self.conversation.clear(telegram_user_id)
+
+            # 저장된 기록이 있을 때만 접수 완료, 이미 있던 기록은 상태 안내
+            replies = []
+            if created:
+                replies.append(self._format_success_message(created))
+            if existing:
+                names = {student.id: student.name for student, _ in targets}
+                replies.append(self._format_existing_message(existing, names))
+            await update.message.reply_text("\n\n".join(replies))
+
+            for student, _, records in created:
+                logger.info(f"Attendance records created: {len(records)} records for student={student.name}")
 
-            # 출결 사유 매핑
-            attendance_reason_map = {
-                "질병": AttendanceReason.ILLNESS,
-                "미인정": AttendanceReason.UNAUTHORIZED,
-                "출석인정": AttendanceReason.AUTHORIZED
-            }
+        except Exception as e:
+            logger.error(f"Error processing message: {e}", exc_info=True)
+            await self._save_unlinked_llm_calls(db, llm_calls)
+            await update.message.reply_text(
+                "죄송합니다. 메시지 처리 중 오류가 발생했습니다.\n"
+                "잠시 후 다시 시도해주세요."
+            )
+        finally:
+            await db.close()
+
+    async def _find_student(self, db: AsyncSession, student_name: str, telegram_user_id: str, use_parent_fallback: bool = True):
+        """추출된 이름으로 학생 찾기 (이름이 없거나 못 찾으면 학부모로 등록된 학생)"""
+        student = None
+
+        # 1. 메시지에서 학생 이름이 추출된 경우 (전체 이름/이름만/길동이·민수야/오타 한 개)
+        if student_name:
+            candidates = await db.run_sync(self.student_index.lookup, student_name, telegram_user_id)
+            if candidates:
+                best = candidates[0]
+                ambiguous = len(candidates) > 1 and candidates[1].score == best.score and not best.is_parent_linked
+                if ambiguous:
+                    logger.warning(f"학생 이름 '{student_name}' 후보가 여러 명입니다: {candidates[:5]}")
+                if not (ambiguous and best.kind == "typo"):
+                    student = await db.get(Student, best.student_id)
+
+        # 2. 메시지에서 학생 이름을 찾을 수 없는 경우, telegram_user_id로 학부모 찾기
+        if not student and use_parent_fallback:
+            # 가장 최근에 등록된 활성화된 학부모를 찾음 (created_at 최신순)
+            parent = (await self.parents.resolve(db, telegram_user_id)).latest_active
+
+            if parent:
+                student = await db.get(Student, parent.student_id)
+                logger.info(f"📌 telegram_user_id로 학생 찾음: telegram_id={telegram_user_id}, student={student.name if student else None}")
+
+        return student
+
+    def _build_attendance_rows(self, student: Student, extracted_data, message_text: str) -> list:
+        """
+        학생 1명의 출결 기록 값 목록 (기간이면 날짜별, DB에는 쓰지 않음)
+
+        저장은 _insert_attendance_records가 모든 학생의 기록을 모아 한 번에 합니다.
+        """
+        # AI가 잘못 반환한 경우 자동 수정
+        # "출석인정"을 attendance_type으로 반환한 경우 → 결석 + 출석인정으로 변환
+        if extracted_data.attendance_type == "출석인정":
+            logger.warning(f"AI가 attendance_type으로 '출석인정'을 반환했습니다. '결석'으로 자동 수정합니다.")
+            extracted_data.attendance_type = "결석"
+            if not extracted_data.attendance_reason:
+                extracted_data.attendance_reason = "출석인정"
 
-            # 날짜 범위 처리
-            from datetime import timedelta
-            start_date = datetime.fromisoformat(extracted_data.date)
-            dates_to_process = [start_date]
-
-            # end_date가 있으면 범위 내 모든 날짜 생성
-            if extracted_data.end_date:
-                end_date = datetime.fromisoformat(extracted_data.end_date)
-                current_date = start_date
-                while current_date <= end_date:
-                    if current_date != start_date:  # 시작일은 이미 추가됨
-                        dates_to_process.append(current_date)
-                    current_date += timedelta(days=1)
-
-            # 각 날짜에 대해 출결 기록 생성
-            created_records = []
-            for record_date in dates_to_process:
-                attendance_record = AttendanceRecord(
-                    student_id=student.id,
-                    date=record_date,
-                    attendance_type=attendance_type_map[extracted_data.attendance_type],
-                    attendance_reason=attendance_reason_map[extracted_data.attendance_reason],
-                    approval_status=ApprovalStatus.PENDING,
-                    original_message=message_text,
-                    extraction_log=json.dumps(extracted_data.model_dump(), ensure_ascii=False)
-                )
+        # 질병, 미인정도 마찬가지로 처리
+        if extracted_data.attendance_type in ["질병", "미인정"]:
+            logger.warning(f"AI가 attendance_type으로 '{extracted_data.attendance_type}'을 반환했습니다. '결석'으로 자동 수정합니다.")
+            # attendance_reason으로 이동
+            if not extracted_data.attendance_reason:
+                extracted_data.attendance_reason = extracted_data.attendance_type
+            extracted_data.attendance_type = "결석"
 
-                db.add(attendance_record)
-                db.commit()
-                db.refresh(attendance_record)
-                created_records.append(attendance_record)
-
-                # 서류 제출이 필요한 경우 자동으로 서류 제출 기록 생성
-                # 질병 결석, 출석인정 결석의 경우만 서류 필요 (지각, 조퇴는 제외)
-                if (attendance_record.attendance_type == AttendanceType.ABSENT and
-                    attendance_record.attendance_reason in [AttendanceReason.ILLNESS, AttendanceReason.AUTHORIZED]):
-                    from ..models import DocumentSubmission
-
-                    # 서류 타입 결정
-                    document_type = None
-                    if attendance_record.attendance_reason == AttendanceReason.ILLNESS:
-                        document_type = "병원 진단서/소견서"
-                    elif attendance_record.attendance_reason == AttendanceReason.AUTHORIZED:
-                        document_type = "출석인정 관련 서류"
-
-                    # 서류 제출 기록 생성
-                    doc_submission = DocumentSubmission(
-                        student_id=student.id,
-                        attendance_record_id=attendance_record.id,
-                        date=attendance_record.date,
-                        is_submitted=False,
-                        document_type=document_type
-                    )
-                    db.add(doc_submission)
-                    db.commit()
-                    logger.info(f"📄 서류 제출 기록 생성: student={student.name}, date={record_date.date()}, type={document_type}")
+        # 출결 타입 매핑
+        attendance_type_map = {
+            "결석": AttendanceType.ABSENT,
+            "조퇴": AttendanceType.EARLY_LEAVE,
+            "지각": AttendanceType.LATE
+        }
+
+        # 출결 사유 매핑
+        attendance_reason_map = {
+            "질병": AttendanceReason.ILLNESS,
+            "미인정": AttendanceReason.UNAUTHORIZED,
+            "출석인정": AttendanceReason.AUTHORIZED
+        }
 
-            # 성공 메시지 전송
-            if len(dates_to_process) > 1:
+        # 날짜 범위 처리
+        start_date = datetime.fromisoformat(extracted_data.date)
+        dates_to_process = [start_date]
+
+        # end_date가 있으면 범위 내 모든 날짜 생성
+        if extracted_data.end_date:
+            end_date = datetime.fromisoformat(extracted_data.end_date)
+            current_date = start_date
+            while current_date <= end_date:
+                if current_date != start_date:  # 시작일은 이미 추가됨
+                    dates_to_process.append(current_date)
+                current_date += timedelta(days=1)
+
+        extraction_log = json.dumps(extracted_data.model_dump(), ensure_ascii=False)
+        return [
+            {
+                "student_id": student.id,
+                "date": record_date,
+                "attendance_type": attendance_type_map[extracted_data.attendance_type],
+                "attendance_reason": attendance_reason_map[extracted_data.attendance_reason],
+                "approval_status": ApprovalStatus.PENDING,
+                "original_message": message_text,
+                "extraction_log": extraction_log,
+            }
+            for record_date in dates_to_process
+        ]
+
+    async def _insert_attendance_records(self, db: AsyncSession, rows: list) -> tuple:
+        """
+        출결 기록과 필요한 서류 제출 기록을 기간 길이와 관계없이 INSERT 두 번으로 저장
+
+        출결 기록은 INSERT ... ON CONFLICT DO UPDATE ... RETURNING으로 id를 받아 서류 기록에 연결합니다.
+        같은 학생/날짜/출결 타입 기록이 이미 있을 때:
+        - 거부/수정됨 상태면 새 사유와 메시지로 바꾸고 다시 승인 대기로 (재접수)
+        - 대기/승인 상태면 그대로 두고 existing으로 반환 (재전송된 메시지 등)
+        반환 순서는 보장하지 않으므로(SQLite는 순서를 지키려면 행마다 INSERT) 호출자가 학생/날짜로 맞춥니다.
+        커밋하지 않으므로 호출자가 한 트랜잭션으로 커밋합니다 (중간에 실패하면 아무것도 남지 않음).
+
+        Returns:
+            (저장된 출결 기록 목록, 이미 있어 저장하지 않은 출결 기록 목록)
+        """
+        # 한 메시지 안의 중복 행은 하나로 (ON CONFLICT는 같은 문장 안의 중복을 처리하지 못함)
+        unique_rows = {}
+        for row in rows:
+            unique_rows.setdefault((row["student_id"], row["date"], row["attendance_type"]), row)
+        if not unique_rows:
+            return [], []
+
+        insert = dialect_insert(db.bind.dialect.name)
+        statement = insert(AttendanceRecord).values(list(unique_rows.values()))
+        statement = statement.on_conflict_do_update(
+            index_elements=["student_id", "date", "attendance_type"],
+            set_={
+                "attendance_reason": statement.excluded.attendance_reason,
+                "approval_status": ApprovalStatus.PENDING,
+                "original_message": statement.excluded.original_message,
+                "extraction_log": statement.excluded.extraction_log,
+                "updated_at": datetime.utcnow(),
+            },
+            where=AttendanceRecord.approval_status.in_([ApprovalStatus.REJECTED, ApprovalStatus.MODIFIED]),
+        ).returning(AttendanceRecord)
+        records = (await db.scalars(statement, execution_options={"populate_existing": True})).all()
+
+        saved_keys = {(record.student_id, record.date, record.attendance_type) for record in records}
+        missing = [key for key in unique_rows if key not in saved_keys]
+        existing = []
+        if missing:
+            existing = (await db.scalars(
+                select(AttendanceRecord).where(or_(*(
+                    and_(
+                        AttendanceRecord.student_id == student_id,
+                        AttendanceRecord.date == record_date,
+                        AttendanceRecord.attendance_type == attendance_type,
+                    )
+                    for student_id, record_date, attendance_type in missing
+                )))
+            )).all()
+            logger.info(f"이미 있는 출결 기록 {len(existing)}건은 저장하지 않음: student_id={sorted({k[0] for k in missing})}")
+
+        # 서류 제출이 필요한 경우 자동으로 서류 제출 기록 생성
+        # 질병 결석, 출석인정 결석의 경우만 서류 필요 (지각, 조퇴는 제외)
+        document_types = {
+            AttendanceReason.ILLNESS: "병원 진단서/소견서",
+            AttendanceReason.AUTHORIZED: "출석인정 관련 서류",
+        }
+        needs_document = [
+            record for record in records
+            if record.attendance_type == AttendanceType.ABSENT and record.attendance_reason in document_types
+        ]
+        if needs_document:
+            # 재접수된 기록은 예전 서류 기록이 남아 있을 수 있음
+            has_document = set((await db.scalars(
+                select(DocumentSubmission.attendance_record_id)
+                .where(DocumentSubmission.attendance_record_id.in_([record.id for record in needs_document]))
+            )).all())
+            documents = [
+                {
+                    "student_id": record.student_id,
+                    "attendance_record_id": record.id,
+                    "date": record.date,
+                    "is_submitted": False,
+                    "document_type": document_types[record.attendance_reason],
+                }
+                for record in needs_document
+                if record.id not in has_document
+            ]
+            if documents:
+                await db.execute(insert(DocumentSubmission), documents)
+                logger.info(f"📄 서류 제출 기록 {len(documents)}건 생성: student_id={sorted({d['student_id'] for d in documents})}")
+
+        return records, existing
+
+    @staticmethod
+    def _format_success_message(created: list) -> str:
+        """접수 완료 메시지 (created: [(학생, 추출 데이터, 생성된 출결 기록 목록)])"""
+        lines = ["✅ 출결 정보가 접수되었습니다!\n"]
+        for student, extracted_data, records in created:
+            if len(records) > 1:
                 # 기간인 경우
-                success_message = (
-                    f"✅ 출결 정보가 접수되었습니다!\n\n"
-                    f"👤 학생: {student.name}\n"
-                    f"📅 기간: {extracted_data.date} ~ {extracted_data.end_date} ({len(dates_to_process)}일)\n"
-                    f"📝 출결 타입: {extracted_data.attendance_type}\n"
-                    f"📋 사유: {extracted_data.attendance_reason}\n\n"
-                    f"교사 승인 대기 중입니다."
-                )
+                period = f"📅 기간: {extracted_data.date} ~ {extracted_data.end_date} ({len(records)}일)"
             else:
                 # 단일 날짜인 경우
-                success_message = (
-                    f"✅ 출결 정보가 접수되었습니다!\n\n"
-                    f"👤 학생: {student.name}\n"
-                    f"📅 날짜: {extracted_data.date}\n"
-                    f"📝 출결 타입: {extracted_data.attendance_type}\n"
-                    f"📋 사유: {extracted_data.attendance_reason}\n\n"
-                    f"교사 승인 대기 중입니다."
-                )
-
-            # 서류 제출이 필요한 경우 안내 추가 (결석만)
-            if any(r.attendance_type == AttendanceType.ABSENT and
-                   r.attendance_reason in [AttendanceReason.ILLNESS, AttendanceReason.AUTHORIZED]
-                   for r in created_records):
-                doc_count = sum(1 for r in created_records
-                               if r.attendance_type == AttendanceType.ABSENT and
-                               r.attendance_reason in [AttendanceReason.ILLNESS, AttendanceReason.AUTHORIZED])
-                success_message += f"\n\n📎 서류 제출이 필요합니다! (총 {doc_count}건)\n서류 사진을 촬영하여 이 대화에 전송해주세요."
-
-            await update.message.reply_text(success_message)
+                period = f"📅 날짜: {extracted_data.date}"
+            lines.append(
+                f"👤 학생: {student.name}\n"
+                f"{period}\n"
+                f"📝 출결 타입: {extracted_data.attendance_type}\n"
+                f"📋 사유: {extracted_data.attendance_reason}\n"
+            )
+        success_message = "\n".join(lines) + "\n교사 승인 대기 중입니다."
 
-            logger.info(f"Attendance records created: {len(created_records)} records for student={student.name}")
+        # 서류 제출이 필요한 경우 안내 추가 (결석만)
+        doc_count = sum(
+            1 for _, _, records in created for r in records
+            if r.attendance_type == AttendanceType.ABSENT and
+            r.attendance_reason in [AttendanceReason.ILLNESS, AttendanceReason.AUTHORIZED]
+        )
+        if doc_count:
+            success_message += f"\n\n📎 서류 제출이 필요합니다! (총 {doc_count}건)\n서류 사진을 촬영하여 이 대화에 전송해주세요."
+        return success_message
+
+    @staticmethod
+    def _format_existing_message(existing: list, names: dict) -> str:
+        """이미 접수되어 새로 저장하지 않은 출결 기록 안내 (names: 학생 id → 이름)"""
+        lines = ["ℹ️ 이미 접수된 출결 기록이 있어 새로 저장하지 않았습니다.\n"]
+        for record in sorted(existing, key=lambda r: (r.student_id, r.date)):
+            lines.append(
+                f"👤 {names.get(record.student_id, '학생')} · {record.date.strftime('%Y-%m-%d')} · "
+                f"{record.attendance_type.value}({record.attendance_reason.value}) · 상태: {record.approval_status.value}"
+            )
+        return "\n".join(lines) + "\n\n변경이 필요하면 '수정' 또는 '취소' 메시지를 보내주세요."
 
+    async def _save_unlinked_llm_calls(self, db: AsyncSession, llm_calls: list):
+        """메시지 로그 저장 전에 실패한 경우에도 Claude 호출 기록은 남김"""
+        if not llm_calls:
+            return
+        try:
+            await db.rollback()
+            save_llm_calls(db, llm_calls, None)
+            await db.commit()
         except Exception as e:
-            logger.error(f"Error processing message: {e}", exc_info=True)
-            await update.message.reply_text(
-                "죄송합니다. 메시지 처리 중 오류가 발생했습니다.\n"
-                "잠시 후 다시 시도해주세요."
-            )
-        finally:
-            db.close()
+            logger.error(f"Failed to save LLM call telemetry: {e}")
 
-    def _register_parent_if_new(self, db: Session, student_id: int, telegram_user_id: str):
+    async def _register_parent_if_new(self, db: AsyncSession, student_id: int, telegram_user_id: str):
         """학부모 자동 등록 (이미 등록되어 있으면 스킵)"""
         try:
+            links = await self.parents.resolve(db, telegram_user_id)
+
             # 이 telegram_id가 이미 다른 학생에게 등록되어 있는지 확인
-            existing_parent_any = db.query(StudentParent).filter(
-                StudentParent.telegram_id == telegram_user_id,
-                StudentParent.is_active == True
-            ).first()
+            existing_parent_any = links.latest_active
 
             # 이미 등록된 학부모인지 확인
-            existing_parent = db.query(StudentParent).filter(
-                StudentParent.student_id == student_id,
-                StudentParent.telegram_id == telegram_user_id
-            ).first()
+            existing_parent = links.for_student(student_id)
 
             if existing_parent:
                 # 이미 이 학생에게 등록됨
@@ -477,20 +622,22 @@ class AttendanceTelegramBot:
                     is_active=True
                 )
                 db.add(new_parent)
-                db.commit()
+                await db.execute(parent_change_statement(db.bind.dialect.name, [telegram_user_id]))
+                await db.commit()
+                self.parents.invalidate(telegram_user_id)
                 logger.info(f"✅ 새 학부모 자동 등록: student_id={student_id}, telegram_id={telegram_user_id}")
 
         except Exception as e:
             logger.error(f"학부모 등록 중 오류: {e}")
             # 오류가 나도 출결 처리는 계속 진행
 
-    async def _handle_cancel(self, db: Session, student: Student, message_text: str, update):
+    async def _handle_cancel(self, db: AsyncSession, student: Student, message_text: str, update):
         """출결 기록 취소 처리"""
         # 가장 최근 출결 기록 찾기 (PENDING 상태만)
-        recent_record = db.query(AttendanceRecord).filter(
+        recent_record = (await db.execute(select(AttendanceRecord).where(
             AttendanceRecord.student_id == student.id,
             AttendanceRecord.approval_status == ApprovalStatus.PENDING
-        ).order_by(AttendanceRecord.created_at.desc()).first()
+        ).order_by(AttendanceRecord.created_at.desc()).limit(1))).scalars().first()
 
         if not recent_record:
             await update.message.reply_text(
@@ -500,19 +647,18 @@ class AttendanceTelegramBot:
             return
 
         # 연관된 서류 제출 기록도 삭제
-        from ..models import DocumentSubmission
-        related_docs = db.query(DocumentSubmission).filter(
+        related_docs = (await db.execute(select(DocumentSubmission).where(
             DocumentSubmission.attendance_record_id == recent_record.id
-        ).all()
+        ))).scalars().all()
 
         for doc in related_docs:
-            db.delete(doc)
+            await db.delete(doc)
 
         # 출결 기록 삭제
         record_date = recent_record.date.strftime('%Y-%m-%d')
         record_type = recent_record.attendance_type.value
-        db.delete(recent_record)
-        db.commit()
+        await db.delete(recent_record)
+        await db.commit()
 
         await update.message.reply_text(
             f"✅ 출결 기록이 취소되었습니다!\n\n"
@@ -523,13 +669,13 @@ class AttendanceTelegramBot:
         )
         logger.info(f"출결 기록 취소됨: student={student.name}, date={record_date}")
 
-    async def _handle_update(self, db: Session, student: Student, extracted_data, message_text: str, update):
+    async def _handle_update(self, db: AsyncSession, student: Student, extracted_data, message_text: str, update):
         """출결 기록 수정 처리"""
         # 가장 최근 출결 기록 찾기 (PENDING 상태만)
-        recent_record = db.query(AttendanceRecord).filter(
+        recent_record = (await db.execute(select(AttendanceRecord).where(
             AttendanceRecord.student_id == student.id,
             AttendanceRecord.approval_status == ApprovalStatus.PENDING
-        ).order_by(AttendanceRecord.created_at.desc()).first()
+        ).order_by(AttendanceRecord.created_at.desc()).limit(1))).scalars().first()
 
         if not recent_record:
             await update.message.reply_text(
@@ -592,7 +738,15 @@ class AttendanceTelegramBot:
 
         # 수정 로그 저장
         recent_record.original_message = f"{recent_record.original_message}\n[수정: {message_text}]"
-        db.commit()
+        try:
+            await db.commit()
+        except IntegrityError:
+            await db.rollback()
+            await update.message.reply_text(
+                f"❌ {student.name} 학생의 같은 날짜/출결 타입 기록이 이미 있어 수정할 수 없습니다.\n"
+                "선생님께 문의해주세요."
+            )
+            return
 
         await update.message.reply_text(
             f"✅ 출결 기록이 수정되었습니다!\n\n"
@@ -603,19 +757,44 @@ class AttendanceTelegramBot:
         logger.info(f"출결 기록 수정됨: student={student.name}, modifications={modified_fields}")
 
     async def send_reminder(self, student_telegram_id: str, message: str):
-        """독려 메시지 발송"""
-        try:
-            await self.application.bot.send_message(
-                chat_id=student_telegram_id,
-                text=message
-            )
-            logger.info(f"Reminder sent to {student_telegram_id}")
-            return True
-        except Exception as e:
-            logger.error(f"Failed to send reminder to {student_telegram_id}: {e}")
+        """독려 메시지 발송 (발송 대기열 사용, 시간 안에 못 보내도 계속 시도하므로 실패만 False)"""
+        status = await get_outbound_dispatcher().send(student_telegram_id, message, purpose="reminder")
+        if status == "failed":
+            logger.error(f"Failed to send reminder to {student_telegram_id}")
             return False
+        logger.info(f"Reminder {status} to {student_telegram_id}")
+        return True
 
     def run(self):
-        """봇 실행"""
+        """봇 실행 (long polling, 별도 프로세스)"""
         logger.info("Starting Telegram bot...")
         self.application.run_polling(allowed_updates=Update.ALL_TYPES)
+
+    async def start_webhook(self, webhook_url: str, secret_token: str):
+        """
+        웹훅 모드 시작 (API 서버 프로세스 안에서 실행)
+
+        Application을 시작해 update_queue를 처리하게 하고 텔레그램에 웹훅 주소를 등록합니다.
+        업데이트는 process_webhook_update로 넣습니다.
+        """
+        await self.application.initialize()
+        await self.application.start()
+        await self.application.bot.set_webhook(
+            url=webhook_url,
+            secret_token=secret_token,
+            allowed_updates=Update.ALL_TYPES,
+        )
+        logger.info(f"Telegram webhook registered: {webhook_url}")
+
+    async def stop_webhook(self):
+        """웹훅 모드 종료 (웹훅 등록은 남겨 재시작/배포 중 온 업데이트를 텔레그램이 다시 보내도록 함)"""
+        await self.application.stop()
+        await self.application.shutdown()
+        await self.conversation.close()
+        await self.documents.close()
+        logger.info("Telegram bot stopped")
+
+    async def process_webhook_update(self, data: dict):
+        """웹훅으로 받은 업데이트를 처리 대기열에 추가 (처리는 기다리지 않음)"""
+        update = Update.de_json(data, self.application.bot)
+        await self.application.update_queue.put(update)
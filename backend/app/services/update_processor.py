@@ -0,0 +1,158 @@
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+from .llm_telemetry import percentile
+
+logger = logging.getLogger(__name__)
+
+
+class _ChatLock:
+    """학부모 한 명의 순서 보장용 잠금 (대기자가 없으면 삭제)"""
+    __slots__ = ("lock", "owner", "users")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.owner = None
+        self.users = 0
+
+
+class PerChatUpdateProcessor(BaseUpdateProcessor):
+    """
+    학부모(telegram_user_id)별 순서를 지키면서 서로 다른 학부모의 업데이트는 동시에 처리
+
+    같은 학부모의 업데이트와 합쳐진 메시지 처리(run_in_chat)는 도착 순서대로 하나씩 실행되므로
+    대화 맥락(conversation store)이 섞이지 않습니다. 동시에 실행되는 작업 수는 max_running으로 제한하고,
+    순서를 기다리는 업데이트는 슬롯을 차지하지 않습니다 (한 학부모의 연속 메시지가 다른 학부모를 막지 않음).
+    BaseUpdateProcessor의 max_concurrent_updates는 대기 중인 업데이트를 포함한 접수 한도입니다.
+    """
+
+    def __init__(self, max_running: int = None, max_pending: int = None, latency_window: int = 1000, log_every: int = None):
+        if max_running is None:
+            max_running = int(os.getenv("BOT_MAX_CONCURRENT_UPDATES", "16"))
+        if max_pending is None:
+            max_pending = int(os.getenv("BOT_MAX_PENDING_UPDATES", "256"))
+        if log_every is None:
+            log_every = int(os.getenv("BOT_STATS_LOG_EVERY", "100"))
+        super().__init__(max(max_pending, max_running))
+        self.max_running = max_running
+        self.log_every = log_every
+        self._running = asyncio.Semaphore(max_running)
+        self._chats = {}  # 채팅 키 → _ChatLock
+
+        self.waiting = 0
+        self.in_flight = 0
+        self.processed = 0
+        self.failed = 0
+        self.max_queue_depth = 0
+        self._latencies = deque(maxlen=latency_window)  # 대기 + 처리 시간 (ms)
+        self._run_times = deque(maxlen=latency_window)  # 처리 시간만 (ms)
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        if self.in_flight or self.waiting:
+            logger.info(f"업데이트 처리기 종료: 처리 중 {self.in_flight}건, 대기 {self.waiting}건")
+
+    @staticmethod
+    def chat_key(update: object) -> str:
+        """순서를 보장할 단위 (학부모 telegram_user_id, 없으면 채팅 id)"""
+        if isinstance(update, Update):
+            if update.effective_user:
+                return str(update.effective_user.id)
+            if update.effective_chat:
+                return f"chat:{update.effective_chat.id}"
+        return "global"
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        await self.run_in_chat(self.chat_key(update), coroutine)
+
+    @asynccontextmanager
+    async def _hold_chat(self, key: str):
+        """학부모별 잠금 (같은 작업 안에서 다시 잡으면 그대로 통과)"""
+        entry = self._chats.get(key)
+        current = asyncio.current_task()
+        if entry is not None and entry.owner is current:
+            yield False
+            return
+
+        if entry is None:
+            entry = self._chats[key] = _ChatLock()
+        entry.users += 1
+        try:
+            async with entry.lock:
+                entry.owner = current
+                try:
+                    yield True
+                finally:
+                    entry.owner = None
+        finally:
+            entry.users -= 1
+            if entry.users == 0:
+                del self._chats[key]
+
+    async def run_in_chat(self, key: str, coroutine: Awaitable[Any]):
+        """
+        학부모 순서와 전체 동시 실행 한도를 지켜 코루틴 실행
+
+        이미 같은 학부모의 잠금을 가진 작업 안에서 호출하면 (디바운스 없이 바로 처리하는 경우)
+        기다리지 않고 바로 실행합니다.
+        """
+        started = time.monotonic()
+        self.waiting += 1
+        self.max_queue_depth = max(self.max_queue_depth, self.waiting)
+        queued = True
+        try:
+            async with self._hold_chat(key) as acquired:
+                if not acquired:
+                    self.waiting -= 1
+                    queued = False
+                    return await coroutine
+                async with self._running:
+                    self.waiting -= 1
+                    queued = False
+                    self.in_flight += 1
+                    run_started = time.monotonic()
+                    try:
+                        return await coroutine
+                    except Exception:
+                        self.failed += 1
+                        raise
+                    finally:
+                        self.in_flight -= 1
+                        self.processed += 1
+                        finished = time.monotonic()
+                        self._run_times.append((finished - run_started) * 1000)
+                        self._latencies.append((finished - started) * 1000)
+                        if self.log_every and self.processed % self.log_every == 0:
+                            logger.info(f"업데이트 처리 통계: {self.get_stats()}")
+        finally:
+            if queued:
+                # 대기 중 취소된 경우 (합쳐진 메시지가 새 조각으로 대체됨 등)
+                self.waiting -= 1
+                if asyncio.iscoroutine(coroutine):
+                    coroutine.close()
+
+    def get_stats(self) -> dict:
+        """대기열 깊이와 업데이트별 지연시간 (최근 latency_window건)"""
+        latencies = sorted(self._latencies)
+        run_times = sorted(self._run_times)
+        return {
+            "max_running": self.max_running,
+            "in_flight": self.in_flight,
+            "queue_depth": self.waiting,
+            "max_queue_depth": self.max_queue_depth,
+            "active_chats": len(self._chats),
+            "processed": self.processed,
+            "failed": self.failed,
+            "latency_ms_p50": percentile(latencies, 50),
+            "latency_ms_p95": percentile(latencies, 95),
+            "run_ms_p50": percentile(run_times, 50),
+            "run_ms_p95": percentile(run_times, 95),
+        }
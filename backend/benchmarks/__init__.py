@@ -0,0 +1 @@
+# Parser benchmark package
@@ -0,0 +1,144 @@
+"""녹화된 응답을 재생하는 가짜 Anthropic 클라이언트 (API 키 없이 파서 측정용)"""
+
+import json
+import random
+import asyncio
+from typing import Callable, Optional
+import httpx
+import anthropic
+from anthropic.types import Message
+
+
+class FakeMessages:
+    """AsyncAnthropic.messages 대체 (create만 지원)"""
+
+    def __init__(self, client: "FakeAnthropicClient"):
+        self._client = client
+
+    async def create(self, **kwargs) -> Message:
+        return await self._client.create(**kwargs)
+
+
+class FakeAnthropicClient:
+    """
+    프롬프트별로 녹화된 record_attendance 도구 입력을 돌려주는 클라이언트
+
+    Args:
+        lookup: (user_prompt, model) → 도구 입력 dict (없으면 None)
+        latency_ms: 응답 지연 중앙값 (밀리초)
+        latency_sigma: 지연 분포(로그정규)의 퍼짐 정도, 0이면 고정 지연
+        overload_rate: 529 overloaded 에러를 낼 확률
+        malformed_rate: 도구 호출 대신 깨진 JSON 텍스트를 돌려줄 확률
+        seed: 난수 시드 (같은 시드면 같은 에러/지연 순서)
+    """
+
+    def __init__(
+        self,
+        lookup: Callable[[str, str], Optional[dict]],
+        latency_ms: float = 800,
+        latency_sigma: float = 0.35,
+        overload_rate: float = 0.0,
+        malformed_rate: float = 0.0,
+        seed: int = 42,
+    ):
+        self.lookup = lookup
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.overload_rate = overload_rate
+        self.malformed_rate = malformed_rate
+        self.rng = random.Random(seed)
+        self.messages = FakeMessages(self)
+
+        self.requests = 0
+        self.injected_overloads = 0
+        self.injected_malformed = 0
+        self.unmatched = 0
+        self._cached_system = set()
+
+    def _delay(self) -> float:
+        if self.latency_sigma <= 0:
+            return self.latency_ms / 1000
+        return self.latency_ms * self.rng.lognormvariate(0, self.latency_sigma) / 1000
+
+    async def create(self, model: str, system=None, messages=None, **kwargs) -> Message:
+        self.requests += 1
+        await asyncio.sleep(self._delay())
+
+        if self.rng.random() < self.overload_rate:
+            self.injected_overloads += 1
+            request = httpx.Request("POST", "https://api.anthropic.com/v1/messages")
+            response = httpx.Response(529, headers={"retry-after": "0"}, request=request)
+            raise anthropic.InternalServerError(
+                "Overloaded",
+                response=response,
+                body={"type": "error", "error": {"type": "overloaded_error", "message": "Overloaded"}}
+            )
+
+        prompt = messages[-1]["content"]
+        system_text = "".join(block["text"] for block in system) if isinstance(system, list) else (system or "")
+        usage = self._usage(model, system_text, prompt)
+
+        if self.rng.random() < self.malformed_rate:
+            self.injected_malformed += 1
+            return self._message(model, [{"type": "text", "text": '{"intent": "create", "student_na'}], "end_turn", usage)
+
+        tool_input = self.lookup(prompt, model)
+        if tool_input is None:
+            self.unmatched += 1
+            raise LookupError(f"녹화된 응답 없음: {prompt[-80:]!r}")
+
+        usage["output_tokens"] = len(json.dumps(tool_input, ensure_ascii=False)) // 2
+        content = [{"type": "tool_use", "id": f"toolu_fake_{self.requests}", "name": "record_attendance", "input": tool_input}]
+        return self._message(model, content, "tool_use", usage)
+
+    def _usage(self, model: str, system_text: str, prompt: str) -> dict:
+        """대략적인 토큰 수 (한국어 약 2자당 1토큰), 같은 모델의 두 번째 호출부터 시스템 프롬프트는 캐시 적중"""
+        system_tokens = len(system_text) // 2
+        usage = {"input_tokens": len(prompt) // 2, "output_tokens": 0}
+        if model in self._cached_system:
+            usage["cache_read_input_tokens"] = system_tokens
+        else:
+            self._cached_system.add(model)
+            usage["cache_creation_input_tokens"] = system_tokens
+        return usage
+
+    def _message(self, model: str, content: list, stop_reason: str, usage: dict) -> Message:
+        return Message.model_validate({
+            "id": f"msg_fake_{self.requests}",
+            "type": "message",
+            "role": "assistant",
+            "model": model,
+            "content": content,
+            "stop_reason": stop_reason,
+            "stop_sequence": None,
+            "usage": usage,
+        })
+
+    def get_stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "injected_overloads": self.injected_overloads,
+            "injected_malformed": self.injected_malformed,
+            "unmatched": self.unmatched,
+        }
+
+
+class RecordingClient:
+    """
+    실제 AsyncAnthropic 호출을 통과시키며 도구 입력을 녹화하는 래퍼
+
+    recordings: user_prompt → {model: 도구 입력}
+    """
+
+    def __init__(self, client):
+        self._client = client
+        self.recordings = {}
+        self.messages = self
+
+    async def create(self, **kwargs) -> Message:
+        response = await self._client.messages.create(**kwargs)
+        prompt = kwargs["messages"][-1]["content"]
+        for block in response.content:
+            if block.type == "tool_use" and block.name == "record_attendance":
+                self.recordings.setdefault(prompt, {})[kwargs["model"]] = dict(block.input)
+        return response
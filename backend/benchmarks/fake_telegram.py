@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""로컬 가짜 텔레그램 Bot API 서버 (웹훅 모드를 실제 텔레그램 없이 확인용)
+
+봇이 호출하는 Bot API(getMe, setWebhook, sendMessage, getFile 등)에 응답하고, 보낸 메시지를
+기록합니다. /fake/updates로 학부모 메시지를 넣으면 등록된 웹훅 주소로 secret token과 함께
+업데이트를 전달합니다.
+
+사용법:
+    python benchmarks/fake_telegram.py --port 8081
+
+    # 다른 터미널: 한 프로세스로 API + 봇 실행
+    TELEGRAM_MODE=webhook TELEGRAM_WEBHOOK_URL=http://localhost:8000 \\
+    TELEGRAM_API_BASE_URL=http://localhost:8081 uvicorn app.main:app --port 8000
+
+    curl -X POST localhost:8081/fake/updates -H 'Content-Type: application/json' \\
+         -d '{"user_id": 1001, "text": "홍길동 오늘 아파서 결석합니다"}'
+    curl localhost:8081/fake/sent
+
+    # 발송 한도 초과(429)/차단된 학부모(403) 흉내
+    curl -X POST localhost:8081/fake/flood -H 'Content-Type: application/json' -d '{"count": 3, "retry_after": 2}'
+    curl -X POST localhost:8081/fake/blocked -H 'Content-Type: application/json' -d '{"chat_id": 1002}'
+"""
+
+import json
+import time
+import argparse
+import httpx
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse
+
+BOT_USER = {
+    "id": 100000001,
+    "is_bot": True,
+    "first_name": "출결봇",
+    "username": "fake_attendance_bot",
+    "can_join_groups": False,
+    "can_read_all_group_messages": False,
+    "supports_inline_queries": False,
+}
+
+
+def _parse_value(value: str):
+    """폼 값은 숫자/목록/객체가 JSON 문자열로 옴"""
+    try:
+        return json.loads(value)
+    except (json.JSONDecodeError, TypeError):
+        return value
+
+
+def create_fake_telegram_app() -> FastAPI:
+    app = FastAPI(title="Fake Telegram Bot API")
+    app.state.webhook = {"url": None, "secret_token": None}
+    app.state.sent = []
+    app.state.files = {}
+    app.state.next_update_id = 1
+    app.state.next_message_id = 1
+    app.state.flood = {"count": 0, "retry_after": 1}  # 다음 sendMessage 몇 건에 429 응답
+    app.state.blocked = set()  # 봇을 차단한 chat_id (403 응답)
+    app.state.send_times = []
+
+    def next_message_id() -> int:
+        message_id = app.state.next_message_id
+        app.state.next_message_id += 1
+        return message_id
+
+    @app.post("/bot{token}/{method}")
+    async def bot_api(token: str, method: str, request: Request):
+        if request.headers.get("content-type", "").startswith("application/json"):
+            params = await request.json()
+        else:
+            form = await request.form()
+            params = {key: _parse_value(value) for key, value in form.items() if isinstance(value, str)}
+
+        if method == "getMe":
+            return {"ok": True, "result": BOT_USER}
+        if method == "setWebhook":
+            app.state.webhook = {"url": params.get("url"), "secret_token": params.get("secret_token")}
+            return {"ok": True, "result": True}
+        if method == "deleteWebhook":
+            app.state.webhook = {"url": None, "secret_token": None}
+            return {"ok": True, "result": True}
+        if method == "getWebhookInfo":
+            return {"ok": True, "result": {"url": app.state.webhook["url"] or "", "has_custom_certificate": False, "pending_update_count": 0}}
+        if method == "sendMessage":
+            if app.state.flood["count"] > 0:
+                app.state.flood["count"] -= 1
+                return JSONResponse(status_code=429, content={
+                    "ok": False, "error_code": 429,
+                    "description": f"Too Many Requests: retry after {app.state.flood['retry_after']}",
+                    "parameters": {"retry_after": app.state.flood["retry_after"]},
+                })
+            if int(params["chat_id"]) in app.state.blocked:
+                return JSONResponse(status_code=403, content={
+                    "ok": False, "error_code": 403, "description": "Forbidden: bot was blocked by the user",
+                })
+            app.state.send_times.append((int(params["chat_id"]), time.monotonic()))
+            message = {
+                "message_id": next_message_id(),
+                "date": int(time.time()),
+                "chat": {"id": int(params["chat_id"]), "type": "private"},
+                "from": BOT_USER,
+                "text": params.get("text", ""),
+            }
+            app.state.sent.append(message)
+            return {"ok": True, "result": message}
+        if method == "getFile":
+            file_id = params["file_id"]
+            return {"ok": True, "result": {"file_id": file_id, "file_unique_id": file_id, "file_size": len(app.state.files.get(file_id, b"")), "file_path": f"photos/{file_id}.jpg"}}
+        return {"ok": True, "result": True}
+
+    @app.get("/file/bot{token}/photos/{file_name}")
+    async def download_file(token: str, file_name: str):
+        file_id = file_name.rsplit(".", 1)[0]
+        return Response(content=app.state.files.get(file_id, b"\xff\xd8\xff\xd9"), media_type="image/jpeg")
+
+    @app.post("/fake/updates")
+    async def push_update(request: Request):
+        """학부모 메시지(text) 또는 사진(photo: true)을 웹훅으로 전달"""
+        body = await request.json()
+        if not app.state.webhook["url"]:
+            return {"ok": False, "error": "webhook not set"}
+
+        user_id = int(body.get("user_id", 1001))
+        message = {
+            "message_id": next_message_id(),
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": body.get("first_name", "학부모")},
+        }
+        if body.get("photo"):
+            file_id = f"photo{message['message_id']}"
+            app.state.files[file_id] = body.get("content", "fake-jpeg").encode()
+            message["photo"] = [{"file_id": file_id, "file_unique_id": file_id, "width": 800, "height": 600}]
+        else:
+            message["text"] = body["text"]
+
+        update = {"update_id": app.state.next_update_id, "message": message}
+        app.state.next_update_id += 1
+
+        headers = {}
+        if app.state.webhook["secret_token"]:
+            headers["X-Telegram-Bot-Api-Secret-Token"] = body.get("secret_token", app.state.webhook["secret_token"])
+        async with httpx.AsyncClient() as client:
+            response = await client.post(app.state.webhook["url"], json=update, headers=headers)
+        return {"ok": response.status_code == 200, "status_code": response.status_code, "update_id": update["update_id"]}
+
+    @app.get("/fake/sent")
+    async def sent_messages(chat_id: int = None):
+        """봇이 보낸 메시지 목록"""
+        return [m for m in app.state.sent if chat_id is None or m["chat"]["id"] == chat_id]
+
+    @app.post("/fake/flood")
+    async def set_flood(request: Request):
+        """다음 sendMessage count건에 429 Too Many Requests (retry_after초) 응답"""
+        body = await request.json()
+        app.state.flood = {"count": int(body.get("count", 1)), "retry_after": int(body.get("retry_after", 1))}
+        return app.state.flood
+
+    @app.post("/fake/blocked")
+    async def block_chat(request: Request):
+        """봇을 차단한 학부모 흉내 (sendMessage에 403)"""
+        body = await request.json()
+        app.state.blocked.add(int(body["chat_id"]))
+        return sorted(app.state.blocked)
+
+    @app.get("/fake/webhook")
+    async def webhook_info():
+        return app.state.webhook
+
+    return app
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="가짜 텔레그램 Bot API 서버")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    args = parser.parse_args()
+    uvicorn.run(create_fake_telegram_app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""출결 메시지 파서 오프라인 벤치마크
+
+녹화된 응답을 재생하는 가짜 클라이언트로 ClaudeMessageParser 전체 경로(규칙 분류기,
+캐시, 모델 티어 승급, 날짜 해석, 검증)를 실행하고 처리량, 지연시간 분포, 토큰 수,
+필드별 정확도를 출력합니다. API 키가 필요 없습니다.
+
+사용법:
+    python benchmarks/run_parser_benchmark.py
+    python benchmarks/run_parser_benchmark.py --latency-ms 600 --overload-rate 0.1 --malformed-rate 0.05
+    python benchmarks/run_parser_benchmark.py --concurrency 8 --repeat 3 --json result.json
+
+    # 실제 API 응답 녹화 (ANTHROPIC_API_KEY 필요) 후 재생
+    python benchmarks/run_parser_benchmark.py --record recordings.json
+    python benchmarks/run_parser_benchmark.py --recordings recordings.json
+
+    # 학습한 로컬 분류기 단계 포함
+    python benchmarks/run_parser_benchmark.py --local-model models/local_classifier
+
+코퍼스의 acceptance 케이스가 하나라도 틀리면 종료 코드 1로 끝납니다 (회귀 확인용).
+"""
+
+import sys
+import os
+import json
+import time
+import asyncio
+import argparse
+from datetime import date, datetime, timedelta
+
+# backend 디렉토리를 Python 경로에 추가
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from anthropic import AsyncAnthropic
+from app.services.claude_parser import ClaudeMessageParser
+from app.services.date_resolver import WEEKDAY_INDEX, describe_today
+from app.services.llm_limiter import LLMCallLimiter
+from app.services.local_classifier import LocalClassifier
+from app.services.llm_telemetry import collect_llm_calls, percentile
+from benchmarks.fake_anthropic import FakeAnthropicClient, RecordingClient
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "parser_corpus.json")
+SCORED_FIELDS = ["intent", "student_name", "date", "end_date", "attendance_type", "attendance_reason"]
+DATE_FIELDS = ("date", "end_date")
+
+
+def expand_date(notation, today: date):
+    """코퍼스의 날짜 표기 → ISO 날짜 (today, today+N, weekday:금, week+1:금, md:11-20)"""
+    if notation is None:
+        return None
+    if notation.startswith("today"):
+        offset = int(notation[5:] or 0)
+        return (today + timedelta(days=offset)).isoformat()
+    if notation.startswith("weekday:"):
+        days_ahead = (WEEKDAY_INDEX[notation[-1]] - today.weekday()) % 7
+        return (today + timedelta(days=days_ahead)).isoformat()
+    if notation.startswith("week"):
+        weeks, weekday = notation[4:].split(":")
+        monday = today - timedelta(days=today.weekday()) + timedelta(weeks=int(weeks))
+        return (monday + timedelta(days=WEEKDAY_INDEX[weekday])).isoformat()
+    if notation.startswith("md:"):
+        month, day = (int(part) for part in notation[3:].split("-"))
+        candidate = date(today.year, month, day)
+        if candidate < today - timedelta(days=180):
+            candidate = date(today.year + 1, month, day)
+        return candidate.isoformat()
+    return notation
+
+
+def load_cases(path: str, today: date) -> list:
+    """코퍼스 로드 + 날짜 표기 변환"""
+    with open(path, encoding="utf-8") as f:
+        cases = json.load(f)["cases"]
+
+    for case in cases:
+        expected = case["expected"]
+        for record in [expected, *expected.get("records", [])]:
+            for field in DATE_FIELDS:
+                if field in record:
+                    record[field] = expand_date(record[field], today)
+        partial_data = (case.get("context") or {}).get("partial_data")
+        if partial_data:
+            for field in DATE_FIELDS:
+                if field in partial_data:
+                    partial_data[field] = expand_date(partial_data[field], today)
+    return cases
+
+
+def load_acceptance(path: str) -> list:
+    """반드시 맞아야 하는 케이스 id 목록"""
+    with open(path, encoding="utf-8") as f:
+        return json.load(f).get("acceptance", [])
+
+
+def check_acceptance(acceptance: list, results: list) -> list:
+    """acceptance 케이스 중 틀린 id 목록 (반복 실행 중 한 번이라도 틀리면 실패)"""
+    failed = {r["id"] for r in results if not r["correct"]}
+    return [case_id for case_id in acceptance if case_id in failed]
+
+
+def build_lookup(parser: ClaudeMessageParser, cases: list, recordings: dict = None):
+    """프롬프트 → 티어 모델별 녹화 응답 매핑"""
+    models = {tier: model for tier, model in parser.model_tiers}
+    by_prompt = {}
+    for case in cases:
+        prompt = parser._build_prompt(case["message"], case.get("context"))
+        responses = {"default": case["llm_response"]}
+        if case.get("strong_response") and "strong" in models:
+            responses[models["strong"]] = case["strong_response"]
+        if recordings and case["id"] in recordings:
+            responses = {"default": None, **recordings[case["id"]]}
+        by_prompt[prompt] = responses
+
+    def lookup(prompt: str, model: str):
+        responses = by_prompt.get(prompt)
+        if responses is None:
+            return None
+        return responses.get(model) or responses.get("default")
+
+    return lookup
+
+
+def score_case(case: dict, records, error) -> dict:
+    """케이스 채점 (필드별 일치 여부, 여러 학생이면 학생 순서대로 모두 일치해야 정답)"""
+    expected = case["expected"]
+    if expected["outcome"] == "no_record":
+        return {"correct": records is None, "fields": {}}
+    if records is None:
+        return {"correct": False, "fields": {field: False for field in SCORED_FIELDS}}
+
+    expected_records = expected.get("records", [expected])
+    actual_records = [record.model_dump() for record in records]
+    fields = {
+        field: len(actual_records) == len(expected_records) and all(
+            actual.get(field) == wanted.get(field)
+            for actual, wanted in zip(actual_records, expected_records)
+        )
+        for field in SCORED_FIELDS
+    }
+    return {"correct": all(fields.values()), "fields": fields}
+
+
+async def run_case(parser: ClaudeMessageParser, case: dict, semaphore: asyncio.Semaphore, use_cache: bool) -> dict:
+    async with semaphore:
+        started = time.perf_counter()
+        records, error, exception = None, None, None
+        with collect_llm_calls() as calls:
+            try:
+                records, error = await parser.parse_attendance_batch_async(case["message"], case.get("context"), use_cache)
+            except Exception as e:
+                exception = e
+        latency_ms = (time.perf_counter() - started) * 1000
+
+    result = {
+        "id": case["id"],
+        "latency_ms": latency_ms,
+        "llm_calls": len(calls),
+        "attempts": sum(call["attempts"] for call in calls),
+        "input_tokens": sum(call["input_tokens"] for call in calls),
+        "output_tokens": sum(call["output_tokens"] for call in calls),
+        "cache_read_input_tokens": sum(call["cache_read_input_tokens"] for call in calls),
+        "data": [record.model_dump() for record in records] if records else None,
+        "error": error or (f"{type(exception).__name__}: {exception}" if exception else None),
+        "raised": exception is not None,
+    }
+    result.update(score_case(case, records, error))
+    return result
+
+
+async def run_benchmark(parser: ClaudeMessageParser, cases: list, concurrency: int, repeat: int, use_cache: bool) -> tuple[list, float]:
+    semaphore = asyncio.Semaphore(concurrency)
+    started = time.perf_counter()
+    results = await asyncio.gather(*[
+        run_case(parser, case, semaphore, use_cache)
+        for _ in range(repeat)
+        for case in cases
+    ])
+    return results, time.perf_counter() - started
+
+
+def summarize(results: list, elapsed: float) -> dict:
+    latencies = sorted(r["latency_ms"] for r in results)
+    llm_latencies = sorted(r["latency_ms"] for r in results if r["llm_calls"])
+    field_totals = {field: [0, 0] for field in SCORED_FIELDS}
+    for r in results:
+        for field, ok in r["fields"].items():
+            field_totals[field][0] += ok
+            field_totals[field][1] += 1
+
+    return {
+        "messages": len(results),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_msg_per_s": round(len(results) / elapsed, 2) if elapsed else None,
+        "latency_ms": {
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "max": round(latencies[-1], 1) if latencies else None,
+        },
+        "llm_path_latency_ms": {
+            "p50": percentile(llm_latencies, 50),
+            "p95": percentile(llm_latencies, 95),
+            "p99": percentile(llm_latencies, 99),
+        },
+        "local_path_ratio": round(sum(1 for r in results if not r["llm_calls"]) / len(results), 4) if results else 0.0,
+        "llm_calls": sum(r["llm_calls"] for r in results),
+        "api_attempts": sum(r["attempts"] for r in results),
+        "input_tokens": sum(r["input_tokens"] for r in results),
+        "output_tokens": sum(r["output_tokens"] for r in results),
+        "cache_read_input_tokens": sum(r["cache_read_input_tokens"] for r in results),
+        "exact_match": round(sum(r["correct"] for r in results) / len(results), 4) if results else 0.0,
+        "field_accuracy": {
+            field: round(ok / total, 4) if total else None
+            for field, (ok, total) in field_totals.items()
+        },
+        "raised": sum(r["raised"] for r in results),
+    }
+
+
+def print_report(summary: dict, results: list, parser: ClaudeMessageParser, fake: FakeAnthropicClient = None):
+    print("=" * 70)
+    print(f"오늘: {describe_today()}  /  메시지 {summary['messages']}건, {summary['elapsed_s']}초")
+    print("=" * 70)
+    print(f"처리량: {summary['throughput_msg_per_s']} msg/s, LLM 없이 처리: {summary['local_path_ratio']:.1%}")
+    lat = summary["latency_ms"]
+    print(f"지연시간: p50={lat['p50']}ms p95={lat['p95']}ms p99={lat['p99']}ms max={lat['max']}ms")
+    llm_lat = summary["llm_path_latency_ms"]
+    print(f"LLM 경로 지연시간: p50={llm_lat['p50']}ms p95={llm_lat['p95']}ms p99={llm_lat['p99']}ms")
+    print(f"LLM 호출 {summary['llm_calls']}건 (API 시도 {summary['api_attempts']}회), "
+          f"input={summary['input_tokens']}, output={summary['output_tokens']}, cache_read={summary['cache_read_input_tokens']}")
+    print(f"티어별: {parser.get_routing_stats()}")
+    if fake:
+        print(f"가짜 클라이언트: {fake.get_stats()}")
+    print(f"\n완전 일치: {summary['exact_match']:.1%}")
+    for field, accuracy in summary["field_accuracy"].items():
+        print(f"  {field:<18} {accuracy:.1%}" if accuracy is not None else f"  {field:<18} -")
+
+    failures = [r for r in results if not r["correct"]]
+    if failures:
+        print(f"\n[불일치 {len(failures)}건]")
+        for r in failures:
+            wrong = [field for field, ok in r["fields"].items() if not ok]
+            detail = f"필드: {', '.join(wrong)}" if r["data"] else f"에러: {(r['error'] or '').splitlines()[0] if r['error'] else '-'}"
+            print(f"  {r['id']:<28} {detail}")
+
+
+def main():
+    parser_args = argparse.ArgumentParser(description="출결 메시지 파서 오프라인 벤치마크")
+    parser_args.add_argument("--corpus", default=DEFAULT_CORPUS, help="코퍼스 JSON 경로")
+    parser_args.add_argument("--concurrency", type=int, default=4, help="동시 처리 메시지 수")
+    parser_args.add_argument("--repeat", type=int, default=1, help="코퍼스 반복 횟수")
+    parser_args.add_argument("--latency-ms", type=float, default=800, help="가짜 응답 지연 중앙값")
+    parser_args.add_argument("--latency-sigma", type=float, default=0.35, help="지연 분포 퍼짐 (0이면 고정)")
+    parser_args.add_argument("--overload-rate", type=float, default=0.0, help="529 에러 주입 확률")
+    parser_args.add_argument("--malformed-rate", type=float, default=0.0, help="깨진 JSON 응답 주입 확률")
+    parser_args.add_argument("--seed", type=int, default=42, help="난수 시드")
+    parser_args.add_argument("--no-rules", action="store_true", help="규칙 기반 분류기 끄기")
+    parser_args.add_argument("--local-model", help="로컬 분류기 모델 디렉토리 (기본값: 로컬 분류기 끄기)")
+    parser_args.add_argument("--cache", action="store_true", help="결과 캐시 사용 (--repeat와 함께)")
+    parser_args.add_argument("--recordings", help="녹화 파일로 응답 재생 (케이스 id → 모델별 도구 입력)")
+    parser_args.add_argument("--record", help="실제 API를 호출해 응답을 이 파일에 녹화")
+    parser_args.add_argument("--json", help="결과를 JSON 파일로 저장")
+    args = parser_args.parse_args()
+
+    today = datetime.now().date()
+    cases = load_cases(args.corpus, today)
+
+    # 벤치마크 전용 limiter (공용 limiter의 속도 제한을 받지 않도록)
+    limiter = LLMCallLimiter(max_concurrency=max(args.concurrency, 1), rate_per_second=1000)
+
+    fake, recorder = None, None
+    if args.record:
+        api_key = os.getenv("ANTHROPIC_API_KEY")
+        if not api_key:
+            sys.exit("--record에는 ANTHROPIC_API_KEY가 필요합니다")
+        recorder = RecordingClient(AsyncAnthropic(api_key=api_key, max_retries=0))
+        parser = ClaudeMessageParser(client=recorder, limiter=limiter)
+    else:
+        recordings = None
+        if args.recordings:
+            with open(args.recordings, encoding="utf-8") as f:
+                recordings = json.load(f)
+        fake = FakeAnthropicClient(
+            lookup=lambda prompt, model: None,
+            latency_ms=args.latency_ms,
+            latency_sigma=args.latency_sigma,
+            overload_rate=args.overload_rate,
+            malformed_rate=args.malformed_rate,
+            seed=args.seed,
+        )
+        parser = ClaudeMessageParser(client=fake, limiter=limiter)
+        fake.lookup = build_lookup(parser, cases, recordings)
+
+    if args.no_rules:
+        parser.rule_parser = None
+    # 결과가 학습된 모델에 따라 달라지지 않도록 명시한 경우에만 로컬 분류기 사용
+    parser.local_classifier = LocalClassifier.load(args.local_model) if args.local_model else None
+    if not args.cache:
+        parser.result_cache = None
+
+    results, elapsed = asyncio.run(run_benchmark(parser, cases, args.concurrency, args.repeat, args.cache))
+    summary = summarize(results, elapsed)
+    print_report(summary, results, parser, fake)
+
+    if recorder:
+        prompt_to_case = {parser._build_prompt(case["message"], case.get("context")): case["id"] for case in cases}
+        recorded = {
+            prompt_to_case[prompt]: responses
+            for prompt, responses in recorder.recordings.items()
+            if prompt in prompt_to_case
+        }
+        with open(args.record, "w", encoding="utf-8") as f:
+            json.dump(recorded, f, ensure_ascii=False, indent=2)
+        print(f"\n녹화 {len(recorded)}건 저장: {args.record}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"summary": summary, "results": results}, f, ensure_ascii=False, indent=2, default=str)
+        print(f"\n결과 저장: {args.json}")
+
+    acceptance = load_acceptance(args.corpus)
+    if acceptance:
+        failed = check_acceptance(acceptance, results)
+        if failed:
+            print(f"\n[인수 기준 실패] {', '.join(failed)}")
+            sys.exit(1)
+        print(f"\n[인수 기준 통과] {len(acceptance)}건")
+
+
+if __name__ == "__main__":
+    main()
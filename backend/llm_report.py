@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""Claude 호출 리포트 출력 스크립트
+
+사용법: python llm_report.py [--days 7] [--limit 10]
+"""
+
+import sys
+import os
+import argparse
+
+# 현재 디렉토리를 Python 경로에 추가
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.database import SessionLocal, init_db
+from app.services.llm_telemetry import build_llm_report
+
+
+def print_calls(title: str, calls: list):
+    print(f"\n[{title}]")
+    for call in calls:
+        text = (call["message_text"] or "-").replace("\n", " ")[:40]
+        print(
+            f"  #{call['id']} {call['latency_ms']:>8.0f}ms  ${call['cost_usd']:.5f}  "
+            f"{call['model']} x{call['attempts']} {call['outcome']}  {text}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Claude 호출 텔레메트리 리포트")
+    parser.add_argument("--days", type=int, default=7, help="집계 기간 (일)")
+    parser.add_argument("--limit", type=int, default=10, help="느린/비싼 호출 목록 개수")
+    args = parser.parse_args()
+
+    init_db()
+    db = SessionLocal()
+    try:
+        report = build_llm_report(db, days=args.days, limit=args.limit)
+    finally:
+        db.close()
+
+    summary = report["summary"]
+    print(f"최근 {args.days}일: 호출 {summary['calls']}건 (메시지 {summary['messages']}건), "
+          f"평균 시도 {summary['avg_attempts']}회, 비용 ${summary['cost_usd']}")
+    print(f"지연시간 p50={summary['p50_ms']}ms p95={summary['p95_ms']}ms p99={summary['p99_ms']}ms max={summary['max_ms']}ms")
+    print(f"결과: {summary['outcomes']}")
+
+    print("\n[모델별]")
+    for model, stats in report["by_model"].items():
+        print(f"  {model}: {stats['calls']}건, p50={stats['p50_ms']}ms p95={stats['p95_ms']}ms p99={stats['p99_ms']}ms")
+
+    print("\n[일별]")
+    for day in report["daily"]:
+        print(f"  {day['date']}: {day['calls']}건, input={day['input_tokens']}, output={day['output_tokens']}, "
+              f"cache_read={day['cache_read_input_tokens']}, ${day['cost_usd']}")
+
+    print_calls("느린 호출", report["slowest"])
+    print_calls("비싼 호출", report["most_expensive"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""저장된 텔레그램 메시지 재파싱 스크립트
+
+프롬프트나 모델을 바꾼 뒤 과거 메시지를 다시 파싱해 저장된 extracted_data와 비교합니다.
+메시지는 id 순으로 청크 단위로 읽고(전체를 메모리에 올리지 않음), 청크마다 진행 상황을
+체크포인트 파일에 기록하므로 중단해도 이어서 실행할 수 있습니다.
+
+사용법:
+    python replay_messages.py [--chunk-size 500] [--concurrency 8] [--diff-out replay_diff.jsonl]
+                              [--checkpoint replay_checkpoint.json] [--restart] [--repair]
+
+주의:
+    - 대화 맥락(이전 메시지)은 저장되어 있지 않으므로 각 메시지를 단독으로 파싱합니다.
+    - 날짜 표현은 메시지를 받은 날짜 기준으로 해석합니다.
+    - --repair는 결과가 기존 출결 기록과 같은(날짜/유형/사유) 경우에만 extraction_log를 갱신합니다.
+      출결 내용 자체는 바꾸지 않습니다.
+"""
+
+import sys
+import os
+import json
+import time
+import asyncio
+import argparse
+from datetime import timedelta
+
+# 현재 디렉토리를 Python 경로에 추가
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.database import SessionLocal, init_db
+from app.models import TelegramMessage, AttendanceRecord, Student
+from app.services.claude_parser import ClaudeMessageParser
+from app.services.llm_limiter import LLMCallLimiter
+
+# 메시지 저장 후 출결 기록이 생성되기까지 허용하는 시간
+REPAIR_WINDOW = timedelta(minutes=5)
+COMPARED_FIELDS = ("intent", "student_name", "date", "end_date", "attendance_type", "attendance_reason", "clarification_needed")
+
+
+def load_checkpoint(path: str) -> dict:
+    if not os.path.exists(path):
+        return {"last_id": 0, "processed": 0, "changed": 0, "failed": 0, "repaired": 0}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_checkpoint(path: str, checkpoint: dict):
+    """임시 파일에 쓴 뒤 교체 (중간에 죽어도 체크포인트가 깨지지 않도록)"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def normalize_stored(extracted_data: str) -> list:
+    """저장된 extracted_data(학생 1명이면 객체, 여러 명이면 목록)를 목록으로"""
+    if not extracted_data:
+        return []
+    try:
+        data = json.loads(extracted_data)
+    except json.JSONDecodeError:
+        return []
+    if isinstance(data, dict):
+        return [data]
+    return [item for item in data if isinstance(item, dict)]
+
+
+def diff_records(old: list, new: list) -> list:
+    """학생별 필드 차이 (순서대로 짝지음, 개수가 다르면 없는 쪽은 None)"""
+    changes = []
+    for index in range(max(len(old), len(new))):
+        before = old[index] if index < len(old) else None
+        after = new[index] if index < len(new) else None
+        if before is None or after is None:
+            changes.append({"index": index, "before": before, "after": after})
+            continue
+        # 예전 기록에 없는 필드(None)와 기본값(False)은 같은 것으로 봄
+        fields = {
+            field: [before.get(field), after.get(field)]
+            for field in COMPARED_FIELDS
+            if (before.get(field) or None) != (after.get(field) or None)
+        }
+        if fields:
+            changes.append({"index": index, "fields": fields})
+    return changes
+
+
+async def replay_message(parser: ClaudeMessageParser, semaphore: asyncio.Semaphore, row) -> tuple:
+    """메시지 하나 재파싱 → (새 결과 목록, 에러)"""
+    async with semaphore:
+        try:
+            records, error = await parser.parse_attendance_batch_async(
+                row.message_text, use_cache=False, today=row.created_at.date()
+            )
+        except Exception as e:
+            return None, f"{type(e).__name__}: {e}"
+    return [record.model_dump() for record in records] if records else None, error
+
+
+def repair_extraction_logs(db, row, new_records: list) -> int:
+    """메시지로 생성된 출결 기록 중 결과가 일치하는 기록의 extraction_log 갱신"""
+    attendance_records = (
+        db.query(AttendanceRecord, Student.name)
+        .join(Student, AttendanceRecord.student_id == Student.id)
+        .filter(
+            AttendanceRecord.original_message == row.message_text,
+            AttendanceRecord.created_at >= row.created_at,
+            AttendanceRecord.created_at <= row.created_at + REPAIR_WINDOW,
+        )
+        .all()
+    )
+    repaired = 0
+    for attendance, student_name in attendance_records:
+        for data in new_records:
+            if data.get("intent") != "create" or not data.get("date"):
+                continue
+            if data.get("student_name") not in (student_name, student_name[1:]):
+                continue
+            day = attendance.date.date().isoformat()
+            if not data["date"] <= day <= (data.get("end_date") or data["date"]):
+                continue
+            if (
+                attendance.attendance_type.value != data.get("attendance_type")
+                or attendance.attendance_reason.value != data.get("attendance_reason")
+            ):
+                continue
+            new_log = json.dumps(data, ensure_ascii=False)
+            if attendance.extraction_log != new_log:
+                attendance.extraction_log = new_log
+                repaired += 1
+            break
+    return repaired
+
+
+async def run(args):
+    init_db()
+    if args.restart and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+    checkpoint = load_checkpoint(args.checkpoint)
+    last_id = max(checkpoint["last_id"], args.since_id)
+
+    parser = ClaudeMessageParser(limiter=LLMCallLimiter(max_concurrency=args.concurrency))
+    parser.queue_when_open = True  # 혼잡하면 실패 대신 회로 복구를 기다림
+    if args.no_rules:
+        parser.rule_parser = None
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    started = time.monotonic()
+    remaining = args.limit
+    db = SessionLocal()
+    try:
+        with open(args.diff_out, "a", encoding="utf-8") as diff_file:
+            while remaining is None or remaining > 0:
+                size = args.chunk_size if remaining is None else min(args.chunk_size, remaining)
+                query = db.query(
+                    TelegramMessage.id,
+                    TelegramMessage.message_text,
+                    TelegramMessage.extracted_data,
+                    TelegramMessage.created_at,
+                ).filter(TelegramMessage.id > last_id)
+                if args.until_id:
+                    query = query.filter(TelegramMessage.id <= args.until_id)
+                rows = query.order_by(TelegramMessage.id).limit(size).all()
+                if not rows:
+                    break
+
+                results = await asyncio.gather(*(replay_message(parser, semaphore, row) for row in rows))
+
+                for row, (new_records, error) in zip(rows, results):
+                    checkpoint["processed"] += 1
+                    if new_records is None:
+                        checkpoint["failed"] += 1
+                    old_records = normalize_stored(row.extracted_data)
+                    changes = diff_records(old_records, new_records or [])
+                    if changes or error:
+                        checkpoint["changed"] += bool(changes)
+                        diff_file.write(json.dumps({
+                            "message_id": row.id,
+                            "message_text": row.message_text,
+                            "created_at": row.created_at.isoformat(),
+                            "error": error,
+                            "changes": changes,
+                        }, ensure_ascii=False) + "\n")
+                    if args.repair and new_records:
+                        checkpoint["repaired"] += repair_extraction_logs(db, row, new_records)
+
+                if args.repair:
+                    db.commit()
+                diff_file.flush()
+                last_id = rows[-1].id
+                checkpoint["last_id"] = last_id
+                save_checkpoint(args.checkpoint, checkpoint)
+                db.expunge_all()
+
+                if remaining is not None:
+                    remaining -= len(rows)
+                elapsed = time.monotonic() - started
+                print(
+                    f"~#{last_id}: 처리 {checkpoint['processed']}건, 변경 {checkpoint['changed']}건, "
+                    f"실패 {checkpoint['failed']}건, 로그 갱신 {checkpoint['repaired']}건 ({elapsed:.0f}초)"
+                )
+    finally:
+        db.close()
+
+    print(f"\n완료: 마지막 메시지 #{checkpoint['last_id']}, 차이는 {args.diff_out}에 기록했습니다.")
+    print(f"Claude 호출 제한기: {parser.limiter.snapshot()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="저장된 텔레그램 메시지 재파싱 및 결과 비교")
+    parser.add_argument("--chunk-size", type=int, default=500, help="한 번에 읽을 메시지 수")
+    parser.add_argument("--concurrency", type=int, default=8, help="동시 파싱 수 (최대)")
+    parser.add_argument("--checkpoint", default="replay_checkpoint.json", help="진행 상황 파일")
+    parser.add_argument("--diff-out", default="replay_diff.jsonl", help="차이 기록 파일 (이어쓰기)")
+    parser.add_argument("--restart", action="store_true", help="체크포인트를 지우고 처음부터 실행")
+    parser.add_argument("--since-id", type=int, default=0, help="이 id 이후 메시지부터")
+    parser.add_argument("--until-id", type=int, default=None, help="이 id까지만")
+    parser.add_argument("--limit", type=int, default=None, help="이번 실행에서 처리할 최대 메시지 수")
+    parser.add_argument("--no-rules", action="store_true", help="규칙 파서 없이 모두 Claude로 파싱")
+    parser.add_argument("--repair", action="store_true", help="일치하는 출결 기록의 extraction_log 갱신")
+    args = parser.parse_args()
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -21,11 +21,15 @@ if ! kill -0 $API_PID 2>/dev/null; then
     exit 1
 fi
 
-# 텔레그램 봇 시작
-echo "Starting Telegram bot..." >&2
-python run_bot.py 2>&1 &
-BOT_PID=$!
-echo "Telegram bot started with PID: $BOT_PID" >&2
+# 텔레그램 봇 시작 (웹훅 모드면 API 서버 안에서 실행되므로 별도 프로세스 없음)
+if [ "${TELEGRAM_MODE:-polling}" = "webhook" ]; then
+    echo "Telegram bot runs inside the API server (webhook mode)" >&2
+else
+    echo "Starting Telegram bot..." >&2
+    python run_bot.py 2>&1 &
+    BOT_PID=$!
+    echo "Telegram bot started with PID: $BOT_PID" >&2
+fi
 
 echo "All services started successfully!" >&2
 
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""로컬 분류기 학습 스크립트
+
+telegram_messages.extracted_data와 attendance_records.extraction_log를 레이블로 사용해
+intent/출결 타입/사유를 분류하는 문자 n-gram 로지스틱 회귀를 학습합니다.
+모델은 LOCAL_CLASSIFIER_DIR 아래 버전별 디렉토리에 저장되고, 평가를 통과하면
+CURRENT 포인터를 새 버전으로 바꿉니다 (봇 재시작 시 적용).
+
+평가는 id % holdout-mod == 0인 메시지 중 Claude가 처리한(llm_calls에 성공 기록이 있는)
+메시지를 정답으로 삼아, 규칙 분류기가 놓친 메시지를 로컬 분류기가 얼마나 맞게
+처리하는지(적중률/정확도)를 기준 확률별로 보여줍니다.
+
+사용법:
+    python train_local_classifier.py [--holdout-mod 10] [--min-precision 0.98] [--min-hits 30] [--no-activate]
+"""
+
+import sys
+import os
+import json
+import time
+import argparse
+import numpy as np
+
+# 현재 디렉토리를 Python 경로에 추가
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.database import SessionLocal, init_db
+from app.models import TelegramMessage, AttendanceRecord, LLMCall
+from app.services.rule_parser import RuleBasedParser, extract_slots
+from app.services.local_classifier import (
+    DEFAULT_BUCKETS, HEAD_LABELS, LocalClassifier, activate_version, featurize, save_model, train_head,
+)
+
+THRESHOLDS = (0.9, 0.95, 0.97, 0.99)
+CHUNK_SIZE = 2000
+
+
+def build_example(text: str, data, created_at, holdout: bool = False, llm_labeled: bool = False):
+    """저장된 추출 결과 하나를 학습 예시로 (학생 1명 메시지만, 레이블이 이상하면 None)"""
+    if not text or not isinstance(data, dict):
+        return None
+    intent = data.get("intent") or "none"
+    if intent not in HEAD_LABELS["intent"]:
+        return None
+
+    example = {
+        "text": text,
+        "today": created_at.date(),
+        "data": data,
+        "holdout": holdout,
+        "llm_labeled": llm_labeled,
+        "intent": intent,
+        "attendance_type": None,
+        "attendance_reason": None,
+    }
+    if intent == "create" and not data.get("clarification_needed"):
+        if data.get("attendance_type") in HEAD_LABELS["attendance_type"]:
+            example["attendance_type"] = data["attendance_type"]
+        if data.get("attendance_reason") in HEAD_LABELS["attendance_reason"]:
+            example["attendance_reason"] = data["attendance_reason"]
+
+    # 실행 시와 같은 방식으로 이름/날짜를 가림 (규칙으로 못 뽑으면 추출 결과 사용)
+    slots = extract_slots(text, today=example["today"])
+    if slots:
+        example["student_name"], example["date_phrase"] = slots.student_name, slots.date_phrase
+    else:
+        example["student_name"], example["date_phrase"] = data.get("student_name"), data.get("date_phrase")
+    return example
+
+
+def load_examples(db, holdout_mod: int) -> list:
+    """메시지 기록을 청크 단위로 읽어 학습 예시 목록 생성 (같은 메시지 문장은 한 번만)"""
+    examples = []
+    seen_texts = set()
+
+    last_id = 0
+    while True:
+        rows = (
+            db.query(TelegramMessage.id, TelegramMessage.message_text, TelegramMessage.extracted_data, TelegramMessage.created_at)
+            .filter(TelegramMessage.id > last_id, TelegramMessage.extracted_data.isnot(None))
+            .order_by(TelegramMessage.id)
+            .limit(CHUNK_SIZE)
+            .all()
+        )
+        if not rows:
+            break
+        last_id = rows[-1].id
+        llm_ids = {
+            message_id for (message_id,) in db.query(LLMCall.telegram_message_id).filter(
+                LLMCall.telegram_message_id.in_([row.id for row in rows]),
+                LLMCall.outcome == "success",
+            )
+        }
+        for row in rows:
+            try:
+                data = json.loads(row.extracted_data)
+            except json.JSONDecodeError:
+                continue
+            example = build_example(row.message_text, data, row.created_at, row.id % holdout_mod == 0, row.id in llm_ids)
+            if example:
+                examples.append(example)
+                seen_texts.add(row.message_text)
+
+    # 메시지 기록 이전에 생성된 출결 기록의 추출 로그 (학습에만 사용)
+    last_id = 0
+    while True:
+        rows = (
+            db.query(AttendanceRecord.id, AttendanceRecord.original_message, AttendanceRecord.extraction_log, AttendanceRecord.created_at)
+            .filter(AttendanceRecord.id > last_id, AttendanceRecord.extraction_log.isnot(None))
+            .order_by(AttendanceRecord.id)
+            .limit(CHUNK_SIZE)
+            .all()
+        )
+        if not rows:
+            break
+        last_id = rows[-1].id
+        for row in rows:
+            if row.original_message in seen_texts:
+                continue
+            try:
+                data = json.loads(row.extraction_log)
+            except json.JSONDecodeError:
+                continue
+            example = build_example(row.original_message, data, row.created_at)
+            if example:
+                examples.append(example)
+                seen_texts.add(row.original_message)
+
+    return examples
+
+
+def evaluate(classifier: LocalClassifier, examples: list) -> dict:
+    """보류 예시로 필드별 정확도와 기준 확률별 적중률/정확도 계산"""
+    accuracy = {}
+    for head, labels in classifier.labels.items():
+        scored = [e for e in examples if e[head]]
+        correct = sum(
+            classifier.predict(e["text"], e["student_name"], e["date_phrase"])[head][0] == e[head]
+            for e in scored
+        )
+        accuracy[head] = round(correct / len(scored), 4) if scored else None
+
+    # Claude 결과를 정답으로: 규칙 분류기가 놓친 메시지 중 로컬 분류기가 처리/정답인 비율
+    rule_parser = RuleBasedParser()
+    llm_examples = [e for e in examples if e["llm_labeled"]]
+    candidates = []
+    latencies = []
+    for e in llm_examples:
+        slots = extract_slots(e["text"], today=e["today"])
+        if slots is None or rule_parser.parse(e["text"], today=e["today"]):
+            continue
+        started = time.perf_counter()
+        predictions = classifier.predict(slots.text, slots.student_name, slots.date_phrase)
+        latencies.append((time.perf_counter() - started) * 1000)
+        data = e["data"]
+        correct = (
+            predictions["intent"][0] == e["intent"]
+            and predictions["attendance_type"][0] == data.get("attendance_type")
+            and predictions["attendance_reason"][0] == data.get("attendance_reason")
+            and slots.student_name == data.get("student_name")
+            and slots.start_date == data.get("date")
+            and slots.end_date == data.get("end_date")
+        )
+        confidence = min(probability for _, probability in predictions.values())
+        candidates.append((predictions["intent"][0] == "create", confidence, correct))
+
+    by_threshold = {}
+    for threshold in sorted({*THRESHOLDS, classifier.min_probability}):  # 실제 기준 확률은 항상 평가
+        hits = [correct for is_create, confidence, correct in candidates if is_create and confidence >= threshold]
+        by_threshold[str(threshold)] = {
+            "hits": len(hits),
+            "hit_rate": round(len(hits) / len(llm_examples), 4) if llm_examples else 0.0,
+            "precision": round(sum(hits) / len(hits), 4) if hits else None,
+        }
+
+    latencies.sort()
+    return {
+        "holdout_examples": len(examples),
+        "llm_labeled": len(llm_examples),
+        "rule_misses_with_slots": len(candidates),
+        "field_accuracy": accuracy,
+        "by_threshold": by_threshold,
+        "p50_latency_ms": round(latencies[len(latencies) // 2], 4) if latencies else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="로컬 분류기 학습")
+    parser.add_argument("--model-dir", default=os.getenv("LOCAL_CLASSIFIER_DIR", "./models/local_classifier"))
+    parser.add_argument("--buckets", type=int, default=DEFAULT_BUCKETS, help="해시 버킷 수")
+    parser.add_argument("--epochs", type=int, default=8)
+    parser.add_argument("--holdout-mod", type=int, default=10, help="id % N == 0인 메시지를 평가용으로 제외")
+    parser.add_argument("--min-examples", type=int, default=50, help="필드별 최소 학습 예시 수")
+    parser.add_argument("--min-precision", type=float, default=0.98, help="활성화에 필요한 기준 확률에서의 정확도")
+    parser.add_argument("--min-hits", type=int, default=30, help="활성화에 필요한 기준 확률 이상 평가 예시 수")
+    parser.add_argument("--no-activate", action="store_true", help="저장만 하고 CURRENT는 바꾸지 않음")
+    args = parser.parse_args()
+
+    init_db()
+    db = SessionLocal()
+    try:
+        examples = load_examples(db, args.holdout_mod)
+    finally:
+        db.close()
+
+    train = [e for e in examples if not e["holdout"]]
+    holdout = [e for e in examples if e["holdout"]]
+    print(f"예시 {len(examples)}개 (학습 {len(train)}, 평가 {len(holdout)})")
+
+    heads = {}
+    counts = {}
+    started = time.monotonic()
+    for head, labels in HEAD_LABELS.items():
+        rows = [e for e in train if e[head]]
+        counts[head] = {label: sum(e[head] == label for e in rows) for label in labels}
+        if len(rows) < args.min_examples:
+            print(f"{head}: 학습 예시가 {len(rows)}개뿐이라 학습하지 않습니다 (최소 {args.min_examples}개)")
+            return
+        features = [featurize(e["text"], args.buckets, e["student_name"], e["date_phrase"]) for e in rows]
+        label_ids = np.array([labels.index(e[head]) for e in rows])
+        heads[head] = train_head(features, label_ids, len(labels), args.buckets, epochs=args.epochs)
+        print(f"{head}: {len(rows)}개 학습 {counts[head]}")
+    print(f"학습 시간: {time.monotonic() - started:.1f}초")
+
+    meta = {
+        "n_buckets": args.buckets,
+        "labels": HEAD_LABELS,
+        "train_counts": counts,
+        "holdout_mod": args.holdout_mod,
+    }
+    version = save_model(args.model_dir, heads, meta)
+
+    classifier = LocalClassifier(os.path.join(args.model_dir, version))
+    report = evaluate(classifier, holdout)
+    meta["evaluation"] = report
+    save_model(args.model_dir, heads, meta)
+
+    print(f"\n[평가] {json.dumps(report, ensure_ascii=False, indent=2)}")
+    threshold_report = report["by_threshold"].get(str(classifier.min_probability))
+    precision = threshold_report["precision"] if threshold_report else None
+    hits = threshold_report["hits"] if threshold_report else 0
+
+    # 정확도를 측정하지 못했거나 예시가 적으면 CURRENT를 바꾸지 않음
+    if args.no_activate:
+        print(f"\n{version} 저장 (활성화하지 않음)")
+    elif precision is None or hits < args.min_hits:
+        print(f"\n{version} 저장, 기준 확률 {classifier.min_probability} 이상 평가 예시가 {hits}개라 (최소 {args.min_hits}개) 활성화하지 않습니다")
+    elif precision < args.min_precision:
+        print(f"\n{version} 저장, 기준 확률 {classifier.min_probability}에서 정확도 {precision:.1%} < {args.min_precision:.1%}라 활성화하지 않습니다")
+    else:
+        activate_version(args.model_dir, version)
+        print(f"\n{version} 활성화 ({args.model_dir}/CURRENT)")
+
+
+if __name__ == "__main__":
+    main()
@@ -338,7 +338,7 @@ const AttendanceModal = ({ selectedCell, onClose }) => {
                               </a>
                               <div style={{ marginTop: '8px' }}>
                                 <img
-                                  src={`http://localhost:8000/uploads/${doc.file_path}`}
+                                  src={`http://localhost:8000/uploads/${doc.file_path}?size=preview`}
                                   alt="제출 서류"
                                   style={{
                                     maxWidth: '100%',